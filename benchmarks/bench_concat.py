@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Benchmark the ConcatFiles iterator copy methods: reading whole files into memory (the old way), copying with a
+fixed-size buffer, and kernel-side copy (os.copy_file_range / os.sendfile).
+Every method runs in its own process, so peak memory (RSS) can be measured separately.
+
+Usage (from Fileter root dir):
+
+    python benchmarks/bench_concat.py --files 4 --size-mb 1024
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fileter
+
+
+class ReadAllConcatFiles(fileter.iterators.ConcatFiles):
+    """
+    Concat files by reading every file into memory (how ConcatFiles used to work).
+    """
+    def copy_data(self, infile, outfile):
+        outfile.write(infile.read())
+
+
+def create_input_files(folder, files, size_mb):
+    """
+    Create input files with random data.
+    """
+    block = os.urandom(1024 * 1024)
+    for i in range(files):
+        with open(os.path.join(folder, "input_%d" % i), "wb") as outfile:
+            for _ in range(size_mb):
+                outfile.write(block)
+
+
+def run_method(method, folder):
+    """
+    Run a single concat method and print elapsed time and peak RSS (in KB).
+    """
+    if method == "read-all":
+        it = ReadAllConcatFiles(os.path.join(folder, "output"))
+    else:
+        it = fileter.iterators.ConcatFiles(os.path.join(folder, "output"))
+        it.KernelCopy = method == "kernel"
+    it.add_pattern("*/input_*", root=folder)
+
+    start = time.time()
+    it.process_all()
+    elapsed = time.time() - start
+    print("%f %d" % (elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ConcatFiles copy methods.")
+    parser.add_argument("--files", type=int, default=4, help="number of input files.")
+    parser.add_argument("--size-mb", type=int, default=256, help="size of every input file, in MB.")
+    parser.add_argument("--dir", default=None, help="folder to create files in (default to temp folder).")
+    parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # child process mode - run a single method
+    if args.run:
+        run_method(args.run, args.dir)
+        return
+
+    # create input files
+    folder = tempfile.mkdtemp(dir=args.dir)
+    try:
+        create_input_files(folder, args.files, args.size_mb)
+        total_mb = args.files * args.size_mb
+
+        # run all methods, every method in its own process
+        print("%-10s %10s %10s %14s" % ("method", "seconds", "MB/sec", "peak RSS (MB)"))
+        for method in ("read-all", "chunked", "kernel"):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--run", method,
+                                              "--dir", folder])
+            elapsed, max_rss = output.split()
+            elapsed = float(elapsed)
+            print("%-10s %10.2f %10.1f %14.1f" % (method, elapsed, total_mb / elapsed, int(max_rss) / 1024.0))
+            os.remove(os.path.join(folder, "output"))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
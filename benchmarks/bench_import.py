@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Benchmark Fileter import time, as paid by short-lived processes (like CLI wrappers).
+
+Every scenario runs in a fresh python process many times, and the median time is reported, both in total and on
+top of the bare python startup time. The "everything" scenario imports all classes, which is what "import fileter"
+used to cost before classes were imported lazily.
+
+Usage (from Fileter root dir):
+
+    python benchmarks/bench_import.py --runs 30
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+# code to run in every scenario
+SCENARIOS = [
+    ("python startup", "pass"),
+    ("import fileter", "import fileter"),
+    ("FilesIterator", "import fileter; fileter.FilesIterator"),
+    ("FolderSource + filters", "import fileter; it = fileter.FilesIterator(); it.add_folder('.'); "
+                               "it.add_filter_by_extension('py'); it.compile_filters()"),
+    ("Grep", "import fileter; fileter.iterators.Grep('x')"),
+    ("everything", "import fileter; [getattr(package, name) for package in "
+                   "(fileter, fileter.sources, fileter.filters, fileter.iterators) for name in package.__all__]"),
+]
+
+
+def measure(code, runs):
+    """
+    Run code in a new python process 'runs' times, and return the median time in ms.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, "-c", code], env=env)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Fileter import time.")
+    parser.add_argument("--runs", type=int, default=20, help="how many times to run every scenario.")
+    args = parser.parse_args()
+
+    # warm up, so compiled files are cached
+    measure(SCENARIOS[-1][1], 1)
+
+    # run scenarios
+    print("%-28s %12s %16s" % ("scenario", "median (ms)", "over python (ms)"))
+    baseline = None
+    for name, code in SCENARIOS:
+        median = measure(code, args.runs)
+        if baseline is None:
+            baseline = median
+        print("%-28s %12.1f %16.1f" % (name, median, median - baseline))
+
+
+if __name__ == "__main__":
+    main()
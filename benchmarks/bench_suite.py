@@ -0,0 +1,272 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for Fileter sources, filters and iterators.
+
+Generate a synthetic folders tree, and time:
+- sources: FolderSource (serial and threaded) and PatternSource.
+- filters: match_filters() with different filter mixes.
+- iterators: Grep, ConcatFiles and AddHeader.
+
+Every benchmark runs in its own process, so peak memory (RSS) can be measured separately. Results are printed as
+a table and can be saved as JSON, and compared with the results of a previous run (for example, of another version).
+
+Usage (from Fileter root dir):
+
+    python benchmarks/bench_suite.py --width 8 --depth 3 --files 50 --output results.json
+    python benchmarks/bench_suite.py --compare results.json
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# resource is only available on unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fileter
+
+
+# extensions of generated files
+EXTENSIONS = ["py", "txt", "js", "log", "cpp"]
+
+# the string to grep for (appear once every 50 lines)
+GREP_NEEDLE = "fileter_needle"
+
+# filter mixes to benchmark match_filters() with, as list of (filter, filter type)
+FILTER_MIXES = {
+    "extension": lambda: [(fileter.filters.FilterExtension(["py", "js"]), fileter.FilesIterator.FilterType.Required)],
+    "pattern": lambda: [(fileter.filters.FilterPattern(["*/d1_*/*.py", "*.txt"]),
+                         fileter.FilesIterator.FilterType.Required)],
+    "regex": lambda: [(fileter.filters.FilterRegex(r".*d0_[0-3].*\.(py|log)$"),
+                       fileter.FilesIterator.FilterType.Required)],
+    "mixed": lambda: [(fileter.filters.FilterPattern("*/d2_0/*"), fileter.FilesIterator.FilterType.Exclude),
+                      (fileter.filters.FilterExtension("log"), fileter.FilesIterator.FilterType.Include),
+                      (fileter.filters.FilterRegex(r".*f1"), fileter.FilesIterator.FilterType.Exclude),
+                      (fileter.filters.FilterExtension(["py", "txt"]), fileter.FilesIterator.FilterType.Required),
+                      (fileter.filters.FilterPattern("*_[0-5]*"), fileter.FilesIterator.FilterType.Required)],
+}
+
+
+def create_tree(root, width, depth, files, file_size):
+    """
+    Create a synthetic folders tree: every folder has 'width' sub folders (up to 'depth' levels) and 'files' files.
+    """
+    line = "some text to fill the file with, line number %d\n"
+    content = "".join(line % i if i % 50 else GREP_NEEDLE + "\n" for i in range(file_size // len(line) + 1))
+    content = content[:file_size]
+
+    def create(folder, level):
+        os.makedirs(folder, exist_ok=True)
+        for i in range(files):
+            with open(os.path.join(folder, "f%d_%d.%s" % (i, level, EXTENSIONS[i % len(EXTENSIONS)])), "w") as out:
+                out.write(content)
+        if level < depth:
+            for i in range(width):
+                create(os.path.join(folder, "d%d_%d" % (level, i)), level + 1)
+
+    create(root, 0)
+
+
+def peak_rss_mb():
+    """
+    Return peak RSS of this process in MB, or None if not available.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024.0 * 1024.0) if sys.platform == "darwin" else max_rss / 1024.0
+
+
+def files_size_mb(paths):
+    """
+    Return total size of files in MB.
+    """
+    return sum(os.path.getsize(path) for path in paths) / (1024.0 * 1024.0)
+
+
+def bench_source(source):
+    """
+    Iterate a source and return (paths count, MB, seconds).
+    """
+    start = time.time()
+    count = 0
+    for _ in source:
+        count += 1
+    return count, None, time.time() - start
+
+
+def bench_filters(root, mix):
+    """
+    Match all paths against a filter mix and return (paths count, MB, seconds). Only matching is timed.
+    """
+    paths = fileter.sources.FolderSource(root).get_all()
+    it = fileter.FilesIterator()
+    for filt, filter_type in FILTER_MIXES[mix]():
+        it.add_filter(filt, filter_type)
+    it.compile_filters()
+
+    # match all paths
+    start = time.time()
+    for path in paths:
+        it.match_filters(path)
+    return len(paths), None, time.time() - start
+
+
+def bench_iterator(it, root, extension):
+    """
+    Process all files with a given extension with an iterator and return (paths count, MB, seconds).
+    Only processing is timed.
+    """
+    it.add_folder(root)
+    it.add_filter_by_extension(extension)
+    paths = list(it.next(dryrun=True))
+    size = files_size_mb(paths)
+
+    # process all files
+    start = time.time()
+    it.process_all()
+    return len(paths), size, time.time() - start
+
+
+def run_benchmark(name, root, work_dir):
+    """
+    Run a single benchmark (called in a child process) and return its results.
+    """
+    # prepare the tree for iterators that change files
+    if name == "add_header":
+        tree = os.path.join(work_dir, "tree_copy")
+        shutil.copytree(root, tree)
+        root = tree
+
+    # sources
+    if name == "folder_source":
+        paths, mb, elapsed = bench_source(fileter.sources.FolderSource(root))
+    elif name == "folder_source_threads":
+        paths, mb, elapsed = bench_source(fileter.sources.FolderSource(root, threads=8))
+    elif name == "pattern_source":
+        paths, mb, elapsed = bench_source(fileter.sources.PatternSource("*.py", root))
+
+    # filters
+    elif name.startswith("filters_"):
+        paths, mb, elapsed = bench_filters(root, name[len("filters_"):])
+
+    # iterators
+    elif name == "grep":
+        paths, mb, elapsed = bench_iterator(fileter.iterators.Grep(GREP_NEEDLE), root, "txt")
+    elif name == "concat":
+        output = os.path.join(work_dir, "concat_output")
+        paths, mb, elapsed = bench_iterator(fileter.iterators.ConcatFiles(output), root, "js")
+    elif name == "add_header":
+        paths, mb, elapsed = bench_iterator(fileter.iterators.AddHeader("# -*- coding: utf-8 -*-\n"), root, "py")
+    else:
+        raise ValueError("Unknown benchmark '%s'!" % name)
+
+    # return results
+    return {
+        "seconds": elapsed,
+        "paths": paths,
+        "paths_per_sec": paths / elapsed if elapsed else None,
+        "mb": mb,
+        "mb_per_sec": mb / elapsed if mb is not None and elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# all benchmarks, by order
+BENCHMARKS = ["folder_source", "folder_source_threads", "pattern_source"] + \
+             ["filters_%s" % mix for mix in sorted(FILTER_MIXES)] + \
+             ["grep", "concat", "add_header"]
+
+
+def format_value(value, fmt):
+    """
+    Format a value for the results table.
+    """
+    return "-" if value is None else fmt % value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Fileter sources, filters and iterators.")
+    parser.add_argument("--width", type=int, default=6, help="sub folders per folder.")
+    parser.add_argument("--depth", type=int, default=3, help="folders depth.")
+    parser.add_argument("--files", type=int, default=40, help="files per folder.")
+    parser.add_argument("--file-size", type=int, default=16 * 1024, help="size of every file, in bytes.")
+    parser.add_argument("--dir", default=None, help="folder to create tree in (default to temp folder).")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=None, help="benchmarks to run.")
+    parser.add_argument("--output", default=None, help="save results to this JSON file.")
+    parser.add_argument("--compare", default=None, help="compare results with a previous JSON results file.")
+    parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--root", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # child process mode - run a single benchmark
+    if args.run:
+        print(json.dumps(run_benchmark(args.run, args.root, args.dir)))
+        return
+
+    # create tree
+    work_dir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        root = os.path.join(work_dir, "tree")
+        create_tree(root, args.width, args.depth, args.files, args.file_size)
+
+        # load previous results to compare with
+        previous = {}
+        if args.compare:
+            with open(args.compare) as infile:
+                previous = json.load(infile)["results"]
+
+        # run all benchmarks, every benchmark in its own process
+        results = {}
+        print("%-24s %10s %10s %14s %10s %14s %10s" % ("benchmark", "paths", "seconds", "paths/sec", "MB/sec",
+                                                        "peak RSS (MB)", "vs prev"))
+        for name in args.only or BENCHMARKS:
+            bench_dir = tempfile.mkdtemp(dir=work_dir)
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--run", name,
+                                              "--root", root, "--dir", bench_dir])
+            shutil.rmtree(bench_dir)
+            result = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+            results[name] = result
+
+            # compare with previous run (ratio of seconds, lower is better)
+            ratio = None
+            if name in previous and previous[name]["seconds"]:
+                ratio = result["seconds"] / previous[name]["seconds"]
+
+            print("%-24s %10d %10.3f %14s %10s %14s %10s" % (
+                name, result["paths"], result["seconds"], format_value(result["paths_per_sec"], "%.0f"),
+                format_value(result["mb_per_sec"], "%.1f"), format_value(result["peak_rss_mb"], "%.1f"),
+                format_value(ratio, "x%.2f")))
+
+        # save results
+        if args.output:
+            with open(args.output, "w") as outfile:
+                json.dump({
+                    "version": fileter.__version__,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": time.time(),
+                    "params": {"width": args.width, "depth": args.depth, "files": args.files,
+                               "file_size": args.file_size},
+                    "results": results,
+                }, outfile, indent=2, sort_keys=True)
+
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-__all__ = ['FilesIterator', 'sources', 'iterators', 'filters', ]
+__all__ = ['FilesIterator', 'AsyncFilesIterator', 'HashCache', 'sources', 'iterators', 'filters', ]
 
 __title__ = 'fileter'
 __version__ = '1.0.4'
 __author__ = 'Ronen Ness'
 __license__ = 'MIT'
 
-from .files_iterator import FilesIterator
-from . import iterators
-from . import sources
-from . import filters
+from .lazy_loader import lazy_loader
+
+# classes and sub packages are imported on first access
+__getattr__, __dir__ = lazy_loader(__name__, {
+    'FilesIterator': '.files_iterator',
+    'AsyncFilesIterator': '.async_files_iterator',
+    'HashCache': '.hash_cache',
+}, submodules=['sources', 'iterators', 'filters'])
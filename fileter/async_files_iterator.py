@@ -0,0 +1,260 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Files iterator for asyncio applications.
+Sources are iterated in a background thread and blocking process_file() runs in the event loop's executor, so
+scanning and processing files never block the event loop.
+
+Usage example:
+
+async for result in it:
+    print(result)
+
+Author: Ronen Ness.
+Since: 2016
+"""
+from .files_iterator import FilesIterator
+import asyncio
+import concurrent.futures
+import inspect
+import os
+import threading
+import time
+
+
+# types of messages the sources thread send to the event loop
+_START_SOURCE = 0
+_FILES = 1
+_END_SOURCE = 2
+_ERROR = 3
+_DONE = 4
+
+
+class _Stopped(Exception):
+    """
+    Raised in the sources thread when iteration was stopped.
+    """
+    pass
+
+
+class AsyncFilesIterator(FilesIterator):
+    """
+    A files iterator that support "async for" and async processing.
+
+    Sources, filters and hooks are the same as FilesIterator, and all hooks are called from the event loop.
+    process_file() can be either a regular function, which will run in the event loop's default executor (so it must
+    be thread-safe), or an "async def" function, which will run on the event loop.
+
+    Note: when processing files concurrently, results are returned as soon as they are ready and not by files order.
+    """
+
+    # default how many files to process at the same time
+    DefaultConcurrency = 16
+
+    # how many files the sources thread send to the event loop at once, and max seconds to wait for a batch to fill
+    BatchSize = 256
+    BatchDelay = 0.05
+
+    # how many batches can wait for the event loop before the sources thread blocks
+    QueueSize = 16
+
+    def __aiter__(self):
+        """
+        Return the async iteration generator.
+        """
+        return self.anext()
+
+    async def get_all(self):
+        """
+        return all files in this iterator as list.
+        """
+        return [x async for x in self.anext()]
+
+    async def process_all(self, concurrency=None):
+        """
+        Iterate internally over all files and call process_file().
+        :param concurrency: how many files to process at the same time (default to DefaultConcurrency).
+        """
+        async for _ in self.anext(concurrency=concurrency):
+            pass
+
+    async def dry_run(self):
+        """
+        Iterate over all files and just print them.
+        """
+        async for f in self.anext(dryrun=True):
+            print(f)
+
+    async def run_in_thread(self, func, *args):
+        """
+        Run a blocking function (like reading a file) in the event loop's default executor and return its result.
+        Use this from an async process_file() to do blocking I/O without blocking the event loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def anext(self, dryrun=False, concurrency=None):
+        """
+        Iterate over files in all sources, asynchronously.
+
+        :param dryrun: if true, will only return all filenames instead of processing them, eg will not
+                        call "process_file" at all, and just show all the files it will scan.
+        :param concurrency: how many files to process at the same time (default to DefaultConcurrency).
+                        every source is fully processed before on_end_source() is called.
+        """
+        concurrency = concurrency or self.DefaultConcurrency
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.QueueSize)
+        stop = threading.Event()
+
+        # set while the event loop waits for messages and the queue is empty. the sources thread use it instead of
+        # checking the queue, which is not thread safe.
+        idle = threading.Event()
+
+        # compile filters and create stat cache
+        self.prepare_iteration()
+
+        # files being processed
+        pending = set()
+
+        try:
+            # call the start hook
+            self.on_start(dryrun)
+
+            # start iterating sources in a background thread
+            thread = threading.Thread(target=self.__iterate_sources, args=(loop, queue, stop, idle), daemon=True)
+            thread.start()
+
+            # store current dir
+            curr_dir = ""
+
+            # handle messages from sources thread
+            while True:
+                if queue.empty():
+                    idle.set()
+                message, value = await queue.get()
+                idle.clear()
+
+                # source started / ended. note: we wait for all files of a source before calling the end hook
+                if message == _START_SOURCE:
+                    self.on_start_source(value, dryrun)
+                elif message == _END_SOURCE:
+                    while pending:
+                        done, pending = await asyncio.wait(pending)
+                        for curr in self.__get_results(done):
+                            yield curr
+                    value.on_processed()
+                    self.on_end_source(value, dryrun)
+
+                # got files to process
+                elif message == _FILES:
+                    for filename in value:
+
+                        # get curr dir to call the directory-enter hook
+                        new_curr_dir = os.path.dirname(filename)
+                        if new_curr_dir != curr_dir:
+                            self.on_enter_dir(new_curr_dir, dryrun)
+                            curr_dir = new_curr_dir
+
+                        # wait until we can process more files
+                        while len(pending) >= concurrency:
+                            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                            for curr in self.__get_results(done):
+                                yield curr
+
+                        # start processing file
+                        pending.add(asyncio.ensure_future(self.__process_file(loop, filename, dryrun)))
+
+                # sources thread failed
+                elif message == _ERROR:
+                    raise value
+
+                # done
+                else:
+                    break
+
+        finally:
+            stop.set()
+            for task in pending:
+                task.cancel()
+            self.finish_iteration()
+
+        # call the end iteration hook
+        self.on_end(dryrun)
+        stats = self.get_stats()
+        if stats is not None:
+            stats.end()
+
+    async def __process_file(self, loop, path, dryrun):
+        """
+        Call process_file(), either on the event loop (if its async) or in the default executor.
+        """
+        if inspect.iscoroutinefunction(self.process_file):
+            return await self.process_file(path, dryrun)
+        return await loop.run_in_executor(None, self.process_file, path, dryrun)
+
+    @staticmethod
+    def __get_results(done):
+        """
+        Return results of finished tasks, skipping None values.
+        """
+        results = [task.result() for task in done]
+        return [curr for curr in results if curr is not None]
+
+    def __iterate_sources(self, loop, queue, stop, idle):
+        """
+        Iterate sources and filter files, and send them to the event loop in batches.
+        Runs in a background thread.
+        """
+        try:
+            for src in self.get_sources():
+                self.__send(loop, queue, stop, (_START_SOURCE, src))
+
+                # iterate files and send them in batches
+                batch = []
+                batch_start = 0
+                for filename in next(src):
+                    if stop.is_set():
+                        return
+                    if not self.match_filters(filename):
+                        src.on_file_rejected(filename)
+                        continue
+                    if not batch:
+                        batch_start = time.monotonic()
+                    batch.append(filename)
+
+                    # send batch if full, if waited too long, or if event loop is idle (so slow sources are not delayed)
+                    if len(batch) >= self.BatchSize or time.monotonic() - batch_start >= self.BatchDelay or \
+                            idle.is_set():
+                        idle.clear()
+                        self.__send(loop, queue, stop, (_FILES, batch))
+                        batch = []
+
+                # send last batch and end source
+                if batch:
+                    self.__send(loop, queue, stop, (_FILES, batch))
+                self.__send(loop, queue, stop, (_END_SOURCE, src))
+
+            self.__send(loop, queue, stop, (_DONE, None))
+
+        except _Stopped:
+            pass
+        except BaseException as e:
+            try:
+                self.__send(loop, queue, stop, (_ERROR, e))
+            except (_Stopped, RuntimeError):
+                pass
+
+    @staticmethod
+    def __send(loop, queue, stop, message):
+        """
+        Send a message to the event loop, blocking while queue is full.
+        Raise _Stopped if iteration was stopped while waiting.
+        """
+        future = asyncio.run_coroutine_threadsafe(queue.put(message), loop)
+        while True:
+            try:
+                return future.result(0.1)
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    raise _Stopped()
@@ -7,9 +7,70 @@ The iteration will iterate over files paths, its up to you to open files etc.
 Author: Ronen Ness.
 Since: 2016
 """
-from .sources import *
-from .filters import *
+from . import sources
+from . import filters
+from .stat_cache import StatCache
+from .iteration_stats import IterationStats
+from .inode_set import InodeSet, InodeBloomFilter
+import collections
+import functools
 import os
+import time
+
+
+# the iterator used by process_file() in a worker process (set when the worker process starts)
+_worker_iterator = None
+
+
+def _init_process_worker(iterator):
+    """
+    Set the iterator to use in this worker process.
+    """
+    global _worker_iterator
+    _worker_iterator = iterator
+
+
+def _process_chunk(iterator, paths, dryrun):
+    """
+    Call process_file() on a chunk of files and return the results as list.
+    """
+    return [iterator.process_file(path, dryrun) for path in paths]
+
+
+def _process_chunk_in_worker(paths, dryrun):
+    """
+    Call process_file() on a chunk of files, using the iterator of this worker process.
+    """
+    return _process_chunk(_worker_iterator, paths, dryrun)
+
+
+def _process_chunk_timed(iterator, paths, dryrun):
+    """
+    Call process_file() on a chunk of files and return (results list, durations list, (bytes read, bytes written)).
+    Bytes are counted directly in the iterator stats, so they are returned as zeros.
+    """
+    results = []
+    durations = []
+    for path in paths:
+        start = time.perf_counter()
+        results.append(iterator.process_file(path, dryrun))
+        durations.append(time.perf_counter() - start)
+    return results, durations, (0, 0)
+
+
+def _process_chunk_timed_in_worker(paths, dryrun):
+    """
+    Call process_file() on a chunk of files using the iterator of this worker process, and return durations and
+    bytes counted by process_file() too.
+    """
+    # stats are not sent to worker processes, so count this chunk bytes in temporary stats and return them
+    chunk_stats = IterationStats()
+    _worker_iterator._FilesIterator__stats = chunk_stats
+    try:
+        results, durations, _ = _process_chunk_timed(_worker_iterator, paths, dryrun)
+    finally:
+        _worker_iterator._FilesIterator__stats = None
+    return results, durations, (chunk_stats.bytes_read, chunk_stats.bytes_written)
 
 
 class FilesIterator(object):
@@ -59,12 +120,62 @@ class FilesIterator(object):
     # define the default filter type
     DefaultFilterType = FilterType.Required
 
+    # if true, will always use a stat cache while iterating, so process_file() can get files stat info with stat()
+    # without stat'ing them again. if false, will use a stat cache only when there are stat filters.
+    UseStatCache = False
+
+    # if true, sources are planned before iterating: folder sources with nested roots are walked once together
+    # (see MergedFolderSource), and files returned by more than one source (or hard links to the same file) are
+    # processed only once. files of sources that return files again on purpose (like WatchSource, when files change)
+    # are never skipped (see SourceAPI.RepeatFiles).
+    MergeSources = False
+
+    # if set when merging sources, returned files are remembered in a Bloom filter sized for this many files instead
+    # of an exact set. memory is fixed (about 1.2 bytes per file), but about 1% of files might be wrongly skipped as
+    # already returned.
+    MergeSourcesBloomCapacity = None
+
+    # if true, folder sources added with add_folder(), add_filtered_folder() and add_pattern() return paths sorted by
+    # name in every folder, unless they are added with sort=False. this makes the files order (and the output of
+    # iterators like ConcatFiles) the same on all file systems.
+    SortFolders = False
+
+    # if false, this iterator can't process files with workers (next() with workers will raise ValueError), for
+    # example if process_file() writes to a shared output. dry runs are always allowed.
+    AllowWorkers = True
+
+    # if false, this iterator can only process files with a threads pool, for example if process_file() changes
+    # state that must be kept in this process.
+    AllowProcessPool = True
+
     def __init__(self):
         """
         Init the iterator.
         """
         self.__sources = []
         self.__filters = []
+        self.__compiled_filters = None
+        self.__stat_cache = None
+        self.__collect_stats = False
+        self.__stats_callback = None
+        self.__stats_interval = 1.0
+        self.__stats = None
+        self.__plan = None
+        self.__seen = None
+
+    def __getstate__(self):
+        """
+        Return state for pickling (used when processing files with a processes pool).
+        Compiled filters, stat cache and stats are not picklable, and are re-created when needed.
+        """
+        state = self.__dict__.copy()
+        state["_FilesIterator__compiled_filters"] = None
+        state["_FilesIterator__stat_cache"] = None
+        state["_FilesIterator__stats_callback"] = None
+        state["_FilesIterator__stats"] = None
+        state["_FilesIterator__plan"] = None
+        state["_FilesIterator__seen"] = None
+        return state
 
     def add_source(self, source):
         """
@@ -75,27 +186,51 @@ class FilesIterator(object):
         self.__sources.append(source)
         return self
 
+    def get_sources(self):
+        """
+        Return the list of sources added to this iterator.
+        """
+        return list(self.__sources)
+
     def add_file(self, filepath):
         """
         Add a single file source from path (string).
 
         :param filepath: file path as string. can also be a list of files.
         """
-        self.add_source(FileSource(filepath))
+        self.add_source(sources.FileSource(filepath))
         return self
 
-    def add_folder(self, path, depth=None, source_type=DefaultSourceType):
+    def add_folder(self, path, depth=None, source_type=DefaultSourceType, threads=None, ordered=True, index=None,
+                   follow_symlinks=False, sort=None):
         """
         Add a folder source to scan recursively from path (string).
 
         :param path: folder path.
         :param depth: if provided will be depth limit. 0 = first level only.
         :param source_type: what to return; files only, folders only, or both.
-        """
-        self.add_source(FolderSource(path, depth, **source_type))
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+        :param ordered: when using threads, if true (default) will keep the same order as a serial scan.
+        :param index: if provided, will keep folders listings in this index file, and on later scans will only
+                      list folders that changed (see IndexedFolderSource).
+        :param follow_symlinks: if true, will also scan links to folders, skipping folders that were already scanned
+                                (so links loops are safe). can't be used with index.
+        :param sort: if true, will return paths sorted by name in every folder, so the order is the same on all
+                     file systems. if None (default), will use SortFolders.
+        """
+        sort = self.SortFolders if sort is None else sort
+        if index is not None:
+            if follow_symlinks:
+                raise ValueError("Can't follow symbolic links when scanning with an index!")
+            self.add_source(sources.IndexedFolderSource(path, index, depth, threads=threads, ordered=ordered,
+                                                        sort=sort, **source_type))
+        else:
+            self.add_source(sources.FolderSource(path, depth, threads=threads, ordered=ordered,
+                                                 follow_symlinks=follow_symlinks, sort=sort, **source_type))
         return self
 
-    def add_pattern(self, pattern, root=".", depth=None, source_type=DefaultSourceType):
+    def add_pattern(self, pattern, root=".", depth=None, source_type=DefaultSourceType, threads=None, ordered=True,
+                    case_sensitive=None, follow_symlinks=False, sort=None):
         """
         Add a recursive folder scan using a linux-style patterns.
 
@@ -103,19 +238,37 @@ class FilesIterator(object):
         :param root: root to start from (default to '.')
         :param depth: if provided will be depth limit. 0 = first level only.
         :param source_type: what to return; files only, folders only, or both.
-        """
-        self.add_source(PatternSource(pattern, root, depth, **source_type))
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+        :param ordered: when using threads, if true (default) will keep the same order as a serial scan.
+        :param case_sensitive: if None (default), will use the OS convention. if True / False, will force case
+                               sensitive / insensitive matching.
+        :param follow_symlinks: if true, will also scan links to folders, skipping folders that were already scanned.
+        :param sort: if true, will return paths sorted by name in every folder, so the order is the same on all
+                     file systems. if None (default), will use SortFolders.
+        """
+        sort = self.SortFolders if sort is None else sort
+        self.add_source(sources.PatternSource(pattern, root, depth, threads=threads, ordered=ordered,
+                                              case_sensitive=case_sensitive, follow_symlinks=follow_symlinks,
+                                              sort=sort, **source_type))
         return self
 
-    def add_filtered_folder(self, path, regex, depth=None, source_type=DefaultSourceType):
+    def add_filtered_folder(self, path, regex, depth=None, source_type=DefaultSourceType,
+                            threads=None, ordered=True, follow_symlinks=False, sort=None):
         """
         Add a folder source to scan recursively, with a regex filter on directories.
 
         :param regex: regex string to filter folders by.
         :param depth: if provided will be depth limit. 0 = first level only.
         :param source_type: what to return; files only, folders only, or both.
-        """
-        self.add_source(FilteredFolderSource(path, regex, depth, **source_type))
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+        :param ordered: when using threads, if true (default) will keep the same order as a serial scan.
+        :param follow_symlinks: if true, will also scan links to folders, skipping folders that were already scanned.
+        :param sort: if true, will return paths sorted by name in every folder, so the order is the same on all
+                     file systems. if None (default), will use SortFolders.
+        """
+        sort = self.SortFolders if sort is None else sort
+        self.add_source(sources.FilteredFolderSource(path, regex, depth, threads=threads, ordered=ordered,
+                                                     follow_symlinks=follow_symlinks, sort=sort, **source_type))
         return self
 
     def add_filter(self, files_filter, filter_type=DefaultFilterType):
@@ -127,15 +280,18 @@ class FilesIterator(object):
         :param filter_type: filter behavior, see FilterType for details.
         """
         self.__filters.append((files_filter, filter_type))
+        self.__compiled_filters = None
         return self
 
-    def add_filter_by_pattern(self, pattern, filter_type=DefaultFilterType):
+    def add_filter_by_pattern(self, pattern, filter_type=DefaultFilterType, case_sensitive=None):
         """
         Add a files filter by linux-style pattern to this iterator.
 
         :param pattern: linux-style files pattern (or list of patterns)
+        :param case_sensitive: if None (default), will use the OS convention. if True / False, will force case
+                               sensitive / insensitive matching.
         """
-        self.add_filter(FilterPattern(pattern), filter_type)
+        self.add_filter(filters.FilterPattern(pattern, case_sensitive), filter_type)
         return self
 
     def add_filter_by_regex(self, regex_expression, filter_type=DefaultFilterType):
@@ -144,7 +300,7 @@ class FilesIterator(object):
 
         :param regex_expression: regex string to apply.
         """
-        self.add_filter(FilterRegex(regex_expression), filter_type)
+        self.add_filter(filters.FilterRegex(regex_expression), filter_type)
         return self
 
     def add_filter_by_extension(self, extensions, filter_type=DefaultFilterType):
@@ -154,14 +310,94 @@ class FilesIterator(object):
         :param extensions: single extension or list of extensions to filter by.
                             for example: ["py", "js", "cpp", ...]
         """
-        self.add_filter(FilterExtension(extensions), filter_type)
+        self.add_filter(filters.FilterExtension(extensions), filter_type)
+        return self
+
+    def add_filter_by_size(self, min_size=None, max_size=None, filter_type=DefaultFilterType):
+        """
+        Add a files filter by size (in bytes) to this iterator.
+
+        :param min_size: if provided, will only accept files at least this big.
+        :param max_size: if provided, will only accept files up to this size.
+        """
+        self.add_filter(filters.FilterSize(min_size, max_size), filter_type)
         return self
 
+    def add_filter_by_mtime(self, newer_than=None, older_than=None, filter_type=DefaultFilterType):
+        """
+        Add a files filter by modification time to this iterator.
+
+        :param newer_than: if provided, will only accept files modified after this time (timestamp or datetime).
+        :param older_than: if provided, will only accept files modified before this time (timestamp or datetime).
+        """
+        self.add_filter(filters.FilterMTime(newer_than, older_than), filter_type)
+        return self
+
+    def add_filter_by_owner(self, owners, filter_type=DefaultFilterType):
+        """
+        Add a files filter by owner to this iterator.
+
+        :param owners: single owner or list of owners to accept (user ids, or user names on unix).
+        """
+        self.add_filter(filters.FilterOwner(owners), filter_type)
+        return self
+
+    def add_filter_by_mode(self, mask, value=None, filter_type=DefaultFilterType):
+        """
+        Add a files filter by mode bits to this iterator.
+
+        :param mask: mode bits to check.
+        :param value: required value of the masked bits. if not provided, all bits in mask must be set.
+        """
+        self.add_filter(filters.FilterMode(mask, value), filter_type)
+        return self
+
+    def enable_stats(self, callback=None, interval=1.0):
+        """
+        Collect profiling stats on every iteration: sources walk time, filters evaluations / hits / time,
+        process_file() latency histogram, bytes read and written, and files per second.
+        Stats of the last iteration are returned by get_stats(). When stats are disabled (default) they cost nothing.
+
+        :param callback: optional function to call with the IterationStats object every 'interval' seconds while
+                         iterating, and once when iteration ends.
+        :param interval: how often to call the callback, in seconds.
+        """
+        self.__collect_stats = True
+        self.__stats_callback = callback
+        self.__stats_interval = interval
+        return self
+
+    def disable_stats(self):
+        """
+        Stop collecting profiling stats.
+        """
+        self.__collect_stats = False
+        self.__stats_callback = None
+        return self
+
+    def get_stats(self):
+        """
+        Return the IterationStats of the current or last iteration, or None if stats are not enabled.
+        """
+        return self.__stats
+
+    def count_bytes(self, read=0, written=0):
+        """
+        Report bytes read and written while processing files, to be included in stats.
+        Call this from process_file() (built-in iterators already do). Does nothing when stats are disabled.
+        When processing with a processes pool, bytes counted in workers are sent back with their results.
+
+        :param read: bytes read.
+        :param written: bytes written.
+        """
+        if self.__stats is not None:
+            self.__stats.add_bytes(read, written)
+
     def __iter__(self):
         """
         Return self as iterator.
         """
-        return next(self)
+        return self.next()
 
     def get_all(self):
         """
@@ -169,13 +405,18 @@ class FilesIterator(object):
         """
         return [x for x in iter(self)]
 
-    def process_all(self):
+    def process_all(self, workers=None, executor="process", ordered=True, chunk_size=64):
         """
         Iterate internally over all files and call process_file().
         Use this function if you want to use this iterator with pre-defined processing function, and not
         for external iteration.
+
+        :param workers: if provided, will call process_file() in parallel using a pool of this many workers.
+        :param executor: type of pool to use with workers: "process" or "thread". see next() for details.
+        :param ordered: when using workers, if true (default) will return results in the same order as files.
+        :param chunk_size: when using workers, how many files to send to a worker at once.
         """
-        for _ in next(self):
+        for _ in self.next(workers=workers, executor=executor, ordered=ordered, chunk_size=chunk_size):
             pass
 
     def dry_run(self):
@@ -187,53 +428,230 @@ class FilesIterator(object):
         for f in self.next(dryrun=True):
             print(f)
 
-    def next(self, dryrun=False):
+    def next(self, dryrun=False, workers=None, executor="process", ordered=True, chunk_size=64):
         """
         Iterate over files in all sources.
         Use this if you want to iterate files externally.
 
         :param dryrun: if true, will only return all filenames instead of processing them, eg will not
                         call "process_file" at all, and just show all the files it will scan.
-        """
-
-        # call the start hook
-        self.on_start(dryrun)
-
-        # store current dir
-        curr_dir = ""
-
-        # iterate over sources
-        for src in self.__sources:
-
-            # call the start_source hook
-            self.on_start_source(src, dryrun)
-
-            # iterate over files
-            for filename in next(src):
-
-                # make sure file pass filters
-                if not self.match_filters(filename):
-                    continue
-
-                # get curr dir to call the directory-enter hook
-                new_curr_dir = os.path.dirname(filename)
-                if new_curr_dir != curr_dir:
-                    self.on_enter_dir(new_curr_dir, dryrun)
-                    curr_dir = new_curr_dir
-
-                # process file
-                curr = self.process_file(filename, dryrun)
-
-                # if after process we still want to return file for external iteration, return it
-                if curr is not None:
-                    yield curr
-
-            # call the end-source hook
-            self.on_end_source(src, dryrun)
-
-        # call the end iteration hook and raise stop iteration exception
+        :param workers: if provided, will call process_file() in parallel using a pool of this many workers.
+                        sources, filters and all the hooks still run in the calling thread, and every source is
+                        fully processed before on_end_source() is called.
+                        iterators that set AllowWorkers to false reject this (see AllowWorkers and AllowProcessPool).
+        :param executor: type of pool to use with workers:
+                        "process" - use processes. best for CPU-heavy process_file(), but requires this iterator
+                                    to be picklable, and changes process_file() makes to self are not kept.
+                        "thread" - use threads. best for I/O-heavy process_file(), which must be thread-safe.
+        :param ordered: when using workers, if true (default) will return results in the same order as files.
+                        if false, will return results as soon as they are ready.
+        :param chunk_size: when using workers, how many files to send to a worker at once.
+        """
+        # if got workers use the parallel iteration. executor is validated here, and not when iteration starts.
+        if workers:
+            if executor not in ("process", "thread"):
+                raise ValueError("Unknown executor type '%s'! Must be 'process' or 'thread'." % executor)
+            if not dryrun and not self.AllowWorkers:
+                raise ValueError("%s can't process files with workers!" % type(self).__name__)
+            if not dryrun and executor == "process" and not self.AllowProcessPool:
+                raise ValueError("%s can't process files in a processes pool! Use executor='thread'." %
+                                 type(self).__name__)
+            return self.__next_parallel(dryrun, workers, executor, ordered, chunk_size)
+        return self.__next_serial(dryrun)
+
+    def __next_serial(self, dryrun):
+        """
+        Iterate over files in all sources and process them one by one.
+        """
+        # compile filters and create stat cache
+        self.prepare_iteration()
+
+        # when collecting stats, measure sources and process_file()
+        stats = self.__stats
+        process_file = self.process_file if stats is None else stats.measure_process(self.process_file)
+
+        try:
+            # call the start hook
+            self.on_start(dryrun)
+
+            # store current dir
+            curr_dir = ""
+
+            # iterate over sources (merged sources cover several of the original sources)
+            for src, covered in self.__plan:
+
+                # call the start_source hook
+                for curr_src in covered:
+                    self.on_start_source(curr_src, dryrun)
+
+                # when merging sources, also skip files that were already returned
+                match_filters = self.__source_match_filters(src)
+
+                # iterate over files
+                files = next(src) if stats is None else stats.measure_source(src, next(src))
+                for filename in files:
+
+                    # make sure file pass filters
+                    if not match_filters(filename):
+                        src.on_file_rejected(filename)
+                        continue
+
+                    # get curr dir to call the directory-enter hook
+                    new_curr_dir = os.path.dirname(filename)
+                    if new_curr_dir != curr_dir:
+                        self.on_enter_dir(new_curr_dir, dryrun)
+                        curr_dir = new_curr_dir
+
+                    # process file
+                    curr = process_file(filename, dryrun)
+
+                    # if after process we still want to return file for external iteration, return it
+                    if curr is not None:
+                        yield curr
+
+                # let sources know their files were processed, and call the end-source hook
+                for curr_src in covered:
+                    curr_src.on_processed()
+                    self.on_end_source(curr_src, dryrun)
+
+        finally:
+            self.finish_iteration()
+
+        # call the end iteration hook
+        self.on_end(dryrun)
+        if stats is not None:
+            stats.end()
+
+    def __next_parallel(self, dryrun, workers, executor, ordered, chunk_size):
+        """
+        Iterate over files in all sources and process them in chunks, using a pool of workers.
+        """
+        # compile filters and create stat cache
+        self.prepare_iteration()
+        stats = self.__stats
+
+        # note: concurrent.futures is slow to import, so its imported only when needed
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        # create the workers pool. when collecting stats, workers also time every process_file() call.
+        if executor == "process":
+            pool = ProcessPoolExecutor(workers, initializer=_init_process_worker, initargs=(self,))
+            process_chunk = _process_chunk_in_worker if stats is None else _process_chunk_timed_in_worker
+        else:
+            pool = ThreadPoolExecutor(workers)
+            process_chunk = functools.partial(_process_chunk if stats is None else _process_chunk_timed, self)
+
+        # max chunks to submit before waiting for results, to keep memory bounded
+        max_pending = workers * 2
+
+        # chunks being processed of current source
+        pending = ()
+
+        try:
+            # call the start hook
+            self.on_start(dryrun)
+
+            # store current dir
+            curr_dir = ""
+
+            # iterate over sources (merged sources cover several of the original sources)
+            for src, covered in self.__plan:
+
+                # call the start_source hook
+                for curr_src in covered:
+                    self.on_start_source(curr_src, dryrun)
+
+                # when merging sources, also skip files that were already returned
+                match_filters = self.__source_match_filters(src)
+
+                # chunks being processed and current chunk to fill
+                pending = collections.deque() if ordered else set()
+                chunk = []
+
+                # iterate over files
+                files = next(src) if stats is None else stats.measure_source(src, next(src))
+                for filename in files:
+
+                    # make sure file pass filters
+                    if not match_filters(filename):
+                        src.on_file_rejected(filename)
+                        continue
+
+                    # get curr dir to call the directory-enter hook
+                    new_curr_dir = os.path.dirname(filename)
+                    if new_curr_dir != curr_dir:
+                        self.on_enter_dir(new_curr_dir, dryrun)
+                        curr_dir = new_curr_dir
+
+                    # add file to chunk, and if chunk is full send it to the pool
+                    chunk.append(filename)
+                    if len(chunk) >= chunk_size:
+                        self.__add_pending(pending, pool.submit(process_chunk, chunk, dryrun))
+                        chunk = []
+
+                        # if too many chunks are pending, wait for results
+                        while len(pending) >= max_pending:
+                            for curr in self.__pop_results(pending, stats):
+                                yield curr
+
+                # send last chunk
+                if chunk:
+                    self.__add_pending(pending, pool.submit(process_chunk, chunk, dryrun))
+
+                # wait for all chunks of this source
+                while pending:
+                    for curr in self.__pop_results(pending, stats):
+                        yield curr
+
+                # let sources know their files were processed, and call the end-source hook
+                for curr_src in covered:
+                    curr_src.on_processed()
+                    self.on_end_source(curr_src, dryrun)
+
+        finally:
+            # cancel chunks that didn't start yet, and wait for the rest
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+            self.finish_iteration()
+
+        # call the end iteration hook
         self.on_end(dryrun)
-        raise StopIteration
+        if stats is not None:
+            stats.end()
+
+    @staticmethod
+    def __add_pending(pending, future):
+        """
+        Add a chunk future to the pending chunks (a deque when ordered, a set when unordered).
+        """
+        if isinstance(pending, set):
+            pending.add(future)
+        else:
+            pending.append(future)
+
+    @staticmethod
+    def __pop_results(pending, stats):
+        """
+        Wait for pending chunk(s) and return their results, skipping None values.
+        When ordered, will wait for the oldest chunk. Else, will wait for any chunk to finish.
+        When collecting stats, chunks results come with process_file() durations and bytes counted in worker
+        processes, which are added to stats.
+        """
+        if isinstance(pending, set):
+            from concurrent.futures import wait, FIRST_COMPLETED
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending.difference_update(done)
+        else:
+            done = [pending.popleft()]
+        chunks = [future.result() for future in done]
+        if stats is not None:
+            for _, durations, (read, written) in chunks:
+                stats.add_process_times(durations)
+                if read or written:
+                    stats.add_bytes(read, written)
+            chunks = [results for results, _, _ in chunks]
+        return [curr for results in chunks for curr in results if curr is not None]
 
     def on_enter_dir(self, directory, dryrun):
         """
@@ -281,34 +699,109 @@ class FilesIterator(object):
         """
         pass
 
-    def match_filters(self, path):
+    def prepare_iteration(self):
         """
-        Get filename and return True if file pass all filters and should be processed.
+        Compile filters, plan sources, push folders prune rules to sources, and create the stat cache and stats for a
+        new iteration.
+        This is called automatically when iteration starts.
+        """
+        # compile filters
+        self.compile_filters()
+        prune_folder = self.__compiled_filters.prune_folder
 
-        :param path: path to check.
-        :return: True if pass filters, false otherwise.
+        # when collecting stats, compile filters again with every filter wrapped to record its stats.
+        # note: wrapped filters can't be merged, so the prune rule is taken from the regular compiled filters.
+        self.__stats = None
+        if self.__collect_stats:
+            self.__stats = IterationStats(self.__filters, self.__stats_callback, self.__stats_interval)
+            measured = self.__stats.measure_filters(self.__filters)
+            self.__compiled_filters = filters.CompiledFilters(measured, self.FilterType)
+
+        # create stat cache, if needed, and pass it to sources and filters.
+        # sources also get the rule of folders they can skip, since all their files would be excluded anyway.
+        use_cache = self.UseStatCache or self.MergeSources or \
+            any(isinstance(filt, filters.StatFilterAPI) for filt, _ in self.__filters)
+        self.__stat_cache = StatCache() if use_cache else None
+
+        # plan sources. when merging sources, folder sources with nested roots are merged into a single source, and
+        # returned files are remembered by their device and inode.
+        if self.MergeSources:
+            self.__plan = sources.MergedFolderSource.plan(self.__sources)
+            self.__seen = InodeBloomFilter(self.MergeSourcesBloomCapacity) if self.MergeSourcesBloomCapacity \
+                else InodeSet()
+        else:
+            self.__plan = [(src, [src]) for src in self.__sources]
+            self.__seen = None
+        for src, _ in self.__plan:
+            src.set_stat_cache(self.__stat_cache)
+            src.set_prune_rule(prune_folder)
+        for filt, _ in self.__filters:
+            filt.set_stat_cache(self.__stat_cache)
+
+    def finish_iteration(self):
+        """
+        Clear the stat cache and prune rule pushed to sources and filters, so using them later (standalone or with
+        another iterator) won't use stale stats or skip folders.
+        This is called automatically when iteration ends, even if it failed or was stopped.
         """
-        # indicate if all required filters were matched
-        all_required_match = True
+        for src, _ in self.__plan or ():
+            src.set_stat_cache(None)
+            src.set_prune_rule(None)
+        for filt, _ in self.__filters:
+            filt.set_stat_cache(None)
 
-        # iterate over filters to match files
-        for filt, ftype in self.__filters:
+    def __source_match_filters(self, source):
+        """
+        Return the function to match files of a planned source with.
+        When merging sources, files are also skipped if they were already returned, unless the source return files
+        again on purpose (see SourceAPI.RepeatFiles).
+        """
+        if self.__seen is not None and not source.RepeatFiles:
+            return self.__match_new_file
+        return self.match_filters
 
-            # handle "Required" filters:
-            if all_required_match and ftype == self.FilterType.Required and not filt.match(path):
-                all_required_match = False
+    def __match_new_file(self, path):
+        """
+        Return True if file pass all filters and was not returned before (by its device and inode).
+        """
+        if not self.match_filters(path):
+            return False
+        try:
+            file_stat = self.stat(path)
+        except OSError:
+            return True
+        return self.__seen.add(file_stat.st_dev, file_stat.st_ino)
 
-            # handle "Include" filters:
-            elif ftype == self.FilterType.Include and filt.match(path):
-                return True
+    def stat(self, path):
+        """
+        Return stat info of a file (same as os.stat()).
+        While iterating with a stat cache, files already stat'ed by filters or sources are not stat'ed again.
 
-            # handle "Exclude" filters:
-            elif ftype == self.FilterType.Exclude and filt.match(path):
-                return False
+        :param path: file path.
+        """
+        if self.__stat_cache is not None:
+            return self.__stat_cache.stat(path)
+        return os.stat(path)
 
-        # if got here it means we processed all filters, and no include/exclude filter was matched.
-        # return if all required were matched
-        return all_required_match
+    def compile_filters(self):
+        """
+        Compile all filters into an optimized decision plan, used by match_filters().
+        This is called automatically when iteration starts.
+        """
+        self.__compiled_filters = filters.CompiledFilters(self.__filters, self.FilterType)
+
+    def match_filters(self, path):
+        """
+        Get filename and return True if file pass all filters and should be processed.
+        The first Include / Exclude filter to match (by order) determine the result. If none of them match,
+        return True only if all Required filters match.
+
+        :param path: path to check.
+        :return: True if pass filters, false otherwise.
+        """
+        if self.__compiled_filters is None:
+            self.compile_filters()
+        return self.__compiled_filters.match(path)
 
     def process_file(self, path, dryrun):
         """
@@ -1,8 +1,20 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-__all__ = ['FilterAPI', 'FilterExtension', "FilterRegex", 'FilterPattern', ]
+__all__ = ['FilterAPI', 'FilterExtension', "FilterRegex", 'FilterPattern', 'StatFilterAPI', 'FilterSize', 'FilterMTime',
+           'FilterOwner', 'FilterMode', ]
 
-from .filter_api import *
-from .extension_filter import *
-from .regex_filter import *
-from .pattern_filter import *
+from ..lazy_loader import lazy_loader
+
+# filters are imported on first access
+__getattr__, __dir__ = lazy_loader(__name__, {
+    'FilterAPI': '.filter_api',
+    'FilterExtension': '.extension_filter',
+    'FilterRegex': '.regex_filter',
+    'FilterPattern': '.pattern_filter',
+    'StatFilterAPI': '.stat_filter',
+    'FilterSize': '.size_filter',
+    'FilterMTime': '.mtime_filter',
+    'FilterOwner': '.owner_filter',
+    'FilterMode': '.mode_filter',
+    'CompiledFilters': '.compiled_filters',
+})
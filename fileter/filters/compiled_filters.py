@@ -0,0 +1,260 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Compile a list of filters and their types into a single optimized filter.
+This is used internally by the files iterator, so filters are compiled once when iteration starts and not
+evaluated one by one for every path.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+from .filter_api import FilterAPI
+from .extension_filter import FilterExtension
+from .regex_filter import FilterRegex
+from .pattern_filter import FilterPattern
+import fnmatch
+import os
+import re
+
+
+# regexes with backreferences (or conditions on groups) can't be merged, since merging change groups numbering
+_BACKREF_REGEX = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+# flags of a regex compiled from string without any flags
+_DEFAULT_FLAGS = re.compile("").flags
+
+# regexes with these might depend on what comes after the matched part, so they can't be used to prune folders
+_FORWARD_ASSERTION_REGEX = re.compile(r"\$|\\[ZbB]|\(\?[=!]")
+
+# if os.path.normcase() does nothing (eg not windows), patterns can be merged into the same regex as regexes
+_NORMCASE_IS_IDENTITY = os.path.normcase("A/b") == "A/b"
+
+
+class CompiledFilters(FilterAPI):
+    """
+    A filter that compile a list of (filter, filter type) into an optimized decision plan.
+
+    The decision is exactly the same as evaluating the filters one by one, eg:
+    - the first Include / Exclude filter to match (by order) determine if file is processed or not.
+    - if no Include / Exclude filter match, file is processed only if all Required filters match.
+
+    To make it fast, consecutive Include / Exclude filters of the same type are merged into a single matcher,
+    and all built-in filters of a matcher are merged: extension filters into one frozenset lookup, and
+    regex & pattern filters into one alternation regex.
+
+    In addition, Exclude filters that can only match whole folders trees (like the pattern "*/node_modules/*")
+    are compiled into prune_folder(), which sources use to skip these folders without listing them.
+    """
+
+    def __init__(self, filters, filter_types):
+        """
+        Compile the filters.
+        :param filters: list of (filter, filter type) tuples, by order.
+        :param filter_types: the class that define filter types values (see FilesIterator.FilterType).
+        """
+        # split Include / Exclude filters into runs of the same type (inside a run order is meaningless)
+        runs = []
+        required = []
+        for filt, ftype in filters:
+            if ftype == filter_types.Required:
+                required.append(filt)
+            elif ftype in (filter_types.Include, filter_types.Exclude):
+                is_include = ftype == filter_types.Include
+                if runs and runs[-1][0] == is_include:
+                    runs[-1][1].append(filt)
+                else:
+                    runs.append((is_include, [filt]))
+
+        # compile required filters and include / exclude runs
+        self.__required = self.__compile_all(required)
+        self.__runs = [(is_include, self.__compile_any(run)) for is_include, run in runs]
+
+        # compile the folders prune rule. only Exclude filters that come before all Include filters can be used,
+        # since an earlier Include filter might include some of the files.
+        self.prune_folder = self.__compile_prune(runs[0][1]) if runs and not runs[0][0] else None
+
+        # pick the fastest matching function for this plan.
+        # without Include filters, we can check the Required filters first and skip the Exclude filters if failed.
+        if not self.__runs:
+            self.match = self.__match_required
+        elif not any(is_include for is_include, _ in self.__runs):
+            self.match = self.__match_without_include
+        else:
+            self.match = self.__match_runs
+
+    def __match_required(self, filepath):
+        """
+        Return True if all Required filters match.
+        """
+        for match in self.__required:
+            if not match(filepath):
+                return False
+        return True
+
+    def __match_without_include(self, filepath):
+        """
+        Match when there are only Exclude filters (which are always merged into a single run).
+        """
+        return self.__match_required(filepath) and not self.__runs[0][1](filepath)
+
+    def __match_runs(self, filepath):
+        """
+        Match with Include / Exclude filters, by order.
+        """
+        for is_include, match in self.__runs:
+            if match(filepath):
+                return is_include
+        return self.__match_required(filepath)
+
+    @staticmethod
+    def __compile_any(filters):
+        """
+        Compile a list of filters into a single function that return True if any of them match.
+        """
+        extensions = set()
+        regexes = []
+        patterns = []
+        others = []
+
+        # collect built-in filters to merge. note: we check exact type, since subclasses might override match().
+        for filt in filters:
+            filter_type = type(filt)
+            if filter_type is FilterExtension:
+                extensions.update(filt.extensions)
+            elif filter_type is FilterRegex:
+                regexes.append(filt.regex)
+            elif filter_type is FilterPattern and filt.case_sensitive is None:
+                patterns.extend(filt.patterns)
+            else:
+                others.append(filt.match)
+
+        # build the list of matchers, cheapest first
+        matchers = []
+        if extensions:
+            matchers.append(_extension_matcher(frozenset(extensions)))
+        matchers.extend(_regex_matchers(regexes, patterns))
+        matchers.extend(others)
+
+        # if got just one matcher return it as-is
+        if len(matchers) == 1:
+            return matchers[0]
+
+        def match_any(filepath):
+            for match in matchers:
+                if match(filepath):
+                    return True
+            return False
+        return match_any
+
+    @staticmethod
+    def __compile_prune(filters):
+        """
+        Compile Exclude filters into a function that get folder path and return True if all paths in its tree
+        are excluded, or None if none of the filters can tell that.
+        """
+        matchers = []
+        for filt in filters:
+            filter_type = type(filt)
+
+            # patterns ending with "/*": if folder match the part before it, everything in folder match the pattern
+            if filter_type is FilterPattern:
+                prefixes = [pattern[:-2] for pattern in filt.patterns
+                            if pattern.endswith("/*") or pattern.endswith(os.sep + "*")]
+                if prefixes:
+                    matchers.append(FilterPattern(prefixes, filt.case_sensitive).match)
+
+            # regexes are matched from the start of path, so if a regex match "folder/" and don't look ahead
+            # of what it matched, it will also match everything in folder
+            elif filter_type is FilterRegex and not _FORWARD_ASSERTION_REGEX.search(filt.regex.pattern):
+                matchers.append(lambda folder, match=filt.regex.match: match(folder + os.sep) is not None)
+
+        # no filters can prune folders?
+        if not matchers:
+            return None
+
+        def prune_folder(folder):
+            for match in matchers:
+                if match(folder):
+                    return True
+            return False
+        return prune_folder
+
+    @staticmethod
+    def __compile_all(filters):
+        """
+        Compile a list of filters into a list of matching functions that must all match.
+        """
+        extensions = None
+        matchers = []
+        others = []
+
+        # merge built-in filters
+        for filt in filters:
+            filter_type = type(filt)
+
+            # a file has a single extension, so it must be in all extension filters
+            if filter_type is FilterExtension:
+                extensions = set(filt.extensions) if extensions is None else extensions.intersection(filt.extensions)
+
+            # every regex / pattern filter must match by itself
+            elif filter_type is FilterRegex:
+                matchers.extend(_regex_matchers([filt.regex], []))
+            elif filter_type is FilterPattern:
+                matchers.append(filt.match)
+            else:
+                others.append(filt.match)
+
+        # return matchers, cheapest first
+        if extensions is not None:
+            matchers.insert(0, _extension_matcher(frozenset(extensions)))
+        return matchers + others
+
+
+def _extension_matcher(extensions):
+    """
+    Return a function to match file extensions against a set of extensions (same logic as FilterExtension).
+    """
+    def match_extension(filepath):
+        index = filepath.rfind(".")
+        return index != -1 and filepath[index + 1:].lower() in extensions
+    return match_extension
+
+
+def _regex_matchers(regexes, patterns):
+    """
+    Return a list of functions to match compiled regexes and fnmatch patterns.
+    As many as possible are merged into a single alternation regex.
+    """
+    # split regexes we can safely merge from those we can't
+    mergeable = [regex for regex in regexes
+                 if regex.flags == _DEFAULT_FLAGS and not _BACKREF_REGEX.search(regex.pattern)]
+    matchers = [regex.match for regex in regexes if regex not in mergeable]
+
+    # translate patterns to regexes, the same way fnmatch does
+    patterns = [fnmatch.translate(os.path.normcase(pattern)) for pattern in patterns]
+
+    # merge regexes, and patterns too if we don't need to normalize case (eg not windows)
+    alternatives = ["(?:%s)" % regex.pattern for regex in mergeable]
+    if _NORMCASE_IS_IDENTITY:
+        alternatives.extend(patterns)
+        patterns = []
+    if alternatives:
+        matchers.extend(_merge_regexes(alternatives))
+
+    # merge patterns that are matched against normalized case path
+    if patterns:
+        for merged in _merge_regexes(patterns):
+            matchers.append(lambda filepath, match=merged: match(os.path.normcase(filepath)))
+
+    return matchers
+
+
+def _merge_regexes(regexes):
+    """
+    Merge list of regex strings into a single alternation regex, and return list of matching functions.
+    If regexes can't be merged (for example, if they use global flags), will return a function per regex.
+    """
+    try:
+        return [re.compile("|".join(regexes)).match]
+    except re.error:
+        return [re.compile(regex).match for regex in regexes]
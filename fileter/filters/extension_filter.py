@@ -21,6 +21,13 @@ class FilterExtension(FilterAPI):
         """
         self.__extensions = extensions if isinstance(extensions, (list, tuple)) else [extensions]
 
+    @property
+    def extensions(self):
+        """
+        Return the list of extensions this filter accept.
+        """
+        return self.__extensions
+
     def match(self, filepath):
         """
         The function to check file.
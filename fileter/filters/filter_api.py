@@ -26,3 +26,10 @@ class FilterAPI(object):
         Should return True if match, False otherwise.
         """
         raise NotImplementedError()
+
+    def set_stat_cache(self, stat_cache):
+        """
+        Called by the files iterator when iteration starts, with the stat cache to use (or None).
+        Filters that need files stat info should use it, so files are not stat'ed more than once.
+        """
+        pass
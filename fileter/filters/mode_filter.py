@@ -0,0 +1,33 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a filter by file mode (permissions and type bits).
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+from .stat_filter import StatFilterAPI
+
+
+class FilterMode(StatFilterAPI):
+    """
+    A filter by file mode bits. For example, to accept only files that the owner can execute:
+        FilterMode(stat.S_IXUSR)
+    And to accept only files that are not writable by others:
+        FilterMode(stat.S_IWOTH, 0)
+    """
+    def __init__(self, mask, value=None):
+        """
+        Create the mode filter.
+        :param mask: mode bits to check.
+        :param value: required value of the masked bits. if not provided, all bits in mask must be set.
+        """
+        super(FilterMode, self).__init__()
+        self.__mask = mask
+        self.__value = mask if value is None else value
+
+    def match_stat(self, stat):
+        """
+        Return True if file mode bits match.
+        """
+        return (stat.st_mode & self.__mask) == self.__value
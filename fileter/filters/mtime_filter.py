@@ -0,0 +1,40 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a filter by file modification time.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+from .stat_filter import StatFilterAPI
+
+
+class FilterMTime(StatFilterAPI):
+    """
+    A filter by file modification time.
+    """
+    def __init__(self, newer_than=None, older_than=None):
+        """
+        Create the modification time filter.
+        :param newer_than: if provided, will only accept files modified after this time.
+        :param older_than: if provided, will only accept files modified before this time.
+                           times can be either timestamps (seconds since epoch, like time.time()) or datetime objects.
+        """
+        super(FilterMTime, self).__init__()
+        self.__newer_than = self.__to_timestamp(newer_than)
+        self.__older_than = self.__to_timestamp(older_than)
+
+    @staticmethod
+    def __to_timestamp(value):
+        """
+        Convert datetime objects to timestamp.
+        """
+        return value.timestamp() if hasattr(value, "timestamp") else value
+
+    def match_stat(self, stat):
+        """
+        Return True if file modification time is in range.
+        """
+        if self.__newer_than is not None and stat.st_mtime <= self.__newer_than:
+            return False
+        return self.__older_than is None or stat.st_mtime < self.__older_than
@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a filter by file owner.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+from .stat_filter import StatFilterAPI
+
+# pwd is only available on unix
+try:
+    import pwd
+except ImportError:
+    pwd = None
+
+
+class FilterOwner(StatFilterAPI):
+    """
+    A filter by file owner.
+    """
+    def __init__(self, owners):
+        """
+        Create the owner filter.
+        :param owners: a single owner or a list of owners to accept.
+                       owners can be either user ids or user names (user names are only supported on unix).
+        """
+        super(FilterOwner, self).__init__()
+        owners = owners if isinstance(owners, (list, tuple)) else [owners]
+        self.__uids = frozenset(self.__to_uid(owner) for owner in owners)
+
+    @staticmethod
+    def __to_uid(owner):
+        """
+        Convert user name to user id.
+        """
+        if isinstance(owner, int):
+            return owner
+        if pwd is None:
+            raise ValueError("Filtering by user name is not supported on this platform! Use user ids instead.")
+        try:
+            return pwd.getpwnam(owner).pw_uid
+        except KeyError:
+            raise ValueError("Unknown user '%s'!" % owner)
+
+    def match_stat(self, stat):
+        """
+        Return True if file owner is one of the accepted owners.
+        """
+        return stat.st_uid in self.__uids
@@ -8,25 +8,53 @@ Since: 2016.
 """
 from .filter_api import FilterAPI
 import fnmatch
+import os
+import re
 
 
 class FilterPattern(FilterAPI):
     """
     A simple filter by linux-style file patterns.
+    All patterns are compiled into a single regex, so matching a path is just one regex match.
     """
-    def __init__(self, pattern):
+    def __init__(self, pattern, case_sensitive=None):
         """
         Create the extensions filter.
         :param pattern: a single pattern or a list of patterns to accept.
+        :param case_sensitive: if None (default), will use the OS convention (same as fnmatch).
+                               if True / False, will force case sensitive / insensitive matching.
         """
         self.__pattern = pattern if isinstance(pattern, (list, tuple)) else [pattern]
+        self.__case_sensitive = case_sensitive
+
+        # by default normalize case like fnmatch does (does nothing except on windows)
+        self.__normcase = case_sensitive is None and os.path.normcase("A/b") != "A/b"
+        patterns = [os.path.normcase(pattern) for pattern in self.__pattern] if self.__normcase else self.__pattern
+
+        # compile all patterns into a single regex (an empty list of patterns never match)
+        flags = re.IGNORECASE if case_sensitive is False else 0
+        regex = "|".join(fnmatch.translate(pattern) for pattern in patterns) if patterns else "(?!)"
+        self.__regex = re.compile(regex, flags)
+
+    @property
+    def patterns(self):
+        """
+        Return the list of patterns this filter accept.
+        """
+        return self.__pattern
+
+    @property
+    def case_sensitive(self):
+        """
+        Return if this filter is case sensitive (None = OS convention).
+        """
+        return self.__case_sensitive
 
     def match(self, filepath):
         """
         The function to check file.
         Should return True if match, False otherwise.
         """
-        for pattern in self.__pattern:
-            if len(fnmatch.filter([filepath], pattern)) > 0:
-                return True
-        return False
+        if self.__normcase:
+            filepath = os.path.normcase(filepath)
+        return self.__regex.match(filepath) is not None
@@ -21,6 +21,13 @@ class FilterRegex(FilterAPI):
         """
         self.__regex = re.compile(regex_string)
 
+    @property
+    def regex(self):
+        """
+        Return the compiled regex this filter use.
+        """
+        return self.__regex
+
     def match(self, filepath):
         """
         The function to check file.
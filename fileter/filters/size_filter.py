@@ -0,0 +1,32 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a filter by file size.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+from .stat_filter import StatFilterAPI
+
+
+class FilterSize(StatFilterAPI):
+    """
+    A filter by file size, in bytes.
+    """
+    def __init__(self, min_size=None, max_size=None):
+        """
+        Create the size filter.
+        :param min_size: if provided, will only accept files at least this big.
+        :param max_size: if provided, will only accept files up to this size.
+        """
+        super(FilterSize, self).__init__()
+        self.__min_size = min_size
+        self.__max_size = max_size
+
+    def match_stat(self, stat):
+        """
+        Return True if file size is in range.
+        """
+        if self.__min_size is not None and stat.st_size < self.__min_size:
+            return False
+        return self.__max_size is None or stat.st_size <= self.__max_size
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Base class for filters that check files stat info (size, mtime, owner, etc.)
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+from .filter_api import FilterAPI
+import os
+
+
+class StatFilterAPI(FilterAPI):
+    """
+    Base class for filters by file stat info.
+    Inherit from this class and implement "match_stat()" to create a stat filter. Stat info is taken from the files
+    iterator's stat cache, so every file is stat'ed at most once across all filters and process_file().
+    """
+
+    def __init__(self):
+        """
+        Init the stat filter.
+        """
+        self.__stat_cache = None
+
+    def set_stat_cache(self, stat_cache):
+        """
+        Set the stat cache to get files stat info from.
+        """
+        self.__stat_cache = stat_cache
+
+    def match(self, filepath):
+        """
+        Get file stat and check it with match_stat(). Files we can't stat never match.
+        """
+        try:
+            stat = self.__stat_cache.stat(filepath) if self.__stat_cache is not None else os.stat(filepath)
+        except OSError:
+            return False
+        return self.match_stat(stat)
+
+    def match_stat(self, stat):
+        """
+        The function to check file stat info.
+        Should return True if match, False otherwise.
+        """
+        raise NotImplementedError()
@@ -0,0 +1,193 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+A files content hashing service with a persistent on-disk cache, so files that didn't change since the last run
+are not read and hashed again.
+
+Hashes are stored in a SQLite database, keyed by file identity (device and inode) and validated by file size and
+modification time (in nanoseconds). Files are hashed again whenever any of these change.
+
+Usage example:
+
+cache = HashCache("hashes.db", algorithm="sha256")
+digest = cache.hash_file("some_file")
+cache.close()
+
+Author: Ronen Ness.
+Since: 2016
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# xxhash is optional (not in the standard library)
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+class HashCache(object):
+    """
+    Hash files content, with an on-disk cache of hashes.
+    The cache is bounded: when it grows above max_entries, the least recently used hashes are removed on commit.
+    Thread safe, so it can be used from process_file() with a threads pool.
+    """
+
+    # default max hashes to keep in cache
+    MaxEntries = 1000000
+
+    # size of chunks to read when hashing files
+    ChunkSize = 1024 * 1024
+
+    # files modified less than this many seconds before being hashed are not cached, since they might change
+    # again within the same mtime tick without changing their mtime.
+    RacyWindow = 2.0
+
+    def __init__(self, path=None, algorithm="sha256", max_entries=None):
+        """
+        Open or create the hash cache.
+        :param path: cache file path (created if doesn't exist). if None, will keep cache in memory only.
+        :param algorithm: hash algorithm: "sha256" (default), "blake2b", "xxhash" (requires the xxhash package),
+                          or any other algorithm name hashlib support.
+        :param max_entries: max hashes to keep in cache (default to MaxEntries).
+        """
+        self.algorithm = algorithm
+        self.__new_hash = _hash_factory(algorithm)
+        self.__max_entries = max_entries or self.MaxEntries
+        self.__conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS hashes "
+                            "(dev INTEGER NOT NULL, ino INTEGER NOT NULL, algorithm TEXT NOT NULL, "
+                            "size INTEGER NOT NULL, mtime INTEGER NOT NULL, digest TEXT NOT NULL, "
+                            "used INTEGER NOT NULL, PRIMARY KEY (dev, ino, algorithm))")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used)")
+        self.__lock = threading.Lock()
+
+        # keys of hashes used since last commit, as {(dev, ino): time used}. written to cache on commit.
+        self.__used = {}
+
+        # how many hashes were taken from cache, how many files were hashed, and how many bytes were read
+        self.hits = 0
+        self.misses = 0
+        self.bytes_hashed = 0
+
+    def hash_file(self, path, file_stat=None):
+        """
+        Return the hex digest of a file's content, from cache if the file didn't change.
+        :param path: file path.
+        :param file_stat: optional file stat info (same as os.stat(path)), if you already have it.
+        """
+        if file_stat is None:
+            file_stat = os.stat(path)
+
+        # get from cache
+        digest = self.get(file_stat)
+        if digest is not None:
+            return digest
+
+        # hash file and store in cache
+        digest = self.hash_data(path)
+        self.put(file_stat, digest)
+        return digest
+
+    def hash_data(self, path):
+        """
+        Read a file in chunks and return the hex digest of its content, without using the cache.
+        :param path: file path.
+        """
+        file_hash = self.__new_hash()
+        with open(path, "rb") as infile:
+            for chunk in iter(lambda: infile.read(self.ChunkSize), b""):
+                file_hash.update(chunk)
+            size = infile.tell()
+        with self.__lock:
+            self.bytes_hashed += size
+        return file_hash.hexdigest()
+
+    def get(self, file_stat):
+        """
+        Get a file hash from cache.
+        :param file_stat: file stat info.
+        :return: hex digest, or None if not in cache or file changed.
+        """
+        key = (file_stat.st_dev, file_stat.st_ino)
+        with self.__lock:
+            row = self.__conn.execute("SELECT size, mtime, digest FROM hashes WHERE dev = ? AND ino = ? AND "
+                                      "algorithm = ?", key + (self.algorithm,)).fetchone()
+            if row is None or row[:2] != (file_stat.st_size, file_stat.st_mtime_ns):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__used[key] = time.time_ns()
+        return row[2]
+
+    def put(self, file_stat, digest):
+        """
+        Store a file hash in cache.
+        :param file_stat: file stat info, taken before the file was hashed.
+        :param digest: hex digest of file content.
+        """
+        key = (file_stat.st_dev, file_stat.st_ino)
+        now = time.time_ns()
+        with self.__lock:
+
+            # store hash, unless file was modified too recently to trust its mtime
+            if file_stat.st_mtime_ns < now - int(self.RacyWindow * 1e9):
+                self.__conn.execute("INSERT OR REPLACE INTO hashes (dev, ino, algorithm, size, mtime, digest, used) "
+                                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    key + (self.algorithm, file_stat.st_size, file_stat.st_mtime_ns, digest, now))
+            else:
+                self.__conn.execute("DELETE FROM hashes WHERE dev = ? AND ino = ? AND algorithm = ?",
+                                    key + (self.algorithm,))
+            self.__used.pop(key, None)
+
+    def __len__(self):
+        """
+        Return how many hashes are in cache (of all algorithms).
+        """
+        with self.__lock:
+            return self.__conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def commit(self):
+        """
+        Write all changes to disk, and remove least recently used hashes if cache is too big.
+        """
+        with self.__lock:
+
+            # update when hashes were last used
+            self.__conn.executemany("UPDATE hashes SET used = ? WHERE dev = ? AND ino = ? AND algorithm = ?",
+                                    [(used, dev, ino, self.algorithm) for (dev, ino), used in self.__used.items()])
+            self.__used.clear()
+
+            # remove least recently used hashes
+            count = self.__conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+            if count > self.__max_entries:
+                self.__conn.execute("DELETE FROM hashes WHERE rowid IN "
+                                    "(SELECT rowid FROM hashes ORDER BY used LIMIT ?)", (count - self.__max_entries,))
+            self.__conn.commit()
+
+    def close(self):
+        """
+        Write all changes and close the cache.
+        """
+        self.commit()
+        self.__conn.close()
+
+
+def _hash_factory(algorithm):
+    """
+    Return a function to create a new hash object of an algorithm.
+    """
+    if algorithm == "xxhash":
+        if xxhash is None:
+            raise ValueError("Hash algorithm 'xxhash' requires the xxhash package (pip install xxhash)!")
+        return getattr(xxhash, "xxh3_128", xxhash.xxh64)
+    if algorithm in ("blake2b", "sha256"):
+        return getattr(hashlib, algorithm)
+    try:
+        hashlib.new(algorithm)
+    except ValueError:
+        raise ValueError("Unknown hash algorithm '%s'!" % algorithm)
+    return lambda: hashlib.new(algorithm)
@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Compact sets of files identities (device and inode numbers), used to return every file only once when iterating
+sources that overlap, and to detect loops when following symbolic links.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+import array
+import math
+
+
+class InodeSet(object):
+    """
+    A set of (st_dev, st_ino) pairs.
+    Inodes are kept in an open-addressing hash table per device, stored in an array of 64 bit integers, so every
+    inode takes about 12 bytes instead of over 100 bytes for a tuple in a python set.
+    """
+
+    # grow tables when they are this full
+    MaxLoad = 0.7
+
+    # initial table size per device (must be a power of 2)
+    InitialSize = 1024
+
+    def __init__(self):
+        """
+        Create an empty set.
+        """
+        # tables per device, as {st_dev: [table array, items count, bits]}
+        self.__tables = {}
+        self.__count = 0
+
+    def add(self, dev, ino):
+        """
+        Add a file identity to set.
+        :param dev: file's st_dev.
+        :param ino: file's st_ino.
+        :return: True if added, False if it was already in set.
+        """
+        table = self.__tables.get(dev)
+        if table is None:
+            table = self.__tables[dev] = [array.array("Q", bytes(8 * self.InitialSize)), 0,
+                                          self.InitialSize.bit_length() - 1]
+
+        # find inode slot. inodes are stored +1, since 0 marks an empty slot.
+        key = (ino + 1) & 0xFFFFFFFFFFFFFFFF
+        slots, _, bits = table
+        index = _find_slot(slots, bits, key)
+        if slots[index] == key:
+            return False
+
+        # add inode, and grow table if too full
+        slots[index] = key
+        table[1] += 1
+        self.__count += 1
+        if table[1] > len(slots) * self.MaxLoad:
+            self.__grow(table)
+        return True
+
+    def __contains__(self, file_id):
+        """
+        Return if a (st_dev, st_ino) pair is in set.
+        """
+        dev, ino = file_id
+        table = self.__tables.get(dev)
+        if table is None:
+            return False
+        key = (ino + 1) & 0xFFFFFFFFFFFFFFFF
+        slots, _, bits = table
+        return slots[_find_slot(slots, bits, key)] == key
+
+    def __len__(self):
+        """
+        Return how many files are in set.
+        """
+        return self.__count
+
+    @staticmethod
+    def __grow(table):
+        """
+        Double a table size and re-add all its inodes.
+        """
+        old_slots = table[0]
+        bits = table[2] + 1
+        slots = array.array("Q", bytes(8 * (1 << bits)))
+        for key in old_slots:
+            if key:
+                slots[_find_slot(slots, bits, key)] = key
+        table[0] = slots
+        table[2] = bits
+
+
+class InodeBloomFilter(object):
+    """
+    An approximate set of (st_dev, st_ino) pairs with fixed memory, for when walks are too big to remember every file.
+    add() might wrongly report a new pair as already in set (about error_rate of the times when the set holds
+    'capacity' pairs, and more above it), but never the other way around.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        Create an empty filter.
+        :param capacity: how many pairs the filter is expected to hold.
+        :param error_rate: chance of wrongly reporting a new pair as already in set, when filter is full.
+        """
+        # get bits and hash functions count for the required error rate
+        self.__bits = max(64, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.__hashes = max(1, int(round(self.__bits / float(capacity) * math.log(2))))
+        self.__array = bytearray((self.__bits + 7) // 8)
+        self.__count = 0
+
+    def add(self, dev, ino):
+        """
+        Add a file identity to filter.
+        :param dev: file's st_dev.
+        :param ino: file's st_ino.
+        :return: True if added, False if it was (probably) already in filter.
+        """
+        added = False
+        bits = self.__array
+        for position in self.__positions(dev, ino):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.__count += 1
+        return added
+
+    def __contains__(self, file_id):
+        """
+        Return if a (st_dev, st_ino) pair is (probably) in filter.
+        """
+        bits = self.__array
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(*file_id))
+
+    def __len__(self):
+        """
+        Return how many files were added to filter (not counting false positives).
+        """
+        return self.__count
+
+    def __positions(self, dev, ino):
+        """
+        Return the bits positions of a file identity (double hashing).
+        """
+        first = _mix64(ino ^ _mix64(dev))
+        second = _mix64(first) | 1
+        return [(first + i * second) % self.__bits for i in range(self.__hashes)]
+
+
+def _mix64(value):
+    """
+    Scramble a 64 bit integer (splitmix64 finalizer).
+    """
+    value &= 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+def _find_slot(slots, bits, key):
+    """
+    Return the index of a key in table, or of the empty slot to put it in (linear probing).
+    """
+    mask = (1 << bits) - 1
+    index = ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - bits)
+    while True:
+        slot = slots[index]
+        if slot == key or slot == 0:
+            return index
+        index = (index + 1) & mask
@@ -0,0 +1,295 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Profiling stats of a files iteration: how long sources took to walk, how often and how long every filter was
+evaluated, process_file() latency histogram, bytes read and written, and files per second.
+
+Stats are collected only when enabled on the iterator (see FilesIterator.enable_stats()). When they are disabled,
+the iteration loop is exactly the same as without this module.
+
+Author: Ronen Ness.
+Since: 2016
+"""
+from .filters.filter_api import FilterAPI
+import threading
+import time
+
+
+class SourceStats(object):
+    """
+    Stats of a single source: how many paths it returned, and how long it took to return them (listing folders,
+    matching patterns, etc). Time spent on filtering and processing paths is not included.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.paths = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        """
+        Return stats as dictionary.
+        """
+        return {"source": repr(self.source), "paths": self.paths, "seconds": self.seconds}
+
+
+class FilterStats(object):
+    """
+    Stats of a single filter: how many paths it was evaluated on, how many of them matched, and total time.
+    Note: filters are not evaluated on paths the decision for was already made, so filters order matters.
+    """
+
+    def __init__(self, files_filter, filter_type):
+        self.filter = files_filter
+        self.filter_type = filter_type
+        self.evaluations = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    @property
+    def hit_rate(self):
+        """
+        Return the ratio of evaluations that matched (0.0 - 1.0), or None if filter was never evaluated.
+        """
+        return self.hits / float(self.evaluations) if self.evaluations else None
+
+    def as_dict(self):
+        """
+        Return stats as dictionary.
+        """
+        return {"filter": repr(self.filter), "filter_type": self.filter_type, "evaluations": self.evaluations,
+                "hits": self.hits, "hit_rate": self.hit_rate, "seconds": self.seconds}
+
+
+class LatencyHistogram(object):
+    """
+    A histogram of durations, with power-of-two microseconds buckets: bucket i count durations between
+    2^(i-1) and 2^i microseconds (bucket 0 is for durations under 1 microsecond).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.__buckets = []
+
+    def add(self, seconds):
+        """
+        Add a duration to the histogram.
+        :param seconds: duration in seconds.
+        """
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+        # add to bucket
+        index = int(seconds * 1000000).bit_length()
+        if index >= len(self.__buckets):
+            self.__buckets.extend([0] * (index + 1 - len(self.__buckets)))
+        self.__buckets[index] += 1
+
+    @property
+    def mean(self):
+        """
+        Return mean duration, or None if histogram is empty.
+        """
+        return self.total / self.count if self.count else None
+
+    def buckets(self):
+        """
+        Return list of (bucket upper bound in seconds, count), for all buckets up to the slowest duration.
+        """
+        return [((1 << index) / 1000000.0, count) for index, count in enumerate(self.__buckets)]
+
+    def percentile(self, percent):
+        """
+        Return the duration that this percent of durations are lower than, or None if histogram is empty.
+        The value is an upper bound: its the top of the bucket the percentile falls in (but never above max).
+        :param percent: percentile to get (0 - 100).
+        """
+        if not self.count:
+            return None
+        needed = self.count * percent / 100.0
+        seen = 0
+        for upper, count in self.buckets():
+            seen += count
+            if seen >= needed:
+                return min(upper, self.max)
+        return self.max
+
+    def as_dict(self):
+        """
+        Return histogram as dictionary.
+        """
+        return {"count": self.count, "total": self.total, "min": self.min, "max": self.max, "mean": self.mean,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99),
+                "buckets": self.buckets()}
+
+
+class IterationStats(object):
+    """
+    Stats of a single iteration of a files iterator.
+
+    - sources: list of SourceStats, by iteration order.
+    - filters: list of FilterStats, by the order filters were added.
+    - process_time: LatencyHistogram of process_file() calls.
+    - files: how many files passed filters and were processed.
+    - bytes_read / bytes_written: bytes iterators reported reading and writing (see FilesIterator.count_bytes()).
+    - elapsed / files_per_sec: time since iteration started (or total time, once ended) and processing rate.
+    """
+
+    def __init__(self, filters=(), callback=None, interval=1.0):
+        """
+        Create the iteration stats.
+        :param filters: list of (filter, filter type) the iterator use.
+        :param callback: optional function to call with this object every 'interval' seconds while iterating,
+                         and once when iteration ends.
+        :param interval: how often to call the callback, in seconds.
+        """
+        self.sources = []
+        self.filters = [FilterStats(filt, filter_type) for filt, filter_type in filters]
+        self.process_time = LatencyHistogram()
+        self.files = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.ended = False
+        self.__callback = callback
+        self.__interval = interval
+        self.__start = time.perf_counter()
+        self.__end = None
+        self.__next_report = time.monotonic() + interval
+        self.__lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        """
+        Return seconds since iteration started, or total iteration time if it ended.
+        """
+        return (self.__end if self.__end is not None else time.perf_counter()) - self.__start
+
+    @property
+    def files_per_sec(self):
+        """
+        Return how many files were processed per second.
+        """
+        elapsed = self.elapsed
+        return self.files / elapsed if elapsed else None
+
+    def measure_filters(self, filters):
+        """
+        Return a list of (filter, filter type) where every filter is wrapped to record its stats.
+        :param filters: list of (filter, filter type), the same list this object was created with.
+        """
+        return [(_MeasuredFilter(filt, filter_stats), filter_type)
+                for (filt, filter_type), filter_stats in zip(filters, self.filters)]
+
+    def measure_source(self, source, paths):
+        """
+        Iterate the paths of a source and record how long it took to get every path.
+        :param source: the source being iterated.
+        :param paths: iterator of the source paths.
+        """
+        source_stats = SourceStats(source)
+        self.sources.append(source_stats)
+        clock = time.perf_counter
+        paths = iter(paths)
+        while True:
+            start = clock()
+            try:
+                path = next(paths)
+            except StopIteration:
+                source_stats.seconds += clock() - start
+                return
+            source_stats.seconds += clock() - start
+            source_stats.paths += 1
+            self.__report()
+            yield path
+
+    def measure_process(self, process_file):
+        """
+        Return a wrapper of process_file() that record its latency.
+        :param process_file: the function to wrap.
+        """
+        clock = time.perf_counter
+
+        def measured_process_file(path, dryrun):
+            start = clock()
+            ret = process_file(path, dryrun)
+            self.add_process_times((clock() - start,))
+            return ret
+        return measured_process_file
+
+    def add_process_times(self, durations):
+        """
+        Record durations of process_file() calls (called with workers results, which are timed in the workers).
+        :param durations: list of durations in seconds.
+        """
+        for seconds in durations:
+            self.process_time.add(seconds)
+        self.files += len(durations)
+        self.__report()
+
+    def add_bytes(self, read=0, written=0):
+        """
+        Add to the counters of bytes read and written. Thread safe.
+        """
+        with self.__lock:
+            self.bytes_read += read
+            self.bytes_written += written
+
+    def end(self):
+        """
+        Called when iteration ends: stop the clock and call the callback.
+        """
+        self.__end = time.perf_counter()
+        self.ended = True
+        if self.__callback is not None:
+            self.__callback(self)
+
+    def __report(self):
+        """
+        Call the callback, if its time to.
+        """
+        if self.__callback is not None and time.monotonic() >= self.__next_report:
+            self.__next_report = time.monotonic() + self.__interval
+            self.__callback(self)
+
+    def as_dict(self):
+        """
+        Return all stats as dictionary (for example, to dump as JSON).
+        """
+        return {
+            "elapsed": self.elapsed,
+            "ended": self.ended,
+            "files": self.files,
+            "files_per_sec": self.files_per_sec,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "sources": [source.as_dict() for source in self.sources],
+            "filters": [filt.as_dict() for filt in self.filters],
+            "process_time": self.process_time.as_dict(),
+        }
+
+
+class _MeasuredFilter(FilterAPI):
+    """
+    A filter that wraps another filter and record its evaluations, hits and time.
+    """
+
+    def __init__(self, files_filter, filter_stats):
+        self.__match = files_filter.match
+        self.__stats = filter_stats
+
+    def match(self, filepath):
+        start = time.perf_counter()
+        ret = self.__match(filepath)
+        stats = self.__stats
+        stats.seconds += time.perf_counter() - start
+        stats.evaluations += 1
+        if ret:
+            stats.hits += 1
+        return ret
@@ -1,9 +1,20 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-__all__ = ['ConcatFiles', 'PrintFiles', "Grep", "RemoveFiles", "AddHeader", ]
+__all__ = ['ConcatFiles', 'PrintFiles', "Grep", "GrepMatch", "RemoveFiles", "RemoveReport", "AddHeader",
+           "FindDuplicates", "DuplicateGroup", "HashFiles", ]
 
-from .concat_files import *
-from .print_files import *
-from .remove_files import *
-from .add_header import *
-from .grep import *
+from ..lazy_loader import lazy_loader
+
+# iterators are imported on first access
+__getattr__, __dir__ = lazy_loader(__name__, {
+    'ConcatFiles': '.concat_files',
+    'PrintFiles': '.print_files',
+    'RemoveFiles': '.remove_files',
+    'RemoveReport': '.remove_files',
+    'AddHeader': '.add_header',
+    'Grep': '.grep',
+    'GrepMatch': '.grep',
+    'FindDuplicates': '.find_duplicates',
+    'DuplicateGroup': '.find_duplicates',
+    'HashFiles': '.hash_files',
+})
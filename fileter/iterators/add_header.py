@@ -8,6 +8,9 @@ Since: 2016.
 """
 
 from .. import files_iterator
+import os
+import shutil
+import tempfile
 
 
 class AddHeader(files_iterator.FilesIterator):
@@ -19,13 +22,20 @@ class AddHeader(files_iterator.FilesIterator):
     # -*- coding: utf-8 -*-
 
     To all python files.
+
+    Files are rewritten into a temporary file in the same folder which then replace the original file, so memory
+    is constant regardless of files size, and a crash in the middle never leaves a truncated file.
     """
 
-    def __init__(self, header, normalize_br=False):
+    # size of chunks to use when copying files content
+    ChunkSize = 1024 * 1024
+
+    def __init__(self, header, normalize_br=False, encoding="utf-8"):
         """
         Add header to files.
         :param header: header to add to all files.
         :param normalize_br: if True, will normalize \r\n into \n.
+        :param encoding: encoding to write header with.
         """
         super(AddHeader, self).__init__()
 
@@ -35,6 +45,7 @@ class AddHeader(files_iterator.FilesIterator):
 
         # set header and if we want to normalize br
         self.__header = header
+        self.__header_bytes = header.encode(encoding)
         self.__normalize_br = normalize_br
 
     def process_file(self, path, dryrun):
@@ -44,36 +55,61 @@ class AddHeader(files_iterator.FilesIterator):
         if dryrun:
             return path
 
-        # get file's current header
-        with open(path, "r") as infile:
-            head = infile.read(len(self.__header))
+        with open(path, "rb") as infile:
 
-        # normalize line breaks
-        if self.__normalize_br:
-            head = head.replace("\r\n", "\n")
+            # get file's current header. line breaks might be \r\n in file, so read enough bytes for that.
+            head = infile.read(len(self.__header_bytes) + self.__header_bytes.count(b"\n"))
 
-        # already contain header? skip
-        if head == self.__header:
-            return path
+            # normalize line breaks, the same way reading in text mode does
+            head = head.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
 
-        # add header to file
-        self.push_header(path)
+            # already contain header? skip
+            if head.startswith(self.__header_bytes):
+                self.count_bytes(read=infile.tell())
+                return path
+
+            # add header to file, reusing the same file handle
+            infile.seek(0)
+            self.push_header(path, infile)
 
         # return processed file
         return path
 
-    def push_header(self, filename):
+    def push_header(self, filename, infile=None):
         """
         Push the header to a given filename
         :param filename: the file path to push into.
+        :param infile: optional file already opened for reading in binary mode, positioned at the start.
         """
-        # open file and read it all
-        with open(filename, "r") as infile:
-            content = infile.read()
-
-        # push header
-        content = self.__header + content
-
-        # re-write file with the header
-        with open(filename, "w") as outfile:
-            outfile.write(content)
+        # open file if not provided
+        if infile is None:
+            with open(filename, "rb") as infile:
+                return self.push_header(filename, infile)
+
+        # write to the real file and not to links
+        filename = os.path.realpath(filename)
+
+        # write header and content into a temporary file in the same folder
+        fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(filename))
+        try:
+            with os.fdopen(fd, "wb") as outfile:
+                outfile.write(self.__header_bytes)
+                shutil.copyfileobj(infile, outfile, self.ChunkSize)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+                self.count_bytes(read=infile.tell(), written=outfile.tell())
+
+            # keep file permissions and owner
+            file_stat = os.fstat(infile.fileno())
+            os.chmod(temp_path, file_stat.st_mode & 0o7777)
+            try:
+                os.chown(temp_path, file_stat.st_uid, file_stat.st_gid)
+            except (AttributeError, OSError):
+                pass
+
+            # replace the original file
+            os.replace(temp_path, filename)
+
+        except BaseException:
+            os.remove(temp_path)
+            raise
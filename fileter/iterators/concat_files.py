@@ -8,13 +8,37 @@ Since: 2016.
 """
 
 from .. import files_iterator
+import errno
+import os
+import stat
+import sys
+import threading
+
+
+# errors that mean kernel-side copy is not supported for these files, and we should fall back to buffered copy
+_KERNEL_COPY_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP)
 
 
 class ConcatFiles(files_iterator.FilesIterator):
     """
     This files iterator concat all scanned files.
+    Data is copied by the kernel when possible (os.copy_file_range / os.sendfile), so it never pass through
+    python. Otherwise, data is copied in fixed-size chunks, so memory is bounded regardless of files size.
+
+    Note: with a threads pool (executor="thread"), every file is copied to output while holding a lock, so files
+    are never mixed, but their order is not deterministic. a processes pool is rejected, since processes can't
+    share the lock.
     """
 
+    # if true, will try to copy data with kernel-side copy functions when available
+    KernelCopy = True
+
+    # size of chunks to use when copying with a buffer
+    ChunkSize = 1024 * 1024
+
+    # processes can't share the output file lock
+    AllowProcessPool = False
+
     def __init__(self, outfile):
         """
         concat all source files into one output file.
@@ -23,13 +47,24 @@ class ConcatFiles(files_iterator.FilesIterator):
         super(ConcatFiles, self).__init__()
         self._output_path = outfile
         self._output_file = None
+        self.__buffer = None
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        """
+        Return state for pickling. The lock can't be pickled.
+        """
+        state = super(ConcatFiles, self).__getstate__()
+        state["_ConcatFiles__lock"] = None
+        return state
 
     def on_start(self, dryrun):
         """
         Open the output file.
         """
+        # note: output is not buffered, since data is written directly to its file descriptor
         if not dryrun:
-            self._output_file = open(self._output_path, "wb")
+            self._output_file = open(self._output_path, "wb", buffering=0)
 
     def on_end(self, dryrun):
         """
@@ -50,10 +85,62 @@ class ConcatFiles(files_iterator.FilesIterator):
         if dryrun:
             return path
 
-        # concat file with output file
-        with open(path, "rb") as infile:
-            data = infile.read()
-            self._output_file.write(data)
+        # concat file with output file. the lock keeps files from being mixed when processing with threads.
+        with open(path, "rb", buffering=0) as infile, self.__lock:
+            self.copy_data(infile, self._output_file)
+            self.count_bytes(read=infile.tell(), written=infile.tell())
 
         # return processed file path
         return path
+
+    def copy_data(self, infile, outfile):
+        """
+        Copy all data from input file (from its current position) to output file.
+
+        :param infile: unbuffered binary file to read from.
+        :param outfile: unbuffered binary file to write to.
+        """
+        # try kernel-side copy. note: file positions are updated by the kernel, so if a method fails in the
+        # middle we can just continue with the next one.
+        if self.KernelCopy and stat.S_ISREG(os.fstat(infile.fileno()).st_mode):
+            for copy_func in (_copy_file_range, _sendfile):
+                try:
+                    if copy_func(infile.fileno(), outfile.fileno(), self.ChunkSize):
+                        break
+                except OSError as e:
+                    if e.errno not in _KERNEL_COPY_UNSUPPORTED:
+                        raise
+
+        # copy in chunks, reusing the same buffer. if data was already copied by the kernel, there's nothing
+        # left to read, but some files (like in /proc) report no data to the kernel copy functions.
+        if self.__buffer is None:
+            self.__buffer = memoryview(bytearray(self.ChunkSize))
+        while True:
+            size = infile.readinto(self.__buffer)
+            if not size:
+                return
+            written = 0
+            while written < size:
+                written += outfile.write(self.__buffer[written:size])
+
+
+def _copy_file_range(in_fd, out_fd, chunk_size):
+    """
+    Copy all data using os.copy_file_range (linux 4.5+), or return False if not available.
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+    while os.copy_file_range(in_fd, out_fd, chunk_size * 64):
+        pass
+    return True
+
+
+def _sendfile(in_fd, out_fd, chunk_size):
+    """
+    Copy all data using os.sendfile (linux 2.6.33+ for regular files output), or return False if not available.
+    """
+    if not hasattr(os, "sendfile") or not sys.platform.startswith("linux"):
+        return False
+    while os.sendfile(out_fd, in_fd, None, chunk_size * 64):
+        pass
+    return True
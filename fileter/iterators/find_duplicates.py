@@ -0,0 +1,184 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Find duplicate files by content.
+Use this as an iterator of duplicate groups, eg:
+
+for group in FindDuplicates().add_folder("artifacts"):
+    print group.size, group.paths
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+
+from .. import files_iterator
+import collections
+import hashlib
+import itertools
+import os
+
+
+# a group of files with the same content:
+# size - size of every file in group, in bytes.
+# digest - hex digest of the files content hash.
+# paths - list of files paths, by iteration order.
+DuplicateGroup = collections.namedtuple("DuplicateGroup", ["size", "digest", "paths"])
+
+
+class FindDuplicates(files_iterator.FilesIterator):
+    """
+    This iterator find files with the same content, and return them in groups (DuplicateGroup).
+
+    Files are compared in stages, so almost no data is read for unique files:
+    1. files are grouped by size (from the stat cache, so usually without extra system calls).
+    2. files of the same size are grouped by a hash of their first and last blocks.
+    3. files with the same partial hash are grouped by a hash of their full content.
+    Hashing is done in a pool of threads, and groups are returned as soon as they are confirmed, biggest files first.
+
+    Note: hard links to the same file are not duplicates (removing them frees no space), so only the first path
+    of every file is used. Files that can't be read are skipped.
+    """
+
+    # always use stat cache, to get files sizes from the folders listing
+    UseStatCache = True
+
+    # size of the first / last blocks to hash in the partial hash stage
+    BlockSize = 4096
+
+    # size of chunks to read when hashing the full content
+    ChunkSize = 1024 * 1024
+
+    def __init__(self, workers=4, min_size=1):
+        """
+        Find duplicate files.
+        :param workers: how many threads to use for hashing files.
+        :param min_size: ignore files smaller than this size, in bytes (default skip empty files).
+        """
+        super(FindDuplicates, self).__init__()
+        self.__workers = workers
+        self.__min_size = min_size
+
+    def __iter__(self):
+        """
+        Return the duplicate groups generator.
+        """
+        return self.duplicates()
+
+    def duplicates(self):
+        """
+        Iterate over all files and return groups of files with the same content lazily, as DuplicateGroup
+        (size, digest, paths) records.
+        """
+        # group files by size. we iterate as dry-run to just get the files paths
+        by_size = collections.defaultdict(list)
+        seen = set()
+        for path in self.next(dryrun=True):
+            try:
+                file_stat = self.stat(path)
+            except OSError:
+                continue
+            if file_stat.st_size < self.__min_size:
+                continue
+            file_id = (file_stat.st_dev, file_stat.st_ino)
+            if file_id in seen:
+                continue
+            seen.add(file_id)
+            by_size[file_stat.st_size].append(path)
+
+        # only files with the same size can be duplicates
+        candidates = [(size, paths) for size, paths in by_size.items() if len(paths) > 1]
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        if not candidates:
+            return
+
+        # note: concurrent.futures is slow to import, so its imported only when there are candidates
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(self.__workers)
+
+        # partial hashes and full hashes being calculated, as list of (size, [(path, future)]), by sizes order
+        partials = []
+        pending = collections.deque()
+        try:
+            # start partial hashing all candidates right away, so the pool always have work to do
+            partials.extend((size, [(path, pool.submit(self.partial_hash, path, size)) for path in paths])
+                            for size, paths in candidates)
+
+            # group files of every size by partial hash
+            for size, futures in partials:
+                for paths in _group_by_hash(futures):
+
+                    # small files were hashed entirely by the partial hash
+                    if size <= self.BlockSize * 2:
+                        pending.append((size, paths))
+                        continue
+
+                    # for bigger files, hash full content
+                    pending.append((size, [(path, pool.submit(self.full_hash, path)) for path, _ in paths]))
+
+                # return groups that are ready
+                while pending and all(future.done() for _, future in pending[0][1]):
+                    for group in _get_groups(*pending.popleft()):
+                        yield group
+
+            # return all remaining groups
+            while pending:
+                for group in _get_groups(*pending.popleft()):
+                    yield group
+
+        finally:
+            # cancel hashes that didn't start yet, and wait for the rest
+            for _, futures in itertools.chain(partials, pending):
+                for _, future in futures:
+                    future.cancel()
+            pool.shutdown(wait=True)
+
+    def partial_hash(self, path, size):
+        """
+        Return the hash of a file's first and last blocks (or the full content hash, if file is small).
+        :param path: file path.
+        :param size: file size.
+        """
+        if size <= self.BlockSize * 2:
+            return self.full_hash(path)
+        file_hash = hashlib.blake2b()
+        with open(path, "rb") as infile:
+            file_hash.update(infile.read(self.BlockSize))
+            infile.seek(-self.BlockSize, os.SEEK_END)
+            file_hash.update(infile.read(self.BlockSize))
+        self.count_bytes(read=self.BlockSize * 2)
+        return file_hash.hexdigest()
+
+    def full_hash(self, path):
+        """
+        Return the hash of a file's full content, reading it in chunks.
+        :param path: file path.
+        """
+        file_hash = hashlib.blake2b()
+        with open(path, "rb") as infile:
+            for chunk in iter(lambda: infile.read(self.ChunkSize), b""):
+                file_hash.update(chunk)
+            self.count_bytes(read=infile.tell())
+        return file_hash.hexdigest()
+
+
+def _group_by_hash(futures):
+    """
+    Get list of (path, hash future) and return lists of (path, hash future) with the same hash, skipping unique
+    hashes and files that failed to be read.
+    """
+    groups = collections.OrderedDict()
+    for path, future in futures:
+        try:
+            digest = future.result()
+        except OSError:
+            continue
+        groups.setdefault(digest, []).append((path, future))
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+
+def _get_groups(size, futures):
+    """
+    Get file size and list of (path, hash future), and return DuplicateGroup for every hash with more than one file.
+    """
+    return [DuplicateGroup(size, paths[0][1].result(), [path for path, _ in paths])
+            for paths in _group_by_hash(futures)]
@@ -7,49 +7,363 @@ Use this as an iterator only, eg:
 for line in grep.next():
     print line
 
+Or, to get every match with its file path and line number:
+
+for path, lineno, line in grep.matches():
+    print path, lineno, line
+
 Author: Ronen Ness.
 Since: 2016.
 """
 
 from .. import files_iterator
+import codecs
+import collections
+import mmap
 import re
-import sys
+
+
+class GrepMatch(collections.namedtuple("GrepMatch", ["path", "lineno", "line"])):
+    """
+    A single grep match: file path, line number (starting from 1) and the line itself.
+    The pattern that matched is in 'pattern'. Its not part of the tuple, so matches still unpack to 3 values.
+    """
+
+    # the pattern that matched (None if unknown)
+    pattern = None
+
+    def __new__(cls, path, lineno, line, pattern=None):
+        """
+        Create the match record.
+        """
+        self = super(GrepMatch, cls).__new__(cls, path, lineno, line)
+        self.pattern = pattern
+        return self
+
+
+# expressions with these can't be searched on a big block of lines, since they depend on the line boundaries
+_LINE_DEPENDANT_REGEX = re.compile(r"\\A|\\Z|\(\?<")
+
+# characters that have special meaning in regex. expressions without them are just literal strings
+_REGEX_SPECIAL_CHARS = frozenset(".^$*+?{}[]\\|()\n")
+
+# type of compiled regexes
+_PATTERN_TYPE = type(re.compile(""))
+
+# encodings in which finding the encoded bytes of a string is the same as finding the decoded string
+_BYTES_SEARCHABLE_ENCODINGS = ("utf-8", "ascii")
 
 
 class Grep(files_iterator.FilesIterator):
     """
     Iterate over files and return lines that match the grep condition.
     Return a list of lists: for every file return the list of occurances found in it.
+
+    Files are memory-mapped and searched in big blocks with a pre-compiled expression, so only matching lines
+    are turned into strings, and memory is bounded even for huge files.
+
+    If the expression is a literal string (no special regex characters), or a list of literal strings, files
+    are searched as bytes without decoding them at all.
     """
-    def __init__(self, expression):
+
+    # size of blocks to search at once (blocks are always extended to the end of their last line)
+    BlockSize = 1024 * 1024
+
+    def __init__(self, expression, max_matches=None, encoding="utf-8"):
         """
         Init the grep iterator.
 
         :param expression: the grep expression to look for.
+                           can also be a list of literal strings (not regexes!) to look for all of them at once.
+        :param max_matches: if provided, will stop searching a file after this many matching lines.
+        :param encoding: encoding to decode files with (invalid characters are replaced).
         """
         super(Grep, self).__init__()
-        self.__exp = expression
+        self.__max_matches = max_matches
+        self.__encoding = encoding
+        self.set_grep(expression)
 
     def set_grep(self, expression):
         """
-        Change / set the grep expression.
+        Change / set the grep expression (or list of literal strings).
+        The expression can also be a compiled regex, in which case its flags are kept.
         """
         self.__exp = expression
+        self.__literals = None
+        self.__bytes_literal = None
+        self.__bytes_regex = None
+        bytes_searchable = codecs.lookup(self.__encoding).name in _BYTES_SEARCHABLE_ENCODINGS
+
+        # list of literals to look for: compile them into a trie-shaped regex, which only scan every position once.
+        # note: literals with line breaks can never match a single line.
+        if isinstance(expression, (list, tuple)):
+            self.__literals = [literal for literal in expression if "\n" not in literal]
+            self.__regex = re.compile(_trie_regex(self.__literals))
+            self.__block_regex = self.__regex
+            if bytes_searchable:
+                try:
+                    encoded = [literal.encode(self.__encoding).decode("latin-1") for literal in self.__literals]
+                    self.__bytes_regex = re.compile(_trie_regex(encoded).encode("latin-1"))
+                except UnicodeEncodeError:
+                    pass
+
+        # a regex or a literal string (compiled regexes are compiled again with their flags, and with MULTILINE)
+        else:
+            flags = 0
+            if isinstance(expression, _PATTERN_TYPE):
+                expression, flags = expression.pattern, expression.flags
+            self.__regex = re.compile(expression, flags)
+            self.__block_regex = re.compile(expression, flags | re.MULTILINE)
+            if bytes_searchable and not _REGEX_SPECIAL_CHARS.intersection(expression) and \
+                    not flags & (re.IGNORECASE | re.VERBOSE):
+                try:
+                    self.__bytes_literal = expression.encode(self.__encoding)
+                except UnicodeEncodeError:
+                    pass
+
+        # check if expression depend on line boundaries and need to be searched line by line
+        self.__by_lines = self.__literals is None and _LINE_DEPENDANT_REGEX.search(expression) is not None
 
     def process_file(self, path, dryrun):
         """
-        Print files path.
+        Grep file and return list of matching lines.
         """
         # if dryrun just return files
         if dryrun:
             return path
 
         # scan file and match lines
-        ret = []
-        with open(path, "r") as infile:
-            for line in infile:
-                if re.search(self.__exp, line):
-                    ret.append(line)
+        ret = [match.line for match in self.search_file(path)]
 
         # if found matches return list of lines, else return None
         return ret if len(ret) > 0 else None
+
+    def matches(self):
+        """
+        Iterate over all files and return all matches lazily, as GrepMatch (path, lineno, line) records.
+        """
+        # grep don't change files, so we iterate as dry-run to just get the files paths
+        for path in self.next(dryrun=True):
+            for match in self.search_file(path):
+                yield match
+
+    def search_file(self, path):
+        """
+        Search a single file and return matching lines lazily, as GrepMatch (path, lineno, line) records.
+        Every match also have the pattern that matched in 'pattern': when grepping a list of literals, its the literal
+        found (the first one in line). Else, its the grep expression.
+
+        :param path: file path to search.
+        """
+        # pick search method
+        if self.__by_lines:
+            matches = self.__search_lines(path)
+        elif self.__bytes_literal is not None or self.__bytes_regex is not None:
+            matches = self.__search_bytes(path)
+        else:
+            matches = self.__search_blocks(path)
+
+        # return matches
+        count = 0
+        for lineno, line, pattern in matches:
+            yield GrepMatch(path, lineno, line, pattern)
+            count += 1
+            if self.__max_matches is not None and count >= self.__max_matches:
+                return
+
+    def __search_lines(self, path):
+        """
+        Search a file line by line. Used for expressions that depend on the line boundaries.
+        """
+        with open(path, "r", encoding=self.__encoding, errors="replace") as infile:
+            for lineno, line in enumerate(infile, 1):
+                if self.__regex.search(line):
+                    yield lineno, line, self.__exp
+
+    def __search_bytes(self, path):
+        """
+        Memory-map a file and search the encoded literal(s) directly in bytes.
+        """
+        with _MappedFile(path) as data:
+
+            size = len(data)
+            pos = 0
+            lineno = 1
+            counted = 0
+            while pos < size:
+
+                # find next literal
+                if self.__bytes_literal is not None:
+                    index = data.find(self.__bytes_literal, pos)
+                    if index == -1:
+                        return
+                    pattern = self.__exp
+                else:
+                    match = self.__bytes_regex.search(data, pos)
+                    if match is None:
+                        return
+                    index = match.start()
+                    pattern = match.group().decode(self.__encoding)
+
+                # get the line it was found in
+                start = max(data.rfind(b"\n", pos, index), data.rfind(b"\r", pos, index))
+                start = pos if start == -1 else start + 1
+                end = _line_end(data, index, size)
+
+                # count lines and return the line (normalize line breaks, like reading in text mode)
+                lineno += self.__count_lines(data, counted, start)
+                counted = start
+                yield lineno, _normalize_line_breaks(data[start:end].decode(self.__encoding, "replace")), pattern
+
+                # continue from next line
+                pos = end
+
+    def __count_lines(self, data, start, end):
+        """
+        Count line breaks ("\n", "\r\n" or "\r") in a range of a memory-mapped file, in blocks.
+        The range must end at a line start.
+        """
+        count = 0
+        while start < end:
+            block_end = min(start + self.BlockSize, end)
+            block = data[start:block_end]
+            count += block.count(b"\n") + block.count(b"\r") - block.count(b"\r\n")
+
+            # "\r\n" split between blocks is counted twice
+            if block.endswith(b"\r") and data[block_end:block_end + 1] == b"\n":
+                count -= 1
+            start = block_end
+        return count
+
+    def __search_blocks(self, path):
+        """
+        Memory-map a file and search it in blocks of whole lines.
+        """
+        with _MappedFile(path) as data:
+
+            # iterate blocks of whole lines
+            size = len(data)
+            offset = 0
+            lines_before = 0
+            while offset < size:
+
+                # get block end (end of line after block size)
+                end = _line_end(data, min(offset + self.BlockSize - 1, size), size)
+
+                # decode block (normalize line breaks, like reading in text mode) and search it
+                text = _normalize_line_breaks(data[offset:end].decode(self.__encoding, "replace"))
+                for lineno, line, pattern in self.__search_text(text):
+                    yield lines_before + lineno, line, pattern
+
+                # advance to next block
+                lines_before += text.count("\n")
+                offset = end
+
+    def __search_text(self, text):
+        """
+        Search a block of whole lines and return (lineno, line, pattern) for every matching line.
+        Line numbers are relative to the block start, starting from 1.
+        """
+        pos = 0
+        lineno = 1
+        counted = 0
+        while pos < len(text):
+
+            # find next candidate
+            match = self.__block_regex.search(text, pos)
+            if match is None:
+                return
+
+            # get the line the candidate starts at
+            start = text.rfind("\n", 0, match.start()) + 1
+            if start >= len(text):
+                return
+            end = text.find("\n", match.start())
+            end = len(text) if end == -1 else end + 1
+            line = text[start:end]
+
+            # candidate might span multiple lines, so make sure the line itself match
+            line_match = self.__regex.search(line)
+            if line_match:
+                lineno += text.count("\n", counted, start)
+                counted = start
+                yield lineno, line, self.__exp if self.__literals is None else line_match.group()
+
+            # continue from next line
+            pos = end
+
+
+class _MappedFile(object):
+    """
+    Open a file and memory-map it for reading, as a context manager.
+    Empty files are returned as empty bytes, and files that can't be mapped (special files) are just read.
+    """
+
+    def __init__(self, path):
+        self.__path = path
+        self.__data = None
+
+    def __enter__(self):
+        with open(self.__path, "rb") as infile:
+            try:
+                self.__data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self.__data = b""
+            except OSError:
+                self.__data = infile.read()
+        return self.__data
+
+    def __exit__(self, *args):
+        if isinstance(self.__data, mmap.mmap):
+            self.__data.close()
+
+
+def _line_end(data, index, size):
+    """
+    Return the end of the line that contains index in a memory-mapped file, after its line break ("\n", "\r\n" or
+    "\r", like reading in text mode).
+    """
+    end = data.find(b"\n", index)
+    end = size if end == -1 else end + 1
+    cr = data.find(b"\r", index, end)
+    if cr != -1 and data[cr + 1:cr + 2] != b"\n":
+        return cr + 1
+    return end
+
+
+def _normalize_line_breaks(text):
+    """
+    Convert "\r\n" and "\r" line breaks to "\n", like reading in text mode.
+    """
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _trie_regex(literals):
+    """
+    Build a regex that match any of the given literals, shaped as a trie of common prefixes.
+    At every position the regex engine walk the trie instead of trying every literal, and the longest literal wins.
+    To build a bytes regex, pass literals decoded as latin-1 and encode the result back to latin-1.
+    """
+    # build the trie (end of literal is marked by an empty key)
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    # no literals? match nothing
+    if not trie:
+        return "(?!)"
+
+    # convert trie to regex
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        regex = "(?:" + "|".join(branches) + ")"
+        return regex + "?" if "" in node else regex
+
+    return build(trie)
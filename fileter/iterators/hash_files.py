@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Iterate files and return their content hashes.
+Use this as an iterator, eg:
+
+for path, digest in HashFiles("hashes.db"):
+    print path, digest
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+
+from .. import files_iterator
+from ..hash_cache import HashCache
+
+
+class HashFiles(files_iterator.FilesIterator):
+    """
+    This iterator hash all files content, and return (path, hex digest) for every file.
+    Hashes are kept in a HashCache, so with a cache file, files that didn't change since the last run are not
+    read again.
+
+    After iteration, the HashCache is kept in 'cache' (closed), with its hits / misses counters.
+
+    Note: to process files in parallel use a threads pool (executor="thread"); the cache can't be shared with
+    processes, so a processes pool is rejected.
+    """
+
+    # always use stat cache, so files are not stat'ed again to check the hash cache
+    UseStatCache = True
+
+    # the hash cache can't be used from other processes
+    AllowProcessPool = False
+
+    def __init__(self, cache_path=None, algorithm="sha256", max_entries=None):
+        """
+        Hash files.
+        :param cache_path: hash cache file path (created if doesn't exist). if None, will not keep hashes.
+        :param algorithm: hash algorithm: "sha256" (default), "blake2b", "xxhash" (requires the xxhash package),
+                          or any other algorithm name hashlib support.
+        :param max_entries: max hashes to keep in cache (default to HashCache.MaxEntries).
+        """
+        super(HashFiles, self).__init__()
+        self.__cache_path = cache_path
+        self.__algorithm = algorithm
+        self.__max_entries = max_entries
+        self.cache = None
+
+    def on_start(self, dryrun):
+        """
+        Open the hash cache.
+        """
+        if not dryrun:
+            self.cache = HashCache(self.__cache_path, self.__algorithm, self.__max_entries)
+
+    def on_end(self, dryrun):
+        """
+        Close the hash cache.
+        """
+        if not dryrun:
+            self.count_bytes(read=self.cache.bytes_hashed)
+            self.cache.close()
+
+    def process_file(self, path, dryrun):
+        """
+        Hash file and return (path, hex digest).
+        """
+        # if dryrun just return files
+        if dryrun:
+            return path
+
+        # get hash (skip files that were removed or can't be read)
+        try:
+            return path, self.cache.hash_file(path, self.stat(path))
+        except OSError:
+            return None
@@ -15,6 +15,9 @@ class PrintFiles(files_iterator.FilesIterator):
     Iterate over files and print their names.
     """
 
+    # printing from workers would mix the output
+    AllowWorkers = False
+
     def process_file(self, path, dryrun):
         """
         Print files path.
@@ -8,21 +8,121 @@ Since: 2016.
 """
 
 from .. import files_iterator
+import collections
 import os
+import threading
+import time
+
+
+# report of a removal run:
+# removed - how many files were removed.
+# failed - list of (path, error) for files that failed to be removed.
+# removed_folders - how many empty folders were removed.
+# elapsed - how long the removal took, in seconds.
+# files_per_sec - how many files were removed per second.
+RemoveReport = collections.namedtuple("RemoveReport", ["removed", "failed", "removed_folders", "elapsed",
+                                                       "files_per_sec"])
 
 
 class RemoveFiles(files_iterator.FilesIterator):
     """
     This iterator will remove all files.
+    When done, a RemoveReport is stored in 'report'.
+
+    Note: to process files in parallel with next(workers=...), use a threads pool (executor="thread"); a processes
+    pool is rejected, since files removed in other processes can't be counted in the report.
     """
 
-    def __init__(self, force=False):
+    # how many files of the same folder to remove in a single batch, when using workers
+    BatchSize = 256
+
+    # files removed in other processes can't be counted in the report
+    AllowProcessPool = False
+
+    def __init__(self, force=False, workers=None, remove_empty_folders=False):
         """
         concat all source files into one output file.
         :param force: if true, will just remove all files. Else, will ask for every file before.
+        :param workers: if provided, will remove files in batches per folder, using a pool of this many threads.
+                        useful for removing lots of files on network file systems. requires force=True.
+        :param remove_empty_folders: if true, when done will remove folders that contained removed files and are
+                        now empty, and their parents that became empty, up to the sources roots (deepest first).
+                        sources roots are never removed.
         """
         super(RemoveFiles, self).__init__()
+        if workers and not force:
+            raise ValueError("Removing files with workers requires force=True!")
         self.__force = force
+        self.__workers = workers
+        self.__remove_empty_folders = remove_empty_folders
+        self.__lock = threading.Lock()
+        self.__reset()
+        self.report = None
+
+    def __getstate__(self):
+        """
+        Return state for pickling. The lock and pool can't be pickled.
+        """
+        state = super(RemoveFiles, self).__getstate__()
+        state["_RemoveFiles__lock"] = None
+        state["_RemoveFiles__pool"] = None
+        state["_RemoveFiles__pending"] = None
+        return state
+
+    def __reset(self):
+        """
+        Reset removal state.
+        """
+        self.__start_time = time.time()
+        self.__removed = 0
+        self.__failed = []
+        self.__folders = set()
+        self.__batches = {}
+        self.__pending = collections.deque()
+        self.__pool = None
+
+    def on_start(self, dryrun):
+        """
+        Init removal state and workers pool.
+        """
+        if dryrun:
+            return
+
+        self.__reset()
+        if self.__workers:
+            # note: concurrent.futures is slow to import, so its imported only when using workers
+            from concurrent.futures import ThreadPoolExecutor
+            self.__pool = ThreadPoolExecutor(self.__workers)
+
+    def on_end(self, dryrun):
+        """
+        Finish removing all batches, remove empty folders and create the report.
+        """
+        if dryrun:
+            return
+
+        # send all remaining batches and wait for them to finish
+        if self.__pool is not None:
+            for folder in list(self.__batches):
+                self.__send_batch(folder)
+            while self.__pending:
+                self.__wait_batch()
+            self.__pool.shutdown()
+
+        # remove empty folders, deepest first
+        removed_folders = 0
+        if self.__remove_empty_folders:
+            for folder in sorted(self.__empty_folders_candidates(), key=lambda x: x.count(os.path.sep), reverse=True):
+                try:
+                    os.rmdir(folder)
+                    removed_folders += 1
+                except OSError:
+                    pass
+
+        # create report
+        elapsed = time.time() - self.__start_time
+        self.report = RemoveReport(self.__removed, self.__failed, removed_folders, elapsed,
+                                   self.__removed / elapsed if elapsed > 0 else 0.0)
 
     def process_file(self, path, dryrun):
         """
@@ -32,8 +132,107 @@ class RemoveFiles(files_iterator.FilesIterator):
         if dryrun:
             return path
 
+        # when using workers, add to the folder batch and send it if full
+        if self.__pool is not None:
+            folder, name = os.path.split(path)
+            with self.__lock:
+                batch = self.__batches.setdefault(folder, [])
+                batch.append(name)
+                if len(batch) >= self.BatchSize:
+                    self.__send_batch(folder)
+            return path
+
         # remove and return file
         if self.__force or input("Remove file '%s'? [y/N]" % path).lower() == "y":
             os.remove(path)
+            with self.__lock:
+                self.__removed += 1
+                if self.__remove_empty_folders:
+                    self.__folders.add(os.path.dirname(path))
             return path
 
+    def __empty_folders_candidates(self):
+        """
+        Return the folders that contained removed files, and all their parents up to (not including) the root of the
+        source they are under. Folders that are not under any source root only get themselves.
+        """
+        roots = set(os.path.abspath(root) for root in
+                    (source.get_root() for source in self.get_sources()) if root is not None)
+        ret = set()
+        for folder in self.__folders:
+            folder = os.path.abspath(folder)
+            if folder in roots:
+                continue
+            ret.add(folder)
+
+            # add parents up to the root (a folder under a root always reach it when going up)
+            if _is_under_any(folder, roots):
+                parent = os.path.dirname(folder)
+                while parent not in roots and parent not in ret:
+                    ret.add(parent)
+                    parent = os.path.dirname(parent)
+        return ret
+
+    def __send_batch(self, folder):
+        """
+        Send the batch of a folder to the workers pool.
+        """
+        # send batch
+        names = self.__batches.pop(folder)
+        self.__pending.append(self.__pool.submit(_remove_batch, folder, names))
+        if self.__remove_empty_folders:
+            self.__folders.add(folder)
+
+        # don't let too many batches pile up
+        while len(self.__pending) > self.__workers * 4:
+            self.__wait_batch()
+
+    def __wait_batch(self):
+        """
+        Wait for the oldest batch to finish and collect its results.
+        """
+        removed, failed = self.__pending.popleft().result()
+        self.__removed += removed
+        self.__failed.extend(failed)
+
+
+def _is_under_any(path, roots):
+    """
+    Return if path is inside any of the roots (all absolute paths).
+    """
+    return any(path.startswith(os.path.join(root, "")) for root in roots)
+
+
+def _remove_batch(folder, names):
+    """
+    Remove a batch of files from the same folder. Use folder-relative unlinks when supported, so the folder
+    path is resolved just once per batch.
+    Return (removed count, list of (path, error) for failed files).
+    """
+    removed = 0
+    failed = []
+
+    # open the folder
+    folder_fd = None
+    if os.unlink in os.supports_dir_fd:
+        try:
+            folder_fd = os.open(folder or ".", os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        except OSError as e:
+            return 0, [(os.path.join(folder, name), e) for name in names]
+
+    # remove files
+    try:
+        for name in names:
+            try:
+                if folder_fd is not None:
+                    os.unlink(name, dir_fd=folder_fd)
+                else:
+                    os.unlink(os.path.join(folder, name))
+                removed += 1
+            except OSError as e:
+                failed.append((os.path.join(folder, name), e))
+    finally:
+        if folder_fd is not None:
+            os.close(folder_fd)
+
+    return removed, failed
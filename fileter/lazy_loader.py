@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Lazy loading of package attributes (PEP 562), used by all Fileter packages.
+Importing a package doesn't import its modules; every class (or sub package) is imported the first time its
+accessed, so short-lived programs only pay for the parts of Fileter they actually use.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+import importlib
+import sys
+
+
+def lazy_loader(package_name, names, submodules=()):
+    """
+    Return the module-level (__getattr__, __dir__) functions for a package with lazy attributes.
+
+    :param package_name: name of the package (its __name__).
+    :param names: dictionary of attribute name -> relative module to import it from (for example ".folder_source").
+    :param submodules: names of sub packages to list in __dir__() (any sub module can be accessed as attribute).
+    """
+    submodules = frozenset(submodules)
+
+    def __getattr__(name):
+        """
+        Import an attribute on first access, and store it in the package so its imported only once.
+        """
+        if name in names:
+            value = getattr(importlib.import_module(names[name], package_name), name)
+
+        # sub packages and modules. modules used to be imported with the package, so any of them can be accessed.
+        else:
+            try:
+                value = importlib.import_module("." + name, package_name)
+            except ModuleNotFoundError as e:
+                if e.name != package_name + "." + name:
+                    raise
+                raise AttributeError("module '%s' has no attribute '%s'" % (package_name, name))
+
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__():
+        """
+        Return all package attributes, including those not imported yet.
+        """
+        return sorted(set(vars(sys.modules[package_name])) | set(names) | submodules)
+
+    return __getattr__, __dir__
@@ -1,8 +1,24 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-__all__ = ['SourceAPI', 'FileSource', "FolderSource", "FilteredFolderSource", "PatternSource", ]
+__all__ = ['SourceAPI', 'FileSource', "FolderSource", "FilteredFolderSource", "PatternSource", "FolderWalker",
+           "IndexedFolderSource", "FolderIndex", "DeltaSource", "WatchSource", "GitIgnoreSource", "MergedFolderSource",
+           "WalkPlan", ]
 
-from .source_api import *
-from .files_source import *
-from .folder_source import *
-from .files_pattern import *
+from ..lazy_loader import lazy_loader
+
+# sources are imported on first access
+__getattr__, __dir__ = lazy_loader(__name__, {
+    'SourceAPI': '.source_api',
+    'FolderWalker': '.folder_walker',
+    'FileSource': '.files_source',
+    'FolderSource': '.folder_source',
+    'FilteredFolderSource': '.folder_source',
+    'PatternSource': '.files_pattern',
+    'IndexedFolderSource': '.indexed_folder_source',
+    'FolderIndex': '.indexed_folder_source',
+    'DeltaSource': '.delta_source',
+    'WatchSource': '.watch_source',
+    'GitIgnoreSource': '.gitignore_source',
+    'MergedFolderSource': '.merged_folder_source',
+    'WalkPlan': '.merged_folder_source',
+})
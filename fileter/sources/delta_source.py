@@ -0,0 +1,190 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a source that wrap another source and only return files that were added or modified since the last run.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+
+from .source_api import SourceAPI
+import hashlib
+import os
+import sqlite3
+
+
+class DeltaSource(SourceAPI):
+    """
+    A source that return only files that changed since the last time it was iterated.
+
+    After every complete iteration, a checkpoint is stored in a SQLite file with the size and mtime of every file
+    (and optionally its content hash). On the next iteration only files that are new or changed are returned.
+    Files that are in the checkpoint but no longer returned by the wrapped source are reported via on_file_deleted().
+
+    Note: the checkpoint is written only after all returned files were processed (see on_processed()), so if
+    processing stopped or failed in the middle the next run will return the same files again. files rejected by the
+    iterator filters are not added to checkpoint. when iterated standalone, get_all() writes the checkpoint too.
+
+    Note: every file of the wrapped source is still listed and stat'ed on every run (a folder's mtime doesn't change
+    when its files are modified, so unchanged trees can't be skipped safely). To also make listing incremental, wrap
+    an IndexedFolderSource.
+    """
+
+    # size of chunks to read when hashing files
+    ChunkSize = 1024 * 1024
+
+    def __init__(self, source, checkpoint_path, use_hash=False):
+        """
+        Init the delta source.
+        :param source: the source to wrap (for example a FolderSource).
+        :param checkpoint_path: path of the checkpoint file (created if doesn't exist).
+        :param use_hash: if true, files that their size or mtime changed will also be compared by content hash,
+                         so files that were just touched or rewritten with the same content are not returned.
+        """
+        self.__source = source
+        self.__checkpoint_path = checkpoint_path
+        self.__use_hash = use_hash
+
+        # files to update in checkpoint, as {path: (stat when returned, hash)}. checked again when processed.
+        self.__returned = {}
+
+        # files to remove from checkpoint, or None if iteration is not done
+        self.__checkpoint = None
+
+    def set_stat_cache(self, stat_cache):
+        """
+        Pass the stat cache to the wrapped source.
+        """
+        self.__source.set_stat_cache(stat_cache)
+
+    def set_prune_rule(self, prune_rule):
+        """
+        Pass the prune rule to the wrapped source.
+        """
+        self.__source.set_prune_rule(prune_rule)
+
+    def get_root(self):
+        """
+        Return the root folder of the wrapped source.
+        """
+        return self.__source.get_root()
+
+    def on_file_deleted(self, path):
+        """
+        Called for every file that was in the checkpoint but was not returned by the wrapped source this time.
+        Override this to handle deleted files.
+        :param path: deleted file path.
+        """
+        pass
+
+    def file_hash(self, path):
+        """
+        Return the content hash of a file.
+        """
+        file_hash = hashlib.blake2b()
+        with open(path, "rb") as infile:
+            for chunk in iter(lambda: infile.read(self.ChunkSize), b""):
+                file_hash.update(chunk)
+        return file_hash.digest()
+
+    def __next__(self):
+        """
+        Return all files that were added or modified since last checkpoint.
+        """
+        conn = sqlite3.connect(self.__checkpoint_path)
+        try:
+            # load the previous checkpoint
+            conn.execute("CREATE TABLE IF NOT EXISTS files "
+                         "(path BLOB PRIMARY KEY, size INTEGER NOT NULL, mtime INTEGER NOT NULL, hash BLOB)")
+            previous = {os.fsdecode(path): (size, mtime, file_hash)
+                        for path, size, mtime, file_hash in conn.execute("SELECT path, size, mtime, hash FROM files")}
+        finally:
+            conn.close()
+
+        # iterate wrapped source and return changed files
+        self.__returned = {}
+        self.__checkpoint = None
+        for path in self.__source:
+
+            # get file stat (skip files we can't stat, like folders that were removed)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            # skip files with the same size and mtime as in checkpoint
+            prev = previous.pop(path, None)
+            if prev is not None and prev[:2] == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            # size or mtime changed. if using hash, also check if content changed.
+            file_hash = None
+            changed = True
+            if self.__use_hash:
+                file_hash = self.__try_hash(path)
+                changed = prev is None or prev[2] is None or file_hash != prev[2]
+
+            # return changed file. its added to checkpoint only after its processed and if it passed the iterator
+            # filters (see on_processed()). touched files with the same content are just updated in checkpoint.
+            self.__returned[path] = (stat, file_hash)
+            if changed:
+                yield path
+
+        # report deleted files
+        for path in previous:
+            self.on_file_deleted(path)
+
+        # all files were returned, so checkpoint can be written once they are processed
+        self.__checkpoint = list(previous)
+
+    def on_file_rejected(self, path):
+        """
+        Don't add files rejected by the iterator filters to checkpoint.
+        """
+        self.__returned.pop(path, None)
+
+    def on_processed(self):
+        """
+        Write the checkpoint, after all returned files were processed.
+        Files are stat'ed again, so changes done while processing (like adding a header) won't count as changes in
+        the next run.
+        """
+        returned, self.__returned = self.__returned, {}
+        deleted, self.__checkpoint = self.__checkpoint, None
+        if deleted is None:
+            return
+        updates = []
+        for path, (stat, file_hash) in returned.items():
+            stat, file_hash = self.__after_processing(path, stat, file_hash)
+            if stat is not None:
+                updates.append((os.fsencode(path), stat.st_size, stat.st_mtime_ns, file_hash))
+        conn = sqlite3.connect(self.__checkpoint_path)
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)",
+                                 updates)
+                conn.executemany("DELETE FROM files WHERE path = ?", ((os.fsencode(path),) for path in deleted))
+        finally:
+            conn.close()
+
+    def __after_processing(self, path, stat, file_hash):
+        """
+        Stat a file again after it was processed.
+        Return (new stat, hash) if file was modified, (stat, file_hash) if not, or (None, None) if it was removed.
+        """
+        try:
+            new_stat = os.stat(path)
+        except OSError:
+            return None, None
+        if (new_stat.st_size, new_stat.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            return stat, file_hash
+        return new_stat, self.__try_hash(path) if self.__use_hash else None
+
+    def __try_hash(self, path):
+        """
+        Return file hash, or None if file can't be read.
+        """
+        try:
+            return self.file_hash(path)
+        except OSError:
+            return None
@@ -7,15 +7,18 @@ Author: Ronen Ness.
 Since: 2016.
 """
 from .source_api import SourceAPI
-import fnmatch
-import os
+from .folder_walker import FolderWalker
+from .merged_folder_source import WalkPlan
+from ..filters.pattern_filter import FilterPattern
 
 
 class PatternSource(SourceAPI):
     """
     A recursive folders scanner with pattern.
     """
-    def __init__(self, pattern, root='.', depth_limit=None, ret_files=True, ret_folders=False):
+    def __init__(self, pattern, root='.', depth_limit=None, ret_files=True, ret_folders=False,
+                 threads=None, ordered=True, case_sensitive=None, follow_symlinks=False, bloom_capacity=None,
+                 sort=False):
         """
         Init the folders source with root folder.
         :param pattern: fnmatch pattern(s) to match.
@@ -26,45 +29,69 @@ class PatternSource(SourceAPI):
                             0 = non recursive.
         :param ret_files: if true (default), will return files when iterating.
         :param ret_folders: if true, will return folders when iterating.
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+        :param ordered: when using threads, if true (default) will keep the same order as a serial scan.
+        :param case_sensitive: if None (default), will use the OS convention (same as fnmatch).
+                               if True / False, will force case sensitive / insensitive matching.
+        :param follow_symlinks: if true, will also scan links to folders, skipping folders that were already scanned.
+        :param bloom_capacity: when following links, if provided will remember scanned folders in a Bloom filter
+                               sized for this many folders, instead of an exact set (see FolderWalker).
+        :param sort: if true, will return paths sorted by name in every folder, so the order is the same on all file
+                     systems (see FolderWalker).
         """
-        self.__pattern = pattern if isinstance(pattern, (list, tuple)) else [pattern]
+        self.__pattern = FilterPattern(pattern, case_sensitive)
         self.__root = root
         self.__depth_limit = depth_limit
         self.__ret_files = ret_files
         self.__ret_folders = ret_folders
+        self.__threads = threads
+        self.__ordered = ordered
+        self.__follow_symlinks = follow_symlinks
+        self.__bloom_capacity = bloom_capacity
+        self.__sort = sort
+        self.__stat_cache = None
+        self.__prune_rule = None
 
-    def __next__(self):
+    def set_stat_cache(self, stat_cache):
         """
-        Return all files in folder.
+        Set the stat cache to fill with listed files.
         """
-        # get depth of starting root directory
-        base_depth = self.__root.count(os.path.sep)
-
-        # walk files and folders
-        for root, subFolders, files in os.walk(self.__root):
-
-            # make sure we don't pass depth limit
-            if self.__depth_limit is not None:
-                curr_depth = root.count(os.path.sep)
-                if curr_depth - base_depth > self.__depth_limit:
-                    continue
+        self.__stat_cache = stat_cache
 
-            # if required to return folders and folder match patterns, return folder
-            if self.__ret_folders and self.match_pattern(root):
-                yield root
-
-            # iterate files
-            for f in files:
+    def set_prune_rule(self, prune_rule):
+        """
+        Set the rule of folders to skip without listing them.
+        """
+        self.__prune_rule = prune_rule
 
-                # get current file path
-                curr_file = os.path.join(root, f)
+    def __next__(self):
+        """
+        Return all files in folder.
+        """
+        # walk files and folders and return those who match the pattern(s)
+        walker = FolderWalker(self.__root, self.__depth_limit, self.__ret_files, self.__ret_folders,
+                              threads=self.__threads, ordered=self.__ordered, stat_cache=self.__stat_cache,
+                              prune_folder=self.__prune_rule, follow_symlinks=self.__follow_symlinks,
+                              bloom_capacity=self.__bloom_capacity, sort=self.__sort)
+        for path in walker.walk():
+            if self.match_pattern(path):
+                yield path
 
-                # if match return file
-                if self.match_pattern(curr_file):
-                    yield curr_file
+    def get_walk_plan(self):
+        """
+        Return how this source walks folders, or None if it was customized, follow links or sort paths, and can't
+        be merged.
+        """
+        if self.__follow_symlinks or self.__sort or type(self).__next__ is not PatternSource.__next__:
+            return None
+        return WalkPlan(self.__root, self.__depth_limit, self.__ret_files, self.__ret_folders, self.__threads,
+                        self.__ordered, None, self.match_pattern)
 
-        # end iterator
-        raise StopIteration
+    def get_root(self):
+        """
+        Return the root folder this source scans.
+        """
+        return self.__root
 
     def match_pattern(self, path):
         """
@@ -73,7 +100,4 @@ class PatternSource(SourceAPI):
         :param path: path to check.
         :return: True if match, False otherwise.
         """
-        for pattern in self.__pattern:
-            if len(fnmatch.filter([path], pattern)) > 0:
-                return True
-        return False
+        return self.__pattern.match(path)
@@ -33,7 +33,6 @@ class FileSource(SourceAPI):
         """
         for i in self.__path:
             yield i
-        raise StopIteration
 
     def get_all(self):
         """
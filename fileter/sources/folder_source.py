@@ -8,7 +8,8 @@ Since: 2016.
 """
 
 from .source_api import SourceAPI
-import os
+from .folder_walker import FolderWalker
+from .merged_folder_source import WalkPlan
 import re
 
 
@@ -17,7 +18,8 @@ class FolderSource(SourceAPI):
     A recirsive folders source to scan.
     """
 
-    def __init__(self, root, depth_limit=None, ret_files=True, ret_folders=False):
+    def __init__(self, root, depth_limit=None, ret_files=True, ret_folders=False, threads=None, ordered=True,
+                 follow_symlinks=False, bloom_capacity=None, sort=False):
         """
         Init the folders source with root folder.
         :param root: root folder to scan.
@@ -26,11 +28,37 @@ class FolderSource(SourceAPI):
                             0 = non recursive.
         :param ret_files: if true (default), will return files when iterating.
         :param ret_folders: if true, will return folders when iterating.
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+        :param ordered: when using threads, if true (default) will keep the same order as a serial scan.
+        :param follow_symlinks: if true, will also scan links to folders, skipping folders that were already scanned.
+        :param bloom_capacity: when following links, if provided will remember scanned folders in a Bloom filter
+                               sized for this many folders, instead of an exact set (see FolderWalker).
+        :param sort: if true, will return paths sorted by name in every folder, so the order is the same on all file
+                     systems (see FolderWalker).
         """
         self.__root = root
         self.__depth_limit = depth_limit
         self.__ret_files = ret_files
         self.__ret_folders = ret_folders
+        self.__threads = threads
+        self.__ordered = ordered
+        self.__follow_symlinks = follow_symlinks
+        self.__bloom_capacity = bloom_capacity
+        self.__sort = sort
+        self.__stat_cache = None
+        self.__prune_rule = None
+
+    def set_stat_cache(self, stat_cache):
+        """
+        Set the stat cache to fill with listed files.
+        """
+        self.__stat_cache = stat_cache
+
+    def set_prune_rule(self, prune_rule):
+        """
+        Set the rule of folders to skip without listing them.
+        """
+        self.__prune_rule = prune_rule
 
     def filter_folder(self, folder):
         """
@@ -38,44 +66,51 @@ class FolderSource(SourceAPI):
         """
         return True
 
+    def get_root(self):
+        """
+        Return the root folder this source scans.
+        """
+        return self.__root
+
     def __next__(self):
         """
         Return all files in folder.
         """
-        # get depth of starting root directory
-        base_depth = self.__root.count(os.path.sep)
-
-        # walk files and folders
-        for root, subFolders, files in os.walk(self.__root):
-
-            # apply folder filter
-            if not self.filter_folder(root):
-                continue
-
-            # make sure we don't pass depth limit
-            if self.__depth_limit is not None:
-                curr_depth = root.count(os.path.sep)
-                if curr_depth - base_depth > self.__depth_limit:
-                    continue
-
-            # if need to return folders return it
-            if self.__ret_folders:
-                yield root
-
-            # return files
-            if self.__ret_files:
-                for f in files:
-                    yield os.path.join(root, f)
+        # walk files and folders. folders rejected by filter_folder() are pruned and never listed.
+        walker = self.create_walker(self.__root, self.__depth_limit, self.__ret_files, self.__ret_folders,
+                                    self.filter_folder, self.__threads, self.__ordered, self.__stat_cache,
+                                    self.__prune_rule, self.__follow_symlinks, self.__bloom_capacity,
+                                    self.__sort)
+        for path in walker.walk():
+            yield path
+
+    def create_walker(self, *args):
+        """
+        Create the folders walker to iterate with. Override this to use a custom walker.
+        :param args: FolderWalker init arguments.
+        """
+        return FolderWalker(*args)
 
-        # end iterator
-        raise StopIteration
+    def get_walk_plan(self):
+        """
+        Return how this source walks folders, or None if it use a custom walker, follow links or sort paths, and
+        can't be merged.
+        """
+        source_type = type(self)
+        if self.__follow_symlinks or self.__sort or source_type.__next__ is not FolderSource.__next__ or \
+                source_type.create_walker is not FolderSource.create_walker:
+            return None
+        filter_folder = None if source_type.filter_folder is FolderSource.filter_folder else self.filter_folder
+        return WalkPlan(self.__root, self.__depth_limit, self.__ret_files, self.__ret_folders, self.__threads,
+                        self.__ordered, filter_folder, None)
 
 
 class FilteredFolderSource(FolderSource):
     """
     A recursive folders source to scan, with regex filter.
     """
-    def __init__(self, root, regex_string, depth_limit=None, ret_files=True, ret_folders=False):
+    def __init__(self, root, regex_string, depth_limit=None, ret_files=True, ret_folders=False,
+                 threads=None, ordered=True, follow_symlinks=False, bloom_capacity=None, sort=False):
         """
         Init the folders source with root folder.
         :param root: root folder to scan.
@@ -85,8 +120,16 @@ class FilteredFolderSource(FolderSource):
                             0 = non recursive.
         :param ret_files: if true (default), will return files when iterating.
         :param ret_folders: if true, will return folders when iterating.
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+        :param ordered: when using threads, if true (default) will keep the same order as a serial scan.
+        :param follow_symlinks: if true, will also scan links to folders, skipping folders that were already scanned.
+        :param bloom_capacity: when following links, if provided will remember scanned folders in a Bloom filter
+                               sized for this many folders, instead of an exact set (see FolderWalker).
+        :param sort: if true, will return paths sorted by name in every folder, so the order is the same on all file
+                     systems (see FolderWalker).
         """
-        super(FilteredFolderSource, self).__init__(root, depth_limit, ret_files, ret_folders)
+        super(FilteredFolderSource, self).__init__(root, depth_limit, ret_files, ret_folders, threads, ordered,
+                                                   follow_symlinks, bloom_capacity, sort)
         self.__regex = re.compile(regex_string)
 
     def filter_folder(self, folder):
@@ -0,0 +1,472 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement the folders walking engine used by all the folder-based sources.
+
+Unlike os.walk(), the walker decide which sub folders to visit *before* descending into them, so folders that
+are too deep or rejected by the folder filter are never listed at all. It also use the type info that comes
+with os.scandir() entries, so telling files and folders apart don't require extra stat() calls.
+
+When following symbolic links, every visited folder is remembered by its device and inode numbers, so links that
+lead back into a folder that was already visited (including loops) are not walked again.
+
+When sorting, every folder's entries are sorted by name as its listed, and sub folders are walked when reached in
+that order, so paths come out in the same lexicographic order on all file systems. Only the listings of folders on
+the current path are kept, so memory is bounded by the tree depth times its fan-out (and when listing with threads,
+times the threads count, since up to that many sub folders of every folder on the path are listed ahead).
+
+When listing with threads without sorting, only the next ListAhead folders per thread are listed ahead, so finished
+listings waiting to be walked, and listings queued in the pool, don't grow with the tree size.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+import os
+from ..inode_set import InodeSet, InodeBloomFilter
+
+
+class FolderWalker(object):
+    """
+    A depth-first folders walker built on os.scandir(), with pruning and optional parallel listing.
+    The order of returned paths is the same as os.walk() (top-down): a folder, its files, and then its sub folders.
+    """
+
+    # when walking with threads, max folders to list ahead for every thread. listings that are ready but not walked
+    # yet are kept in memory, so this bounds memory and queued work regardless of the tree size.
+    ListAhead = 4
+
+    def __init__(self, root, depth_limit=None, ret_files=True, ret_folders=False, filter_folder=None,
+                 threads=None, ordered=True, stat_cache=None, prune_folder=None, follow_symlinks=False,
+                 bloom_capacity=None, sort=False):
+        """
+        Init the folders walker.
+        :param root: root folder to walk.
+        :param depth_limit: how many levels to go deep recursively.
+                            None (default) = infinite depth.
+                            0 = non recursive.
+        :param ret_files: if true (default), will return files when walking.
+        :param ret_folders: if true, will return folders when walking.
+        :param filter_folder: optional function to get folder path and return False to skip this folder's tree.
+                            Note: the root folder is always scanned, but if rejected its files won't be returned.
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+                        useful for network file systems, where every folder listing has high latency.
+        :param ordered: when using threads, if true (default) will return paths in the same order as a
+                        serial walk. if false, will return paths as soon as they are listed.
+        :param stat_cache: optional StatCache to fill with the returned files entries.
+        :param prune_folder: optional function to get folder path and return True if everything in its tree is
+                            excluded anyway, so it won't be listed at all (but the folder itself is still returned).
+        :param follow_symlinks: if true, will also walk into links to folders. folders that were already visited
+                            (by device and inode) are skipped, so every folder is walked once, from the first path
+                            that reach it.
+        :param bloom_capacity: when following links, if provided will remember visited folders in a Bloom filter
+                            sized for this many folders, instead of an exact set. memory is fixed (about 1.2 bytes
+                            per folder), but about 1% of the folders might be wrongly skipped as already visited.
+        :param sort: if true, will return paths sorted by name in every folder (folders are sorted as if their names
+                            end with '/', so they come right before their content). this way the order is the same
+                            on all file systems. with threads, order is always kept (ordered is ignored).
+        """
+        self.__root = root
+        self.__depth_limit = depth_limit
+        self.__ret_files = ret_files
+        self.__ret_folders = ret_folders
+        self.__filter_folder = filter_folder
+        self.__threads = threads
+        self.__ordered = ordered
+        self.__stat_cache = stat_cache
+        self.__prune_folder = prune_folder
+        self.__follow_symlinks = follow_symlinks
+        self.__bloom_capacity = bloom_capacity
+        self.__sort = sort
+
+        # skip_folder() is only called if overridden, so walkers that don't need it don't pay for it
+        self.__skip_hook = type(self).skip_folder is not FolderWalker.skip_folder
+
+    def __iter__(self):
+        """
+        Return the walk generator.
+        """
+        return self.walk()
+
+    def scan_folder(self, folder):
+        """
+        List a single folder and return a list of (path, is_folder, entry) tuples, in listing order.
+        Override this to change how folders are listed (for example, to use a cached listing).
+        Note: when walking with threads, this is called from the pool threads.
+
+        :param folder: folder path to list.
+        :return: list of entries, or None if folder can't be listed.
+        """
+        ret = []
+        try:
+            scanner = os.scandir(folder)
+        except OSError:
+            return None
+
+        with scanner:
+            for entry in scanner:
+
+                # get if its a folder (follow links, same as os.walk does)
+                try:
+                    is_folder = entry.is_dir()
+                except OSError:
+                    is_folder = False
+
+                # links to folders are only followed if requested, and not returned as files either
+                if is_folder and not self.__follow_symlinks and entry.is_symlink():
+                    continue
+
+                # when following links, get folders identity now (entries cache it), so with threads its done
+                # in the pool and not when checking for loops
+                if is_folder and self.__follow_symlinks:
+                    try:
+                        entry.stat()
+                    except OSError:
+                        pass
+
+                ret.append((os.path.join(folder, entry.name), is_folder, entry))
+        return ret
+
+    def skip_folder(self, folder):
+        """
+        Called for a listed sub folder that will not be listed by scan_folder(): because its pruned, rejected by the
+        folder filter, too deep, or was already visited. Override this to drop state kept for the folder.
+        Note: when walking with threads, this might be called from the pool threads.
+
+        :param folder: folder path that will not be listed.
+        """
+        pass
+
+    def __list_folder(self, folder):
+        """
+        List a folder with scan_folder(), unless its pruned.
+        """
+        if self.__prune_folder is not None and self.__prune_folder(folder):
+            if self.__skip_hook:
+                self.skip_folder(folder)
+            return []
+        return self.scan_folder(folder)
+
+    def walk(self):
+        """
+        Walk the folders tree and return all files and folders paths.
+        """
+        # when following links, remember visited folders to skip loops
+        visited = None
+        if self.__follow_symlinks:
+            visited = InodeBloomFilter(self.__bloom_capacity) if self.__bloom_capacity else InodeSet()
+            _first_visit(visited, self.__root, None)
+
+        if self.__sort:
+            return self.__walk_sorted(visited)
+        if self.__threads:
+            return self.__walk_parallel(visited) if self.__ordered else self.__walk_unordered(visited)
+        return self.__walk_serial(visited)
+
+    def __walk_serial(self, visited):
+        """
+        Walk the folders tree from the calling thread.
+        """
+        # folders we still need to visit, as (path, depth)
+        stack = [(self.__root, 0)]
+
+        # walk folders
+        while stack:
+
+            # get next folder and list it
+            folder, depth = stack.pop()
+            entries = self.__list_folder(folder)
+            if entries is None:
+                continue
+
+            # return folder content
+            for path in self.__folder_paths(folder, depth, entries):
+                yield path
+
+            # add sub folders to visit (reversed to keep listing order)
+            sub_folders = self.__sub_folders(depth, entries, visited)
+            stack.extend((path, depth + 1) for path in reversed(sub_folders))
+
+    def __walk_parallel(self, visited):
+        """
+        Walk the folders tree while listing folders in a threads pool.
+        Return paths in the exact same order as the serial walk.
+        """
+        # note: concurrent.futures is slow to import, so its imported only when walking with threads
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(self.__threads)
+        ahead = self.__threads * self.ListAhead
+        stack = []
+        try:
+            # folders we still need to visit, as [path, depth, listing future or None if not listed yet]
+            stack.append([self.__root, 0, None])
+            listing = 0
+
+            # walk folders
+            while stack:
+
+                # get next folder and wait for its listing
+                listing = self.__list_stack_ahead(pool, stack, listing, ahead)
+                folder, depth, future = stack.pop()
+                listing -= 1
+                entries = future.result()
+                if entries is None:
+                    continue
+
+                # add sub folders to visit (reversed to keep listing order), and start listing the next ones
+                sub_folders = self.__sub_folders(depth, entries, visited)
+                stack.extend([path, depth + 1, None] for path in reversed(sub_folders))
+                listing = self.__list_stack_ahead(pool, stack, listing, ahead)
+
+                # return folder content
+                for path in self.__folder_paths(folder, depth, entries):
+                    yield path
+
+        finally:
+            # cancel listings that didn't start yet
+            for _, _, future in stack:
+                if future is not None:
+                    future.cancel()
+            pool.shutdown(wait=False)
+
+    def __walk_unordered(self, visited):
+        """
+        Walk the folders tree while listing folders in a threads pool.
+        Return paths as soon as their folder is listed, so order is not deterministic.
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        pool = ThreadPoolExecutor(self.__threads)
+        ahead = self.__threads * self.ListAhead
+        pending = {}
+        try:
+            # folders being listed, as {listing future: (path, depth)}, and folders waiting to be listed when there's
+            # room, as (path, depth)
+            waiting = [(self.__root, 0)]
+            self.__list_ahead(pool, pending, waiting, ahead)
+
+            # walk folders
+            while pending:
+
+                # wait for any folder to finish listing
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+
+                    # get listed folder
+                    folder, depth = pending.pop(future)
+                    entries = future.result()
+                    if entries is None:
+                        continue
+
+                    # start listing sub folders, up to the list ahead limit
+                    waiting.extend((path, depth + 1) for path in reversed(self.__sub_folders(depth, entries, visited)))
+                    self.__list_ahead(pool, pending, waiting, ahead)
+
+                    # return folder content
+                    for path in self.__folder_paths(folder, depth, entries):
+                        yield path
+
+        finally:
+            # cancel listings that didn't start yet
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def __list_stack_ahead(self, pool, stack, listing, ahead):
+        """
+        Start listing the next folders to visit (top of stack) in pool, while less than 'ahead' folders are being
+        listed. The next folder is always listed. Return how many folders are being listed.
+        """
+        index = len(stack) - 1
+        while index >= 0 and (listing < ahead or index == len(stack) - 1):
+            item = stack[index]
+            if item[2] is None:
+                item[2] = pool.submit(self.__list_folder, item[0])
+                listing += 1
+            index -= 1
+        return listing
+
+    def __list_ahead(self, pool, pending, waiting, ahead):
+        """
+        Start listing waiting folders (last first) in pool, while less than 'ahead' folders are being listed.
+        """
+        while waiting and len(pending) < ahead:
+            path, depth = waiting.pop()
+            pending[pool.submit(self.__list_folder, path)] = (path, depth)
+
+    def __walk_sorted(self, visited):
+        """
+        Walk the folders tree and return paths sorted by name in every folder.
+        With threads, the next sub folders of every folder being walked are listed ahead in the pool, but no more than
+        the threads count per folder.
+        """
+        # note: concurrent.futures is slow to import, so its imported only when walking with threads
+        pool = None
+        if self.__threads:
+            from concurrent.futures import ThreadPoolExecutor
+            pool = ThreadPoolExecutor(self.__threads)
+        stack = []
+        try:
+            # folders being walked, as _SortedLevel of their remaining sorted items. every item is [path, depth,
+            # listing future] for sub folders, or [path, None, None] for files.
+            stack.append(_SortedLevel([[self.__root, 0, None]], pool, self.__list_folder, self.__threads))
+
+            # walk folders
+            while stack:
+
+                # get next item in current folder, or go back to parent folder when done
+                item = stack[-1].next()
+                if item is None:
+                    stack.pop()
+                    continue
+
+                # its a file - return it
+                path, depth, listing = item
+                if depth is None:
+                    yield path
+                    continue
+
+                # its a folder - list it
+                entries = listing.result() if listing is not None else self.__list_folder(path)
+                if entries is None:
+                    continue
+
+                # return folder itself (if needed), and get its files to return
+                paths = self.__folder_paths(path, depth, entries)
+                if self.__ret_folders and paths:
+                    yield paths[0]
+                    paths = paths[1:]
+
+                # sort files and sub folders together, and walk them
+                items = [(_sort_key(file_path, False), [file_path, None, None]) for file_path in paths]
+                items.extend((_sort_key(sub_folder, True), [sub_folder, depth + 1, None])
+                             for sub_folder in self.__sub_folders(depth, entries, visited))
+                items.sort(key=lambda sort_item: sort_item[0])
+                stack.append(_SortedLevel([walk_item for _, walk_item in items], pool, self.__list_folder,
+                                          self.__threads))
+
+        finally:
+            if pool is not None:
+                # cancel listings that didn't start yet
+                for level in stack:
+                    level.cancel()
+                pool.shutdown(wait=False)
+
+    def __folder_paths(self, folder, depth, entries):
+        """
+        Return the paths to return for a listed folder (the folder itself and / or its files).
+        """
+        # root folder is always scanned, but we only return its content if it pass the filter
+        if depth == 0 and self.__filter_folder is not None and not self.__filter_folder(folder):
+            return []
+
+        # get folder and files to return
+        ret = [folder] if self.__ret_folders else []
+        if self.__ret_files:
+            ret.extend(path for path, is_folder, _ in entries if not is_folder)
+
+            # add files entries to stat cache
+            if self.__stat_cache is not None:
+                for path, is_folder, entry in entries:
+                    if not is_folder and entry is not None:
+                        self.__stat_cache.add_entry(path, entry)
+        return ret
+
+    def __sub_folders(self, depth, entries, visited):
+        """
+        Return the sub folders we need to visit from a listed folder, in listing order.
+        """
+        # if reached depth limit, don't descend. else, get sub folders that pass the filter (and when following
+        # links, that were not visited yet)
+        if self.__depth_limit is not None and depth >= self.__depth_limit:
+            sub_folders = []
+        else:
+            sub_folders = [path for path, is_folder, entry in entries if is_folder and
+                           (self.__filter_folder is None or self.__filter_folder(path)) and
+                           (visited is None or _first_visit(visited, path, entry))]
+
+        # let walker know about sub folders that will not be listed
+        if self.__skip_hook:
+            visiting = set(sub_folders)
+            for path, is_folder, _ in entries:
+                if is_folder and path not in visiting:
+                    self.skip_folder(path)
+        return sub_folders
+
+
+class _SortedLevel(object):
+    """
+    The remaining sorted items of a folder being walked by the sorted walk.
+    With a threads pool, keeps the listings of the next sub folders (up to 'ahead' of them) running in the pool.
+    """
+
+    def __init__(self, items, pool, list_folder, ahead):
+        """
+        Init the folder items.
+        :param items: sorted items, as [path, depth, listing future] (depth is None for files).
+        :param pool: threads pool to list sub folders in, or None to list them when reached.
+        :param list_folder: function to list a folder.
+        :param ahead: max sub folders to list ahead.
+        """
+        self.__items = items
+        self.__pool = pool
+        self.__list_folder = list_folder
+        self.__ahead = ahead
+        self.__index = 0
+        self.__prefetch_index = 0
+        self.__listing = 0
+        self.__prefetch()
+
+    def next(self):
+        """
+        Return the next item, or None when done.
+        """
+        if self.__index >= len(self.__items):
+            return None
+        item = self.__items[self.__index]
+        self.__items[self.__index] = None
+        self.__index += 1
+        if item[2] is not None:
+            self.__listing -= 1
+        self.__prefetch()
+        return item
+
+    def cancel(self):
+        """
+        Cancel listings of the remaining sub folders that didn't start yet.
+        """
+        for item in self.__items[self.__index:]:
+            if item[2] is not None:
+                item[2].cancel()
+
+    def __prefetch(self):
+        """
+        Start listing the next sub folders in pool.
+        """
+        if self.__pool is None:
+            return
+        self.__prefetch_index = max(self.__prefetch_index, self.__index)
+        while self.__listing < self.__ahead and self.__prefetch_index < len(self.__items):
+            item = self.__items[self.__prefetch_index]
+            if item[1] is not None:
+                item[2] = self.__pool.submit(self.__list_folder, item[0])
+                self.__listing += 1
+            self.__prefetch_index += 1
+
+
+def _sort_key(path, is_folder):
+    """
+    Return the key to sort a folder's entries by: entry name, with '/' at the end for folders.
+    """
+    name = os.path.basename(path)
+    return name + "/" if is_folder else name
+
+
+def _first_visit(visited, path, entry):
+    """
+    Add a folder to the visited folders set, and return False if it was already there.
+    Folders that can't be stat'ed are always visited (listing them will fail anyway).
+    """
+    try:
+        folder_stat = entry.stat() if entry is not None else os.stat(path)
+    except OSError:
+        return True
+    return visited.add(folder_stat.st_dev, folder_stat.st_ino)
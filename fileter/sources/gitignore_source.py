@@ -0,0 +1,277 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a folders source that respect .gitignore files (and similar ignore files), like "git ls-files" with
+untracked files.
+
+Ignore files are read as the source descends into folders, and compiled into matchers per folder. Ignored folders
+are never listed.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+
+from .folder_source import FolderSource
+from .folder_walker import FolderWalker
+import os
+import re
+
+
+# if os.path.normcase() change case (eg windows), ignore patterns are case insensitive
+_IGNORE_CASE = os.path.normcase("A") != "A"
+
+
+class GitIgnoreSource(FolderSource):
+    """
+    A recursive folders source that skip files and folders ignored by .gitignore files.
+
+    Supports the full .gitignore patterns syntax: negation with "!", folder-only patterns with trailing "/",
+    anchored patterns (with "/" at start or middle), "**" and character classes. As in git, deeper ignore files
+    override higher ones, and files inside an ignored folder can't be re-included.
+    The ".git" folder is always skipped, and rules from ".git/info/exclude" under root are used too.
+    """
+
+    def __init__(self, root, depth_limit=None, ret_files=True, ret_folders=False, threads=None, ordered=True,
+                 ignore_files=(".gitignore", ".ignore"), sort=False):
+        """
+        Init the gitignore-aware folders source.
+        :param root: root folder to scan (usually the root of a git checkout).
+        :param depth_limit: how many levels to go deep recursively.
+                            None (default) = infinite depth.
+                            0 = non recursive.
+        :param ret_files: if true (default), will return files when iterating.
+        :param ret_folders: if true, will return folders when iterating.
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+        :param ordered: when using threads, if true (default) will keep the same order as a serial scan.
+        :param ignore_files: names of ignore files to read, by order of precedence (later files override earlier).
+        :param sort: if true, will return paths sorted by name in every folder (like "git ls-files").
+        """
+        super(GitIgnoreSource, self).__init__(root, depth_limit, ret_files, ret_folders, threads, ordered, sort=sort)
+        self.__ignore_files = ignore_files
+
+    def create_walker(self, *args):
+        """
+        Create a walker that skip ignored files and folders.
+        """
+        return _GitIgnoreWalker(self.__ignore_files, *args)
+
+
+class _GitIgnoreWalker(FolderWalker):
+    """
+    A folders walker that remove ignored files and folders from folders listing.
+    """
+
+    def __init__(self, ignore_files, root, *args):
+        super(_GitIgnoreWalker, self).__init__(root, *args)
+        self.__ignore_files = ignore_files
+
+        # matchers of folders we are about to list, as {folder: tuple of rules, deepest first}
+        root_rules = _read_rules(os.path.join(root, ".git", "info", "exclude"), root)
+        self.__matchers = {root: (root_rules,) if root_rules else ()}
+
+    def scan_folder(self, folder):
+        """
+        List a folder and remove ignored entries.
+        """
+        entries = super(_GitIgnoreWalker, self).scan_folder(folder)
+        matcher = self.__matchers.pop(folder, ())
+        if entries is None:
+            return None
+
+        # read this folder's ignore files
+        names = set(os.path.basename(path) for path, is_folder, _ in entries if not is_folder)
+        for ignore_file in self.__ignore_files:
+            if ignore_file in names:
+                rules = _read_rules(os.path.join(folder, ignore_file), folder)
+                if rules:
+                    matcher = (rules,) + matcher
+
+        # remove ignored entries, and set matcher for sub folders
+        ret = []
+        for path, is_folder, entry in entries:
+            if os.path.basename(path) == ".git":
+                continue
+            if _is_ignored(matcher, path, is_folder):
+                continue
+            if is_folder:
+                self.__matchers[path] = matcher
+            ret.append((path, is_folder, entry))
+        return ret
+
+    def skip_folder(self, folder):
+        """
+        Drop the matcher of a folder that will not be listed.
+        """
+        self.__matchers.pop(folder, None)
+
+
+def _is_ignored(matcher, path, is_folder):
+    """
+    Return if a path is ignored by a folder matcher (tuple of rules, deepest first).
+    """
+    for rules in matcher:
+        ignored = rules.match(path, is_folder)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def _read_rules(path, base):
+    """
+    Read an ignore file and return its compiled rules, or None if file don't exist or have no rules.
+    """
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as infile:
+            lines = infile.read().splitlines()
+    except OSError:
+        return None
+    rules = _IgnoreRules(base, lines)
+    return rules if rules else None
+
+
+class _IgnoreRules(object):
+    """
+    Compiled rules of a single ignore file.
+    The last rule to match a path decides if its ignored, so consecutive rules of the same kind (ignore / negate)
+    are merged into one regex, and groups are checked from last to first.
+    """
+
+    def __init__(self, base, lines):
+        """
+        Compile ignore file lines.
+        :param base: the folder of the ignore file (patterns are relative to it).
+        :param lines: ignore file lines.
+        """
+        self.__prefix_len = len(os.path.join(base, ""))
+
+        # parse lines into (is_negate, folders_only, regex)
+        rules = [rule for rule in (_parse_line(line) for line in lines) if rule is not None]
+        self.__count = len(rules)
+
+        # compile groups for files (without folder-only rules) and for folders, last rules first
+        self.__file_groups = _compile_groups([rule for rule in rules if not rule[1]])
+        self.__folder_groups = _compile_groups(rules)
+
+    def __bool__(self):
+        """
+        Return if there are any rules.
+        """
+        return self.__count > 0
+
+    def match(self, path, is_folder):
+        """
+        Return True if path is ignored, False if its explicitly not ignored (negated), or None if no rule match.
+        """
+        relative = path[self.__prefix_len:]
+        if os.sep != "/":
+            relative = relative.replace(os.sep, "/")
+        for is_negate, regex in (self.__folder_groups if is_folder else self.__file_groups):
+            if regex.match(relative):
+                return not is_negate
+        return None
+
+
+def _compile_groups(rules):
+    """
+    Compile list of (is_negate, folders_only, regex) into list of (is_negate, compiled regex), last rules first.
+    """
+    groups = []
+    for is_negate, _, regex in reversed(rules):
+        if groups and groups[-1][0] == is_negate:
+            groups[-1][1].append(regex)
+        else:
+            groups.append((is_negate, [regex]))
+    flags = re.IGNORECASE if _IGNORE_CASE else 0
+    return [(is_negate, re.compile("(?:%s)\\Z" % "|".join(regexes), flags)) for is_negate, regexes in groups]
+
+
+def _parse_line(line):
+    """
+    Parse a single ignore file line into (is_negate, folders_only, regex), or None if line has no rule.
+    """
+    # remove trailing spaces (unless escaped), and skip empty lines and comments
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+
+    # negation
+    is_negate = line.startswith("!")
+    if is_negate:
+        line = line[1:]
+
+    # folders only
+    folders_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    # patterns with a slash at start or middle are relative to the ignore file folder, others match at any level
+    anchored = "/" in line
+    line = line.lstrip("/")
+    regex = _translate(line)
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return is_negate, folders_only, regex
+
+
+def _translate(pattern):
+    """
+    Translate a gitignore pattern (without leading / trailing slashes) into a regex string.
+    """
+    ret = []
+    i = 0
+    length = len(pattern)
+    while i < length:
+        char = pattern[i]
+        i += 1
+
+        # "**" match across folders: "**/" match zero or more folders, and trailing "**" match everything
+        if char == "*" and pattern[i:i + 1] == "*" and (i == 1 or pattern[i - 2] == "/"):
+            if pattern[i + 1:i + 2] == "/":
+                ret.append("(?:.*/)?")
+                i += 2
+                continue
+            if i + 1 == length:
+                ret.append(".*")
+                i += 1
+                continue
+
+        # wildcards don't match slashes
+        if char == "*":
+            while pattern[i:i + 1] == "*":
+                i += 1
+            ret.append("[^/]*")
+        elif char == "?":
+            ret.append("[^/]")
+
+        # escaped character
+        elif char == "\\" and i < length:
+            ret.append(re.escape(pattern[i]))
+            i += 1
+
+        # character class
+        elif char == "[":
+            end = i
+            if pattern[end:end + 1] in ("!", "^"):
+                end += 1
+            if pattern[end:end + 1] == "]":
+                end += 1
+            end = pattern.find("]", end)
+            if end == -1:
+                ret.append("\\[")
+                continue
+            content = pattern[i:end]
+            i = end + 1
+            negate = content[:1] in ("!", "^")
+            if negate:
+                content = content[1:]
+            content = content.replace("\\", "\\\\").replace("[", "\\[").replace("]", "\\]")
+            ret.append("[%s%s]" % ("^/" if negate else "", content))
+
+        else:
+            ret.append(re.escape(char))
+
+    return "".join(ret)
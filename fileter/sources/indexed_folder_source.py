@@ -0,0 +1,223 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a folders source that keep an on-disk index of folders listings, so repeated scans of the same tree
+only list folders that changed since the last scan.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+
+from .folder_source import FolderSource
+from .folder_walker import FolderWalker
+import os
+import sqlite3
+import threading
+import time
+
+
+# path separator as bytes, and the byte that comes right after it (used to select whole trees from index)
+_SEP = os.fsencode(os.sep)
+_AFTER_SEP = bytes([_SEP[0] + 1])
+
+
+class FolderIndex(object):
+    """
+    On-disk index of folders listings, stored in a SQLite database.
+    Every folder is stored with its modification time, and its listing is reused as long as the folder mtime
+    didn't change (adding, removing or renaming entries in a folder always update its mtime).
+    """
+
+    # folders modified less than this many seconds before being listed are not stored, since they might change
+    # again within the same mtime tick without changing their mtime.
+    RacyWindow = 2.0
+
+    def __init__(self, path):
+        """
+        Open or create the index.
+        :param path: index file path.
+        """
+        self.__conn = sqlite3.connect(path, check_same_thread=False)
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS folders "
+                            "(path BLOB PRIMARY KEY, mtime INTEGER NOT NULL, entries BLOB NOT NULL)")
+        self.__lock = threading.Lock()
+
+        # how many folders listings were taken from index, and how many were listed
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, folder, mtime):
+        """
+        Get a folder listing from index.
+        :param folder: folder path.
+        :param mtime: folder's current mtime (in nanoseconds).
+        :return: list of (name, is_folder), or None if not in index or folder changed.
+        """
+        with self.__lock:
+            row = self.__conn.execute("SELECT mtime, entries FROM folders WHERE path = ?",
+                                      (_key(folder),)).fetchone()
+            if row is None or row[0] != mtime:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return _decode_entries(row[1])
+
+    def put(self, folder, mtime, entries, listed_at):
+        """
+        Store a folder listing in index.
+        Sub folders that no longer exist are removed from index, along with their whole tree.
+        :param folder: folder path.
+        :param mtime: folder's mtime when listed (in nanoseconds).
+        :param entries: list of (name, is_folder).
+        :param listed_at: time the folder was listed at (in nanoseconds, as returned by time.time_ns()).
+        """
+        key = _key(folder)
+        with self.__lock:
+
+            # remove sub folders that no longer exist
+            row = self.__conn.execute("SELECT entries FROM folders WHERE path = ?", (key,)).fetchone()
+            if row is not None:
+                current = set(name for name, is_folder in entries if is_folder)
+                for name, is_folder in _decode_entries(row[0]):
+                    if is_folder and name not in current:
+                        self.__remove_tree(os.path.join(folder, name))
+
+            # store listing, unless folder was modified too recently to trust its mtime
+            if mtime < listed_at - int(self.RacyWindow * 1e9):
+                self.__conn.execute("INSERT OR REPLACE INTO folders (path, mtime, entries) VALUES (?, ?, ?)",
+                                    (key, mtime, _encode_entries(entries)))
+            else:
+                self.__conn.execute("DELETE FROM folders WHERE path = ?", (key,))
+
+    def __remove_tree(self, folder):
+        """
+        Remove a folder and all its sub folders from index.
+        """
+        key = _key(folder)
+        self.__conn.execute("DELETE FROM folders WHERE path = ? OR (path > ? AND path < ?)",
+                            (key, key + _SEP, key + _AFTER_SEP))
+
+    def commit(self):
+        """
+        Write all changes to disk.
+        """
+        with self.__lock:
+            self.__conn.commit()
+
+    def close(self):
+        """
+        Write all changes and close the index.
+        """
+        self.commit()
+        self.__conn.close()
+
+
+class IndexedFolderSource(FolderSource):
+    """
+    A recursive folders source that keep folders listings in an on-disk index.
+    On later scans, folders that didn't change (same mtime) are not listed again, and their listing is taken
+    from the index instead. This makes repeated scans of big, mostly-static trees much faster.
+
+    Note: files content and attributes don't affect their folder's mtime, so this only makes *listing* incremental.
+    """
+
+    def __init__(self, root, index_path, depth_limit=None, ret_files=True, ret_folders=False, threads=None,
+                 ordered=True, sort=False):
+        """
+        Init the indexed folders source.
+        :param root: root folder to scan.
+        :param index_path: path of the index file to use (created if doesn't exist).
+        :param depth_limit: how many levels to go deep recursively.
+                            None (default) = infinite depth.
+                            0 = non recursive.
+        :param ret_files: if true (default), will return files when iterating.
+        :param ret_folders: if true, will return folders when iterating.
+        :param threads: if provided, will list folders in parallel using a pool of this many threads.
+        :param ordered: when using threads, if true (default) will keep the same order as a serial scan.
+        :param sort: if true, will return paths sorted by name in every folder, so the order is the same on all file
+                     systems (see FolderWalker).
+        """
+        super(IndexedFolderSource, self).__init__(root, depth_limit, ret_files, ret_folders, threads, ordered,
+                                                  sort=sort)
+        self.__index_path = index_path
+        self.__index = None
+
+        # how many folders listings were taken from index / listed, in the last scan
+        self.index_hits = 0
+        self.index_misses = 0
+
+    def __next__(self):
+        """
+        Return all files in folder, using the index.
+        """
+        self.__index = FolderIndex(self.__index_path)
+        try:
+            for path in super(IndexedFolderSource, self).__next__():
+                yield path
+        finally:
+            self.index_hits = self.__index.hits
+            self.index_misses = self.__index.misses
+            self.__index.close()
+            self.__index = None
+
+    def create_walker(self, *args):
+        """
+        Create a walker that list folders using the index.
+        """
+        return _IndexedFolderWalker(self.__index, *args)
+
+
+class _IndexedFolderWalker(FolderWalker):
+    """
+    A folders walker that take folders listings from index when they didn't change.
+    """
+
+    def __init__(self, index, *args):
+        super(_IndexedFolderWalker, self).__init__(*args)
+        self.__index = index
+
+    def scan_folder(self, folder):
+        """
+        List a folder from index if it didn't change, else list it and update the index.
+        Note: entries taken from index don't have a DirEntry (entry is None).
+        """
+        # get folder mtime
+        listed_at = time.time_ns()
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+        # try to get listing from index
+        names = self.__index.get(folder, mtime)
+        if names is not None:
+            return [(os.path.join(folder, name), is_folder, None) for name, is_folder in names]
+
+        # list folder and update index
+        entries = super(_IndexedFolderWalker, self).scan_folder(folder)
+        if entries is not None:
+            self.__index.put(folder, mtime, [(entry.name, is_folder) for _, is_folder, entry in entries], listed_at)
+        return entries
+
+
+def _key(folder):
+    """
+    Return the index key of a folder path.
+    """
+    return os.fsencode(os.path.abspath(folder))
+
+
+def _encode_entries(entries):
+    """
+    Encode list of (name, is_folder) into bytes (names can't contain null characters, so we use them as separator).
+    """
+    return b"\0".join((b"d" if is_folder else b"f") + os.fsencode(name) for name, is_folder in entries)
+
+
+def _decode_entries(data):
+    """
+    Decode list of (name, is_folder) from bytes.
+    """
+    if not data:
+        return []
+    return [(os.fsdecode(item[1:]), item[:1] == b"d") for item in data.split(b"\0")]
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a source that merge several folder sources with nested roots into a single walk.
+
+For example, a FolderSource of "project" and a PatternSource of "*.py" in "project/src" would normally list all
+folders in "project/src" twice. When merged, "project" is walked once and every listed path is dispatched to the
+sources that would return it.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+
+from .source_api import SourceAPI
+from .folder_walker import FolderWalker
+import collections
+import os
+
+
+# how a source walks folders, as returned by SourceAPI.get_walk_plan():
+# root - root folder to walk.
+# depth_limit - how many levels to go deep (None = infinite, 0 = non recursive).
+# ret_files / ret_folders - if files and / or folders are returned.
+# threads / ordered - parallel listing settings (see FolderWalker).
+# filter_folder - optional function to get folder path and return False to skip its tree (see FolderSource).
+# match_path - optional function to get path and return False to not return it (see PatternSource).
+WalkPlan = collections.namedtuple("WalkPlan", ["root", "depth_limit", "ret_files", "ret_folders", "threads",
+                                               "ordered", "filter_folder", "match_path"])
+
+
+class MergedFolderSource(SourceAPI):
+    """
+    A source that walk the trees of several folder sources in a single pass.
+    The first source with the outermost root is walked, and every path is returned once if any of the sources
+    would return it, in the form that the first source (by order) to return it would use.
+    """
+
+    def __init__(self, sources):
+        """
+        Init the merged source.
+        :param sources: list of sources to merge. all sources must have a walk plan (see SourceAPI.get_walk_plan()),
+                        and their roots must be inside the root of one of them.
+        """
+        self.sources = list(sources)
+        self.__plans = [source.get_walk_plan() for source in self.sources]
+        self.__stat_cache = None
+        self.__prune_rule = None
+
+        # find the outermost root to walk from
+        abs_roots = [_abs_path(plan.root) for plan in self.__plans]
+        outer = min(range(len(abs_roots)), key=lambda i: len(abs_roots[i]))
+        for abs_root in abs_roots:
+            if not _is_inside(abs_root, abs_roots[outer]):
+                raise ValueError("Can't merge sources: '%s' is not inside '%s'!" % (abs_root, abs_roots[outer]))
+        self.__root = self.__plans[outer].root
+
+        # get every plan's root key (path relative to walk root, "" for the root itself)
+        self.__root_keys = [_relative_key(abs_root, abs_roots[outer]) for abs_root in abs_roots]
+
+        # folders we must walk through to get to the inner roots, even if no source list them
+        self.__transit = set()
+        for key in self.__root_keys:
+            while key:
+                key = key.rpartition(os.sep)[0]
+                self.__transit.add(key)
+
+    @staticmethod
+    def plan(sources):
+        """
+        Plan how to iterate a list of sources: group sources that can be merged by their outermost root.
+        :param sources: list of sources, by order.
+        :return: list of (source to iterate, list of original sources it covers), by order. Sources that can't be
+                 merged are returned as-is, and groups are placed where their first source was.
+        """
+        # get roots of sources that can be merged
+        abs_roots = {}
+        for index, source in enumerate(sources):
+            plan = source.get_walk_plan()
+            if plan is not None:
+                abs_roots[index] = _abs_path(plan.root)
+
+        # group every source by its outermost containing root (first source wins ties)
+        groups = collections.OrderedDict()
+        for index in range(len(sources)):
+            if index not in abs_roots:
+                groups[("single", index)] = [index]
+                continue
+            outer = min((other for other in abs_roots if _is_inside(abs_roots[index], abs_roots[other])),
+                        key=lambda other: (len(abs_roots[other]), other))
+            groups.setdefault(("merged", abs_roots[outer]), []).append(index)
+
+        # create merged sources
+        ret = []
+        for indexes in groups.values():
+            group = [sources[index] for index in indexes]
+            ret.append((group[0] if len(group) == 1 else MergedFolderSource(group), group))
+        return ret
+
+    def get_root(self):
+        """
+        Return the root folder of the merged walk.
+        """
+        return self.__root
+
+    def set_stat_cache(self, stat_cache):
+        """
+        Set the stat cache to fill with listed files.
+        """
+        self.__stat_cache = stat_cache
+
+    def set_prune_rule(self, prune_rule):
+        """
+        Set the rule of folders to skip without listing them.
+        """
+        self.__prune_rule = prune_rule
+
+    def __next__(self):
+        """
+        Walk the outermost root once and return the paths any of the sources would return.
+        """
+        plans = self.__plans
+
+        # folders being walked, as {folder path: list of (plan index, depth, returns content) of plans visiting it}
+        visiting = {}
+
+        # get functions to convert paths from the walk form to every plan's form (None if its the same form)
+        prefixes = [os.path.join(self.__root, key) if key else self.__root for key in self.__root_keys]
+        to_form = [None if prefix == plan.root else _path_converter(prefix, plan.root)
+                   for prefix, plan in zip(prefixes, plans)]
+
+        def visit(folder, key, parent_members):
+            """
+            Return (and remember) which plans visit a folder, as list of (plan index, depth, returns content).
+            """
+            members = []
+            for index, depth in parent_members:
+                plan = plans[index]
+                if (plan.depth_limit is None or depth < plan.depth_limit) and \
+                        (plan.filter_folder is None or plan.filter_folder(_convert(to_form[index], folder))):
+                    members.append((index, depth + 1, True))
+            for index, root_key in enumerate(self.__root_keys):
+                if root_key == key:
+                    filter_folder = plans[index].filter_folder
+                    members.append((index, 0, filter_folder is None or
+                                    filter_folder(_convert(to_form[index], folder))))
+            members.sort()
+            visiting[folder] = members
+            return members
+
+        def filter_folder(folder):
+            """
+            Return if the walk should descend into a folder.
+            """
+            if folder in visiting:
+                return True
+            parent_members = visiting[_parent_folder(folder, self.__root, visiting)]
+            key = os.path.normcase(folder[len(self.__root):].lstrip(os.sep))
+            members = visit(folder, key, [(index, depth) for index, depth, _ in parent_members])
+            return bool(members) or key in self.__transit
+
+        # visit the root folder
+        visit(self.__root, "", [])
+
+        # walk all folders. folders are always returned by the walker, so we know which folder files are in.
+        walker = FolderWalker(self.__root, None, any(plan.ret_files for plan in plans), True, filter_folder,
+                              max(plan.threads or 0 for plan in plans) or None, all(plan.ordered for plan in plans),
+                              self.__stat_cache, self.__prune_rule)
+        files_members = []
+        for path in walker.walk():
+
+            # got a folder? get the plans that return its files, and return folder if any plan return folders
+            folder_members = visiting.get(path)
+            if folder_members is not None:
+                members = [index for index, _, returns_content in folder_members if returns_content]
+                files_members = [index for index in members if plans[index].ret_files]
+                ret = self.__dispatch(path, [index for index in members if plans[index].ret_folders], to_form)
+
+            # its a file in current folder
+            else:
+                ret = self.__dispatch(path, files_members, to_form)
+
+            if ret is not None:
+                yield ret
+
+    def __dispatch(self, path, members, to_form):
+        """
+        Return path in the form of the first plan that would return it, or None if no plan would.
+        """
+        for index in members:
+            converted = _convert(to_form[index], path)
+            match_path = self.__plans[index].match_path
+            if match_path is None or match_path(converted):
+                return converted
+        return None
+
+
+def _abs_path(path):
+    """
+    Return normalized absolute path, to compare roots.
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _is_inside(path, root):
+    """
+    Return if path is root or inside it (both normalized absolute paths).
+    """
+    return path == root or path.startswith(os.path.join(root, ""))
+
+
+def _relative_key(path, root):
+    """
+    Return path relative to root ("" for root itself), both normalized absolute paths.
+    """
+    return "" if path == root else os.path.relpath(path, root)
+
+
+def _parent_folder(folder, root, visiting):
+    """
+    Return the path of a folder's parent, as the walker joined it.
+    """
+    parent = folder[:folder.rfind(os.sep)]
+    return parent if parent in visiting else root
+
+
+def _path_converter(prefix, root):
+    """
+    Return a function to convert paths under prefix (walk form) to the same paths under root (a source form).
+    """
+    prefix_len = len(prefix)
+    return lambda path: root if len(path) == prefix_len else os.path.join(root, path[prefix_len:].lstrip(os.sep))
+
+
+def _convert(converter, path):
+    """
+    Convert a path with a converter, or return it as-is if converter is None.
+    """
+    return path if converter is None else converter(path)
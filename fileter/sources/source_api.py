@@ -19,6 +19,11 @@ class SourceAPI(object):
     Inherit from this class and implement the required functions to create a customized source type.
     """
 
+    # true if this source may return the same file more than once on purpose (for example, every time it changes),
+    # so files iterators that skip files that were already returned (see FilesIterator.MergeSources) will not skip
+    # its files.
+    RepeatFiles = False
+
     def __iter__(self):
         """
         Implement the iter function so we'll be able to iterate over this source.
@@ -32,13 +37,61 @@ class SourceAPI(object):
 
         See python iteratables protocol for more info, but in short you just need to do the following:
         1. if you got next value to return, return it using yield.
-        2. when you have no more values, raise StopIteration exception.
+        2. when you have no more values, simply return (don't raise StopIteration, see PEP 479).
         """
         raise NotImplementedError()
 
+    def set_stat_cache(self, stat_cache):
+        """
+        Called by the files iterator when iteration starts, with the stat cache to use (or None), and with None when
+        iteration ends.
+        Sources that list folders can fill it with the listed entries, so files are not stat'ed again later.
+        """
+        pass
+
+    def set_prune_rule(self, prune_rule):
+        """
+        Called by the files iterator when iteration starts, with a function to get folder path and return True if
+        all paths in its tree would be excluded by the iterator filters (or None), and with None when iteration ends.
+        Sources that list folders can use it to skip these folders without listing them.
+        """
+        pass
+
+    def on_processed(self):
+        """
+        Called by the files iterator after all the files this source returned were processed (when processing in
+        parallel, this can be long after the source returned its last file).
+        Also called by get_all(), since all files are returned to the caller.
+        """
+        pass
+
+    def on_file_rejected(self, path):
+        """
+        Called by the files iterator for every file this source returned that didn't pass the iterator filters, so it
+        will not be processed.
+        """
+        pass
+
+    def get_walk_plan(self):
+        """
+        Return a WalkPlan that describe how this source walks folders, so the files iterator can merge it with other
+        folder sources with nested roots into a single walk (see MergedFolderSource).
+        Return None (default) if this source can't be merged.
+        """
+        return None
+
+    def get_root(self):
+        """
+        Return the root folder this source returns paths under, or None (default) if it has no single root.
+        Iterators that modify the file system use it to know where they must stop, eg not remove the root itself.
+        """
+        return None
+
     def get_all(self):
         """
         return all files in this source as list.
         """
-        return [x for x in iter(self)]
+        ret = [x for x in iter(self)]
+        self.on_processed()
+        return ret
 
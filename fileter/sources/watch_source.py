@@ -0,0 +1,318 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Implement a source that watch a folder tree and return files as they change, so a files iterator can run
+continuously as a daemon instead of re-scanning the whole tree over and over.
+
+On Linux, changes are detected with inotify. On other platforms (or if inotify can't be used), the tree is polled
+for changes every few seconds.
+
+Author: Ronen Ness.
+Since: 2016.
+"""
+
+from .source_api import SourceAPI
+from .folder_walker import FolderWalker
+import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+
+class WatchSource(SourceAPI):
+    """
+    A source that do one initial scan of a folder tree (optional), and then return files that are created or
+    modified as changes happen.
+    Bursts of changes are coalesced: a file is returned only after it didn't change for a debounce window.
+
+    This source never ends by itself, unless idle_timeout is set. To stop it from another thread, call stop().
+    """
+
+    # max time to wait for events before checking if stop() was called
+    StopCheckInterval = 0.25
+
+    # files are returned again every time they change
+    RepeatFiles = True
+
+    def __init__(self, root, debounce=0.5, initial_scan=True, idle_timeout=None, poll_interval=1.0,
+                 use_inotify=True):
+        """
+        Init the watch source.
+        :param root: root folder to watch (recursively).
+        :param debounce: return a changed file only after it didn't change for this many seconds.
+        :param initial_scan: if true (default), will start by returning all existing files.
+        :param idle_timeout: if provided, will stop after this many seconds without any changes.
+        :param poll_interval: when polling for changes, how many seconds to wait between scans.
+        :param use_inotify: if true (default), will use inotify when available. if false, will always poll.
+        """
+        self.__root = root
+        self.__debounce = debounce
+        self.__initial_scan = initial_scan
+        self.__idle_timeout = idle_timeout
+        self.__poll_interval = poll_interval
+        self.__use_inotify = use_inotify
+        self.__stop = threading.Event()
+
+    def get_root(self):
+        """
+        Return the root folder this source watches.
+        """
+        return self.__root
+
+    def stop(self):
+        """
+        Stop watching (can be called from any thread). Changes that are still in debounce window are dropped.
+        """
+        self.__stop.set()
+
+    def create_watcher(self):
+        """
+        Create the changes watcher to use: inotify if possible, else polling.
+        """
+        if self.__use_inotify and sys.platform.startswith("linux"):
+            try:
+                return _InotifyWatcher(self.__root)
+            except OSError:
+                pass
+        return _PollingWatcher(self.__root, self.__poll_interval)
+
+    def __next__(self):
+        """
+        Return existing files and then changed files, as they change.
+        """
+        self.__stop.clear()
+
+        # start watching before the initial scan, so we won't miss changes done while scanning
+        watcher = self.create_watcher()
+        try:
+            # initial scan
+            if self.__initial_scan:
+                for path in FolderWalker(self.__root).walk():
+                    if self.__stop.is_set():
+                        return
+                    yield path
+
+            # changed files waiting for the debounce window to pass, as {path: last change time}, by time
+            pending = collections.OrderedDict()
+            last_change = time.monotonic()
+
+            # wait for changes
+            while not self.__stop.is_set():
+
+                # calc how long to wait for changes
+                now = time.monotonic()
+                timeout = self.StopCheckInterval
+                if pending:
+                    timeout = min(timeout, max(0, next(iter(pending.values())) + self.__debounce - now))
+                if self.__idle_timeout is not None:
+                    timeout = min(timeout, max(0, last_change + self.__idle_timeout - now))
+
+                # get changes
+                changes = watcher.get_changes(timeout)
+                now = time.monotonic()
+                for path in changes:
+                    pending[path] = now
+                    pending.move_to_end(path)
+                    last_change = now
+
+                # return files that didn't change during debounce window
+                now = time.monotonic()
+                while pending:
+                    path, changed = next(iter(pending.items()))
+                    if changed + self.__debounce > now:
+                        break
+                    del pending[path]
+                    if os.path.isfile(path):
+                        yield path
+                        if self.__stop.is_set():
+                            return
+
+                # check idle timeout
+                if self.__idle_timeout is not None and not pending and \
+                        time.monotonic() - last_change >= self.__idle_timeout:
+                    return
+
+        finally:
+            watcher.close()
+
+
+class _PollingWatcher(object):
+    """
+    Detect changes by scanning the folder tree and comparing files size and mtime.
+    """
+
+    def __init__(self, root, interval):
+        self.__root = root
+        self.__interval = interval
+        self.__next_scan = time.monotonic() + interval
+        self.__files = self.__snapshot()
+
+    def __snapshot(self):
+        """
+        Return {path: (size, mtime)} of all files in tree.
+        """
+        ret = {}
+        for path in FolderWalker(self.__root).walk():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            ret[path] = (stat.st_size, stat.st_mtime_ns)
+        return ret
+
+    def get_changes(self, timeout):
+        """
+        Wait up to timeout seconds, and return list of created / modified files if its time to scan.
+        """
+        # wait for next scan
+        wait_time = self.__next_scan - time.monotonic()
+        if wait_time > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0, wait_time))
+        self.__next_scan = time.monotonic() + self.__interval
+
+        # scan and compare
+        files = self.__snapshot()
+        changed = [path for path, state in files.items() if self.__files.get(path) != state]
+        self.__files = files
+        return changed
+
+    def close(self):
+        """
+        Stop watching.
+        """
+        pass
+
+
+# inotify events we listen to
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_DONT_FOLLOW = 0x2000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_ONLYDIR | _IN_DONT_FOLLOW
+
+# inotify event header: watch descriptor, mask, cookie, name length
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _InotifyWatcher(object):
+    """
+    Detect changes with Linux inotify, by watching every folder in tree.
+    Raise OSError if inotify can't be used.
+    """
+
+    def __init__(self, root):
+        # load inotify functions from libc
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            init = libc.inotify_init1
+            self.__add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise OSError(errno.ENOSYS, "inotify is not available: %s" % e)
+
+        # create inotify instance
+        self.__fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # watch all folders in tree
+        self.__root = root
+        self.__folders = {}
+        try:
+            for folder in FolderWalker(root, ret_files=False, ret_folders=True).walk():
+                self.__watch(folder)
+        except OSError:
+            self.close()
+            raise
+
+    def __watch_tree(self, root):
+        """
+        Watch all folders in a tree, and return list of all files in it.
+        Used for new folders, so we won't miss files created in them before they were watched.
+        """
+        ret = []
+        for path in FolderWalker(root, ret_folders=True).walk():
+            if os.path.isdir(path):
+                self.__watch(path)
+            else:
+                ret.append(path)
+        return ret
+
+    def __watch(self, folder):
+        """
+        Add a folder to watch.
+        """
+        wd = self.__add_watch(self.__fd, os.fsencode(folder), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return
+            raise OSError(err, "inotify_add_watch failed on '%s'" % folder)
+        self.__folders[wd] = folder
+
+    def get_changes(self, timeout):
+        """
+        Wait up to timeout seconds for events, and return list of created / modified files.
+        """
+        ret = []
+        if not select.select([self.__fd], [], [], timeout)[0]:
+            return ret
+
+        # read all available events
+        while True:
+            try:
+                data = os.read(self.__fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += _EVENT_HEADER.size + length
+
+                # events queue overflowed: watch new folders and return all files, since we don't know what changed
+                if mask & _IN_Q_OVERFLOW:
+                    ret.extend(self.__watch_tree(self.__root))
+                    continue
+
+                # folder is no longer watched
+                if mask & _IN_IGNORED:
+                    self.__folders.pop(wd, None)
+                    continue
+
+                # get event path
+                folder = self.__folders.get(wd)
+                if folder is None or not name:
+                    continue
+                path = os.path.join(folder, os.fsdecode(name))
+
+                # new folder: watch its tree, and return files that were created in it before we watched it
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO):
+                        ret.extend(self.__watch_tree(path))
+                    continue
+
+                # changed file
+                ret.append(path)
+
+        return ret
+
+    def close(self):
+        """
+        Stop watching and close inotify instance.
+        """
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
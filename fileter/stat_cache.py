@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+A cache of files stat info, shared by sources, filters and process_file() during an iteration, so every file is
+stat'ed at most once.
+
+Folder sources fill the cache with the os.scandir() entries they list. Entries already know if they are files or
+folders, and on Windows they come with the full stat info, so in many cases no extra system call is needed at all.
+
+Author: Ronen Ness.
+Since: 2016
+"""
+import collections
+import os
+import threading
+
+
+class StatCache(object):
+    """
+    A bounded (least recently used) cache of path -> stat info.
+    Files are usually processed right after they are listed, so only recently listed files need to be kept.
+    """
+
+    # default max paths to keep in cache
+    MaxSize = 65536
+
+    def __init__(self, max_size=None):
+        """
+        Create the stat cache.
+        :param max_size: max paths to keep in cache (default to MaxSize).
+        """
+        self.__max_size = max_size or self.MaxSize
+        self.__cache = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def add_entry(self, path, entry):
+        """
+        Add an os.scandir() entry to cache. Its stat info is only fetched when needed.
+        :param path: file path.
+        :param entry: os.DirEntry of this path.
+        """
+        self.__put(path, entry)
+
+    def stat(self, path):
+        """
+        Return stat info of a path (same as os.stat(), follow links), from cache if possible.
+        :param path: file path.
+        """
+        # get from cache
+        with self.__lock:
+            value = self.__cache.get(path)
+            if value is not None:
+                self.__cache.move_to_end(path)
+
+        # already got stat result?
+        if isinstance(value, os.stat_result):
+            return value
+
+        # stat from scandir entry or from path, and store in cache
+        value = value.stat() if value is not None else os.stat(path)
+        self.__put(path, value)
+        return value
+
+    def __put(self, path, value):
+        """
+        Put a value in cache, and remove the least recently used path if cache is full.
+        """
+        with self.__lock:
+            self.__cache[path] = value
+            self.__cache.move_to_end(path)
+            if len(self.__cache) > self.__max_size:
+                self.__cache.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all paths from cache.
+        """
+        with self.__lock:
+            self.__cache.clear()
@@ -15,6 +15,8 @@ from .test_iterator_grep import *
 from .test_iterator_concat_file import *
 from .test_iterator_add_header import *
 from .test_iterator_remove_files import *
+from .test_iterator_find_duplicates import *
+from .test_iterator_hash_files import *
 
 # run tests
 if __name__ == '__main__':
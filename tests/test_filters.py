@@ -5,6 +5,10 @@ Tests for the file filters.
 """
 import fileter
 import unittest
+import datetime
+import shutil
+import stat
+import os
 
 
 class TestFilters(unittest.TestCase):
@@ -43,6 +47,22 @@ class TestFilters(unittest.TestCase):
         self.assertTrue(_filter.match("/test/abc"))
         self.assertFalse(_filter.match("no-no"))
 
+        # multiple patterns
+        _filter = fileter.filters.FilterPattern(["*.py", "*/.git/*", "[ab]?.txt"])
+        self.assertTrue(_filter.match("foo.py"))
+        self.assertTrue(_filter.match("src/.git/config"))
+        self.assertTrue(_filter.match("a1.txt"))
+        self.assertFalse(_filter.match("c1.txt"))
+        self.assertFalse(_filter.match("foo.pyc"))
+
+        # case sensitivity control
+        self.assertTrue(fileter.filters.FilterPattern("*.TXT", case_sensitive=False).match("a.txt"))
+        self.assertFalse(fileter.filters.FilterPattern("*.TXT", case_sensitive=True).match("a.txt"))
+
+        # empty list of patterns match nothing
+        self.assertFalse(fileter.filters.FilterPattern([]).match("a.txt"))
+        self.assertFalse(fileter.filters.FilterPattern([]).match(""))
+
     def test_extension_filter(self):
         """
         Test the files extension filter.
@@ -59,3 +79,194 @@ class TestFilters(unittest.TestCase):
         self.assertFalse(_filter.match("file.exe"))
         self.assertFalse(_filter.match("file"))
         self.assertFalse(_filter.match(""))
+
+    def test_compiled_filters(self):
+        """
+        Test that compiled filters give the exact same results as evaluating filters one by one.
+        """
+        types = fileter.FilesIterator.FilterType
+
+        def match_one_by_one(filters, path):
+            all_required_match = True
+            for filt, ftype in filters:
+                if all_required_match and ftype == types.Required and not filt.match(path):
+                    all_required_match = False
+                elif ftype == types.Include and filt.match(path):
+                    return True
+                elif ftype == types.Exclude and filt.match(path):
+                    return False
+            return all_required_match
+
+        class CustomFilter(fileter.filters.FilterAPI):
+            def match(self, filepath):
+                return "custom" in filepath
+
+        paths = ["a.txt", "a.exe", "b.TXT", "c.aaa", "d.elf", "noext", "dir.d/file", "src/custom.py",
+                 "src/.git/config", "x/node_modules/y.js", "test_me.py", "(a)a", "AAA"]
+
+        filters_sets = [
+            [],
+            [(fileter.filters.FilterExtension(["txt", "exe"]), types.Required)],
+            [(fileter.filters.FilterExtension(["txt", "exe"]), types.Required),
+             (fileter.filters.FilterExtension(["txt", "py"]), types.Required)],
+            [(fileter.filters.FilterPattern("*.???"), types.Required),
+             (fileter.filters.FilterPattern("?.e??"), types.Required),
+             (fileter.filters.FilterPattern("?.txt"), types.Include),
+             (fileter.filters.FilterPattern("*.elf"), types.Exclude)],
+            [(fileter.filters.FilterRegex(".*test"), types.Exclude),
+             (fileter.filters.FilterPattern(["*/.git/*", "*/node_modules/*"]), types.Exclude),
+             (fileter.filters.FilterExtension("py"), types.Required),
+             (CustomFilter(), types.Exclude)],
+            [(fileter.filters.FilterExtension("py"), types.Include),
+             (fileter.filters.FilterRegex(r"(a)\1"), types.Include),
+             (fileter.filters.FilterRegex("(?i)aaa"), types.Include),
+             (CustomFilter(), types.Exclude),
+             (fileter.filters.FilterRegex(".*node"), types.Include),
+             (fileter.filters.FilterPattern("*"), types.Exclude),
+             (fileter.filters.FilterRegex("no"), types.Required)],
+            [(fileter.filters.FilterRegex("(x)?y"), types.Include),
+             (fileter.filters.FilterRegex(r"(\()?a(?(1)\)a|)$"), types.Include),
+             (fileter.filters.FilterPattern("*"), types.Exclude)],
+            [(fileter.filters.FilterPattern("*.TXT", case_sensitive=False), types.Include),
+             (fileter.filters.FilterPattern("*.exe"), types.Include),
+             (fileter.filters.FilterPattern("*.EXE", case_sensitive=True), types.Required)],
+        ]
+
+        for filters in filters_sets:
+            compiled = fileter.filters.compiled_filters.CompiledFilters(filters, types)
+            for path in paths:
+                self.assertEqual(compiled.match(path), match_one_by_one(filters, path), (filters, path))
+
+    def test_stat_filters(self):
+        """
+        Test filters by file stat info, and the stat cache.
+        """
+        # create testing files
+        if os.path.isdir("_temp"):
+            shutil.rmtree("_temp")
+        os.makedirs("_temp")
+        for name, size, mtime, mode in (("small", 10, 1000000000, 0o644), ("big", 1000, 1500000000, 0o755),
+                                        ("medium", 100, 2000000000, 0o600)):
+            path = os.path.join("_temp", name)
+            with open(path, "w") as outf:
+                outf.write("x" * size)
+            os.utime(path, (mtime, mtime))
+            os.chmod(path, mode)
+
+        # iterator that return files size, using the stat cache
+        class TestIterator(fileter.FilesIterator):
+            UseStatCache = True
+
+            def process_file(self, path, dryrun):
+                return os.path.basename(path), self.stat(path).st_size
+
+        def get_files(*filters):
+            _test = TestIterator()
+            _test.add_folder("_temp")
+            for filt in filters:
+                _test.add_filter(filt)
+            return sorted(_test.get_all())
+
+        try:
+            # size filters
+            self.assertListEqual(get_files(fileter.filters.FilterSize(50)), [("big", 1000), ("medium", 100)])
+            self.assertListEqual(get_files(fileter.filters.FilterSize(50, 500)), [("medium", 100)])
+            self.assertListEqual(get_files(fileter.filters.FilterSize(max_size=10)), [("small", 10)])
+
+            # mtime filters (timestamps and datetime)
+            self.assertListEqual(get_files(fileter.filters.FilterMTime(1200000000)), [("big", 1000), ("medium", 100)])
+            self.assertListEqual(get_files(fileter.filters.FilterMTime(
+                older_than=datetime.datetime.fromtimestamp(1200000000))), [("small", 10)])
+
+            # mode and owner filters
+            if os.name != "nt":
+                self.assertListEqual(get_files(fileter.filters.FilterMode(stat.S_IXUSR)), [("big", 1000)])
+                self.assertListEqual(get_files(fileter.filters.FilterMode(stat.S_IROTH, 0)), [("medium", 100)])
+                self.assertListEqual(get_files(fileter.filters.FilterOwner(os.getuid()), fileter.filters.FilterSize(1)),
+                                     [("big", 1000), ("medium", 100), ("small", 10)])
+                self.assertListEqual(get_files(fileter.filters.FilterOwner(os.getuid() + 1)), [])
+
+            # stat cache: every file is stat'ed at most once across filters and process_file()
+            cache = fileter.stat_cache.StatCache()
+            calls = []
+            original_stat = os.stat
+
+            def counting_stat(path, *args, **kwargs):
+                calls.append(path)
+                return original_stat(path, *args, **kwargs)
+
+            os.stat = counting_stat
+            try:
+                for path in ("_temp/small", "_temp/big"):
+                    for _ in range(3):
+                        cache.stat(path)
+            finally:
+                os.stat = original_stat
+            self.assertListEqual(calls, ["_temp/small", "_temp/big"])
+
+        finally:
+            shutil.rmtree("_temp")
+
+    def test_stat_once_while_iterating(self):
+        """
+        Test that while iterating, every file is stat'ed at most once by sources, stat filters and process_file().
+        """
+        # create testing files, in a sub folder too
+        os.makedirs("_temp_stat_once/sub")
+        for name, size in (("a", 10), ("b", 1000), ("sub/c", 100)):
+            with open(os.path.join("_temp_stat_once", name), "w") as outf:
+                outf.write("x" * size)
+
+        # count stat calls, both by path and by scandir entries
+        calls = []
+        original_stat = os.stat
+        original_scandir = os.scandir
+
+        def counting_stat(path, *args, **kwargs):
+            calls.append(os.path.basename(path))
+            return original_stat(path, *args, **kwargs)
+
+        class CountingEntry(object):
+            def __init__(self, entry):
+                self.__entry = entry
+
+            def __getattr__(self, name):
+                return getattr(self.__entry, name)
+
+            def stat(self, *args, **kwargs):
+                calls.append(self.__entry.name)
+                return self.__entry.stat(*args, **kwargs)
+
+        class CountingScandir(object):
+            def __init__(self, path):
+                self.__scanner = original_scandir(path)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                self.__scanner.close()
+
+            def __iter__(self):
+                return (CountingEntry(entry) for entry in self.__scanner)
+
+        # iterator with stat filters, that stat files again in process_file()
+        class TestIterator(fileter.FilesIterator):
+            def process_file(self, path, dryrun):
+                return os.path.basename(path), self.stat(path).st_size, self.stat(path).st_mtime > 0
+
+        _test = TestIterator()
+        _test.add_folder("_temp_stat_once")
+        _test.add_filter(fileter.filters.FilterSize(50))
+        _test.add_filter(fileter.filters.FilterMTime(1000000000))
+
+        os.stat = counting_stat
+        os.scandir = CountingScandir
+        try:
+            ret = sorted(_test.get_all())
+        finally:
+            os.stat = original_stat
+            os.scandir = original_scandir
+            shutil.rmtree("_temp_stat_once")
+        self.assertListEqual(ret, [("b", 1000, True), ("c", 100, True)])
+        self.assertListEqual(sorted(calls), ["a", "b", "c"])
@@ -51,3 +51,43 @@ class TestIteratorAddHeader(unittest.TestCase):
         with open("_temp/test2", "r") as infile:
             result = infile.read()
         self.assertEqual(result, header + "second file\n")
+
+    def test_add_header_streaming(self):
+        """
+        Test adding header to big files, files with windows line breaks, and links.
+        """
+        header = "HEADER\n~~~~~~~\n"
+
+        # a big file with small copy chunks, and executable permissions
+        content = b"".join(b"line %d\r\n" % i for i in range(10000))
+        with open("_temp/big", "wb") as outf:
+            outf.write(content)
+        os.chmod("_temp/big", 0o751)
+
+        # a file that already got the header, with windows line breaks
+        with open("_temp/crlf", "wb") as outf:
+            outf.write(b"HEADER\r\n~~~~~~~\r\nsecond file\r\n")
+
+        # a link to a file without header
+        with open("_temp/target", "w") as outf:
+            outf.write("target file\n")
+        os.symlink("target", "_temp/link")
+
+        # create add-header iterator and execute
+        ah = fileter.iterators.AddHeader(header)
+        ah.ChunkSize = 100
+        ah.add_file(["_temp/big", "_temp/crlf", "_temp/link"])
+        ah.process_all()
+
+        # check results
+        with open("_temp/big", "rb") as infile:
+            self.assertEqual(infile.read(), header.encode() + content)
+        self.assertEqual(os.stat("_temp/big").st_mode & 0o777, 0o751)
+        with open("_temp/crlf", "rb") as infile:
+            self.assertEqual(infile.read(), b"HEADER\r\n~~~~~~~\r\nsecond file\r\n")
+        self.assertTrue(os.path.islink("_temp/link"))
+        with open("_temp/target", "r") as infile:
+            self.assertEqual(infile.read(), header + "target file\n")
+
+        # make sure no temporary files are left behind
+        self.assertListEqual(sorted(os.listdir("_temp")), ["big", "crlf", "link", "target"])
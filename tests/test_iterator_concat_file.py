@@ -41,3 +41,62 @@ class TestIteratorConcat(unittest.TestCase):
         with open("_temp/output", "r") as infile:
             result = infile.read()
         self.assertEqual(result, "first file\nsecond file\n")
+
+    def test_concat_with_buffer(self):
+        """
+        Test concat with and without kernel-side copy, with data bigger than the copy chunks.
+        """
+        # create testing files
+        data1 = os.urandom(10000)
+        data2 = os.urandom(777)
+        with open("_temp/test1", "wb") as outf:
+            outf.write(data1)
+        with open("_temp/test2", "wb") as outf:
+            outf.write(data2)
+
+        for kernel_copy in (True, False):
+
+            # create concat iterator with small chunks and execute
+            c = fileter.iterators.ConcatFiles("_temp/output")
+            c.KernelCopy = kernel_copy
+            c.ChunkSize = 128
+            c.add_file(["_temp/test1", "_temp/test2"])
+            c.process_all()
+
+            # check result
+            with open("_temp/output", "rb") as infile:
+                result = infile.read()
+            self.assertEqual(result, data1 + data2)
+
+    def test_concat_with_workers(self):
+        """
+        Test concat with a threads pool, so files are copied from several threads at once.
+        """
+        # create testing files, bigger than the copy chunks
+        lines = set()
+        for i in range(40):
+            line = ("file %d " % i) * 200 + "\n"
+            lines.add(line)
+            with open("_temp/test%d" % i, "w") as outf:
+                outf.write(line)
+
+        for kernel_copy in (True, False):
+
+            # create concat iterator with small chunks and execute, one file per chunk
+            c = fileter.iterators.ConcatFiles("_temp/output")
+            c.KernelCopy = kernel_copy
+            c.ChunkSize = 128
+            c.add_folder("_temp")
+            c.process_all(workers=8, executor="thread", chunk_size=1)
+
+            # check every file was copied whole
+            with open("_temp/output", "r") as infile:
+                result = infile.readlines()
+            self.assertEqual(len(result), 40)
+            self.assertSetEqual(set(result), lines)
+            os.remove("_temp/output")
+
+        # processes pool is not allowed, since processes can't share the output lock
+        c = fileter.iterators.ConcatFiles("_temp/output")
+        with self.assertRaises(ValueError):
+            c.process_all(workers=2)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test the actual file iterators.
+"""
+import fileter
+import unittest
+import shutil
+import os
+
+
+class TestIteratorFindDuplicates(unittest.TestCase):
+    """
+    Unittests to test the built-in find duplicates iterator.
+    """
+
+    def setUp(self):
+        if os.path.isdir("_temp"):
+            shutil.rmtree('_temp')
+        os.makedirs("_temp/sub")
+
+    def tearDown(self):
+        shutil.rmtree("_temp")
+
+    def __write(self, path, data):
+        with open(os.path.join("_temp", path), "wb") as outf:
+            outf.write(data)
+
+    def test_find_duplicates(self):
+        """
+        Test finding duplicate files by content.
+        """
+        big = os.urandom(50000)
+
+        # small files: same content, same size but different content, and unique size
+        self.__write("small1", b"hello world")
+        self.__write("sub/small2", b"hello world")
+        self.__write("small3", b"hello WORLD")
+        self.__write("unique", b"unique")
+
+        # big files: same content, and same first & last blocks but different content
+        self.__write("big1", big)
+        self.__write("sub/big2", big)
+        self.__write("big3", big[:20000] + b"x" + big[20001:])
+
+        # empty files are skipped, and hard links are not duplicates
+        self.__write("empty1", b"")
+        self.__write("empty2", b"")
+        os.link("_temp/small1", "_temp/sub/small_link")
+
+        it = fileter.iterators.FindDuplicates(workers=2)
+        it.add_folder("_temp")
+        it.enable_stats()
+        groups = list(it)
+        self.assertEqual(len(groups), 2)
+
+        # biggest files first
+        self.assertEqual(groups[0].size, 50000)
+        self.assertListEqual(sorted(path.replace("\\", "/") for path in groups[0].paths),
+                             ["_temp/big1", "_temp/sub/big2"])
+        self.assertEqual(groups[1].size, 11)
+        self.assertEqual(len(groups[1].paths), 2)
+        self.assertIn("_temp/sub/small2", [path.replace("\\", "/") for path in groups[1].paths])
+        self.assertNotEqual(groups[0].digest, groups[1].digest)
+
+        # big files were partially hashed, and only the big duplicates were fully read
+        bytes_read = it.get_stats().bytes_read
+        self.assertEqual(bytes_read, 3 * 2 * it.BlockSize + 3 * 50000 + 3 * 11)
+
+        # with min size, small files are ignored
+        it = fileter.iterators.FindDuplicates(min_size=100)
+        it.add_folder("_temp")
+        self.assertListEqual([group.size for group in it.get_all()], [50000])
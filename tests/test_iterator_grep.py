@@ -6,6 +6,7 @@ Test the actual file iterators.
 import fileter
 import unittest
 import os, shutil
+import re
 
 
 class TestIteratorGrep(unittest.TestCase):
@@ -37,3 +38,121 @@ class TestIteratorGrep(unittest.TestCase):
         g = fileter.iterators.Grep("line")
         g.add_file("_temp/test")
         self.assertListEqual(g.get_all()[0], ["first line\n", "second line\n", "another line\n"])
+
+    def test_grep_matches(self):
+        """
+        Test grepping with line numbers, max matches and small blocks.
+        """
+        # create a testing file
+        with open("_temp/test", "w") as outf:
+            for i in range(100):
+                outf.write("line %d\n" % i)
+            outf.write("last line without break")
+
+        # get all matches with line numbers. use tiny blocks to test blocks boundaries.
+        g = fileter.iterators.Grep("7")
+        g.BlockSize = 16
+        g.add_file("_temp/test")
+        matches = list(g.matches())
+        expected = [i for i in range(100) if "7" in str(i)]
+        self.assertListEqual([m.lineno for m in matches], [i + 1 for i in expected])
+        self.assertListEqual([m.line for m in matches], ["line %d\n" % i for i in expected])
+        self.assertEqual(matches[0].path, "_temp/test")
+
+        # last line without line break
+        g.set_grep("without")
+        self.assertListEqual(list(g.matches()), [("_temp/test", 101, "last line without break")])
+
+        # expression that can match across lines should only return lines that match by themselves
+        g.set_grep(r"0\s+line 1$")
+        self.assertListEqual(list(g.matches()), [])
+
+        # expression that depend on line boundaries
+        g.set_grep(r"\Aline 5")
+        self.assertListEqual([m.lineno for m in g.matches()], [6] + list(range(51, 61)))
+
+        # limit matches per file
+        g = fileter.iterators.Grep("line", max_matches=3)
+        g.add_file("_temp/test")
+        self.assertListEqual(g.get_all()[0], ["line 0\n", "line 1\n", "line 2\n"])
+
+        # empty file
+        open("_temp/empty", "w").close()
+        g = fileter.iterators.Grep("line")
+        g.add_file("_temp/empty")
+        self.assertListEqual(g.get_all(), [])
+
+    def test_grep_literals(self):
+        """
+        Test grepping literal strings and lists of literal strings.
+        """
+        # create a testing file
+        with open("_temp/test", "wb") as outf:
+            outf.write(u"def foo():\r\n    old_api(1)\n    new_api(2)\n    print('שלום')\n    older_api()\n".encode("utf-8"))
+
+        # single literal string
+        g = fileter.iterators.Grep("old_api")
+        g.add_file("_temp/test")
+        self.assertListEqual(list(g.matches()), [("_temp/test", 2, "    old_api(1)\n")])
+        for path, lineno, line in g.matches():
+            self.assertEqual(lineno, 2)
+        self.assertEqual(next(g.matches()).pattern, "old_api")
+
+        # non-ascii literal
+        g.set_grep(u"שלום")
+        self.assertListEqual([m.lineno for m in g.matches()], [4])
+
+        # non-ascii literals that can't be encoded with the files encoding
+        g_ascii = fileter.iterators.Grep(u"שלום", encoding="ascii")
+        g_ascii.add_file("_temp/test")
+        self.assertListEqual(list(g_ascii.matches()), [])
+        g_ascii.set_grep([u"שלום", "new_api"])
+        self.assertListEqual([m.lineno for m in g_ascii.matches()], [3])
+
+        # list of literals, report the first literal found in every line
+        g.set_grep(["old_api", "older_api", "new_api", "foo", "missing"])
+        self.assertListEqual([(m.lineno, m.pattern) for m in g.matches()],
+                             [(1, "foo"), (2, "old_api"), (3, "new_api"), (5, "older_api")])
+        self.assertEqual(g.get_all()[0][0], "def foo():\n")
+
+        # same with a non bytes-searchable encoding
+        g = fileter.iterators.Grep(["old_api", "older_api", "new_api", "foo", "missing"], encoding="latin-1")
+        g.add_file("_temp/test")
+        self.assertListEqual([(m.lineno, m.pattern) for m in g.matches()],
+                             [(1, "foo"), (2, "old_api"), (3, "new_api"), (5, "older_api")])
+
+        # empty list never match
+        g.set_grep([])
+        self.assertListEqual(list(g.matches()), [])
+
+    def test_grep_compiled_and_line_breaks(self):
+        """
+        Test grepping with a compiled regex, and files with "\r\n" and "\r" line breaks.
+        """
+        # create testing files
+        with open("_temp/unix", "wb") as outf:
+            outf.write(b"foo\nFoo bar\nfoo\nbaz\n")
+        with open("_temp/windows", "wb") as outf:
+            outf.write(b"foo\r\nFoo bar\r\nfoo\r\nbaz\r\n")
+        with open("_temp/mac", "wb") as outf:
+            outf.write(b"foo\rFoo bar\rfoo\rbaz\r")
+
+        # compiled regex keeps its flags
+        g = fileter.iterators.Grep(re.compile("^foo$", re.IGNORECASE))
+        g.add_file("_temp/unix")
+        self.assertListEqual([m.lineno for m in g.matches()], [1, 3])
+        g.set_grep(re.compile("foo", re.IGNORECASE))
+        self.assertListEqual([m.lineno for m in g.matches()], [1, 2, 3])
+        g.set_grep(re.compile(r"\Abaz"))
+        self.assertListEqual([m.lineno for m in g.matches()], [4])
+
+        # all line breaks give the same lines, with regex, literal and list of literals. use tiny blocks too.
+        for expression, expected in (("^foo$", [1, 3]), ("bar", [2]), (["baz", "bar"], [2, 4])):
+            for block_size in (fileter.iterators.Grep.BlockSize, 3):
+                for path in ("_temp/unix", "_temp/windows", "_temp/mac"):
+                    g = fileter.iterators.Grep(expression)
+                    g.BlockSize = block_size
+                    g.add_file(path)
+                    matches = list(g.matches())
+                    self.assertListEqual([m.lineno for m in matches], expected)
+                    self.assertTrue(all(m.line.endswith("\n") and "\r" not in m.line for m in matches))
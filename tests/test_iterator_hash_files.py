@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test the actual file iterators.
+"""
+import fileter
+import unittest
+import hashlib
+import shutil
+import time
+import os
+
+
+class TestIteratorHashFiles(unittest.TestCase):
+    """
+    Unittests to test the built-in hash files iterator and the hash cache.
+    """
+
+    def setUp(self):
+        if os.path.isdir("_temp"):
+            shutil.rmtree('_temp')
+        os.makedirs("_temp/files")
+
+    def tearDown(self):
+        shutil.rmtree("_temp")
+
+    def __write(self, path, data, age=60):
+        path = os.path.join("_temp/files", path)
+        with open(path, "wb") as outf:
+            outf.write(data)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    def __hash_all(self, **kwargs):
+        it = fileter.iterators.HashFiles("_temp/hashes.db", **kwargs)
+        it.add_folder("_temp/files")
+        ret = dict((path.replace("\\", "/"), digest) for path, digest in it)
+        return ret, it.cache
+
+    def test_hash_files(self):
+        """
+        Test hashing files with a persistent hash cache.
+        """
+        self.__write("a", b"first file")
+        self.__write("b", b"second file")
+        self.__write("c", b"third file")
+        expected = {"_temp/files/a": hashlib.sha256(b"first file").hexdigest(),
+                    "_temp/files/b": hashlib.sha256(b"second file").hexdigest(),
+                    "_temp/files/c": hashlib.sha256(b"third file").hexdigest()}
+
+        # first run hash all files
+        hashes, cache = self.__hash_all()
+        self.assertDictEqual(hashes, expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+
+        # second run take all from cache
+        hashes, cache = self.__hash_all()
+        self.assertDictEqual(hashes, expected)
+        self.assertEqual((cache.hits, cache.misses, cache.bytes_hashed), (3, 0, 0))
+
+        # changed file is hashed again, and recently modified file is hashed every time
+        self.__write("b", b"changed file")
+        self.__write("c", b"recent file", age=0)
+        expected["_temp/files/b"] = hashlib.sha256(b"changed file").hexdigest()
+        expected["_temp/files/c"] = hashlib.sha256(b"recent file").hexdigest()
+        hashes, cache = self.__hash_all()
+        self.assertDictEqual(hashes, expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        hashes, cache = self.__hash_all()
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        # other algorithms are cached separately
+        hashes, cache = self.__hash_all(algorithm="blake2b")
+        self.assertEqual(hashes["_temp/files/a"], hashlib.blake2b(b"first file").hexdigest())
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+        with self.assertRaises(ValueError):
+            fileter.HashCache(algorithm="no_such_algorithm")
+
+        # hash in parallel with threads, and refuse processes (the cache can't be shared with them)
+        it = fileter.iterators.HashFiles("_temp/hashes.db")
+        it.add_folder("_temp/files")
+        self.assertEqual(len(list(it.next(workers=2, executor="thread"))), 3)
+        self.assertEqual((it.cache.hits, it.cache.misses), (2, 1))
+        with self.assertRaises(ValueError):
+            it.next(workers=2)
+
+    def test_hash_cache_eviction(self):
+        """
+        Test that least recently used hashes are removed when cache is full.
+        """
+        for i in range(5):
+            self.__write("f%d" % i, b"file %d" % i)
+        paths = [os.path.join("_temp/files", "f%d" % i) for i in range(5)]
+
+        cache = fileter.HashCache("_temp/hashes.db", max_entries=3)
+        for path in paths:
+            cache.hash_file(path)
+        cache.commit()
+        self.assertEqual(len(cache), 3)
+
+        # use the oldest hash left, and add the evicted files back. the other two are now least recently used.
+        cache.hash_file(paths[2])
+        self.assertEqual(cache.hits, 1)
+        cache.commit()
+        cache.hash_file(paths[0])
+        cache.close()
+
+        cache = fileter.HashCache("_temp/hashes.db", max_entries=3)
+        for path in (paths[2], paths[0]):
+            cache.hash_file(path)
+        self.assertEqual(cache.hits, 2)
+        cache.close()
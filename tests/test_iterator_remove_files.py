@@ -44,3 +44,64 @@ class TestIteratorRemoveFiles(unittest.TestCase):
         # make sure files are removed
         self.assertFalse(os.path.isfile("_temp/test1"))
         self.assertFalse(os.path.isfile("_temp/test2"))
+
+    def test_bulk_remove(self):
+        """
+        Test removing files in batches with workers, and removing empty folders.
+        """
+        # create testing files in nested folders, and one folder with a file we keep
+        for folder in ("_temp/a", "_temp/a/b", "_temp/c"):
+            os.makedirs(folder)
+            for i in range(10):
+                with open(os.path.join(folder, "file%d.tmp" % i), "w") as outf:
+                    outf.write("data\n")
+        with open("_temp/c/keep.txt", "w") as outf:
+            outf.write("keep me\n")
+
+        # remove with small batches, so every folder is split into several batches
+        rf = fileter.iterators.RemoveFiles(force=True, workers=4, remove_empty_folders=True)
+        rf.BatchSize = 3
+        rf.add_folder("_temp")
+        rf.add_filter_by_extension("tmp")
+        removed = list(rf.next())
+
+        # check results and report
+        self.assertEqual(len(removed), 30)
+        self.assertEqual(rf.report.removed, 30)
+        self.assertEqual(rf.report.failed, [])
+        self.assertEqual(rf.report.removed_folders, 2)
+        self.assertFalse(os.path.exists("_temp/a"))
+        self.assertEqual(os.listdir("_temp/c"), ["keep.txt"])
+
+        # workers without force is not allowed
+        self.assertRaises(ValueError, fileter.iterators.RemoveFiles, False, 4)
+
+    def test_remove_empty_parents(self):
+        """
+        Test removing folders that became empty, up to the source root.
+        """
+        os.makedirs("_temp/root/x/y")
+        os.makedirs("_temp/root/z")
+        for path in ("_temp/root/x/y/f", "_temp/root/z/f", "_temp/root/f"):
+            with open(path, "w") as outf:
+                outf.write("data\n")
+
+        # remove all files, processing them with a threads pool
+        rf = fileter.iterators.RemoveFiles(force=True, remove_empty_folders=True)
+        rf.add_folder("_temp/root")
+        self.assertEqual(len(list(rf.next(workers=2, executor="thread"))), 3)
+        self.assertEqual(rf.report.removed, 3)
+        self.assertEqual(rf.report.removed_folders, 3)
+
+        # all folders are removed, but not the root
+        self.assertEqual(os.listdir("_temp/root"), [])
+
+        # processes pool is not allowed, since removed files can't be counted
+        self.assertRaises(ValueError, rf.next, workers=2)
+
+        # process_file() can be called directly
+        with open("_temp/root/f", "w") as outf:
+            outf.write("data\n")
+        rf = fileter.iterators.RemoveFiles(force=True)
+        self.assertEqual(rf.process_file("_temp/root/f", False), "_temp/root/f")
+        self.assertFalse(os.path.exists("_temp/root/f"))
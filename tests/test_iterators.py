@@ -5,6 +5,11 @@ Test the actual file iterators.
 """
 import fileter
 import unittest
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
 
 
 class TestIterators(unittest.TestCase):
@@ -129,6 +134,30 @@ class TestIterators(unittest.TestCase):
                                      'test_dir/depth1/depth2/depth3/3',
                                      'test_dir/foo/bar.txt'])
 
+    def test_sorted_iteration(self):
+        """
+        Test iterating folders in sorted order.
+        """
+        # iterate files and folders in sorted order
+        _test = fileter.FilesIterator()
+        _test.add_folder("test_dir", 1, source_type=_test.SourceTypes.FilesAndFolders, sort=True)
+        _test.add_pattern("*.txt", "test_dir", sort=True)
+        self.__test_iterator(_test, ['test_dir', 'test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt',
+                                     'test_dir/depth1', 'test_dir/depth1/1_a', 'test_dir/depth1/1_b.exe',
+                                     'test_dir/foo', 'test_dir/foo/bar.txt',
+                                     'test_dir/0_c.txt', 'test_dir/depth1/depth2/bar.txt', 'test_dir/foo/bar.txt'])
+
+        # sort all folder sources by default
+        _test = fileter.FilesIterator()
+        _test.SortFolders = True
+        _test.add_filtered_folder("test_dir", ".*depth1.*")
+        _test.add_folder("test_dir/depth1", 0, sort=False)
+        self.assertListEqual(self.__fix_sep(_test.get_all())[:5],
+                             ['test_dir/depth1/1_a', 'test_dir/depth1/1_b.exe', 'test_dir/depth1/depth2/2_a',
+                              'test_dir/depth1/depth2/bar.txt', 'test_dir/depth1/depth2/depth3/3'])
+        self.assertListEqual(sorted(self.__fix_sep(_test.get_all())[5:]),
+                             ['test_dir/depth1/1_a', 'test_dir/depth1/1_b.exe'])
+
     def test_basic_iterator_add_filtered_folders(self):
         """
         Test a basic iterator with filtered folders
@@ -204,3 +233,362 @@ class TestIterators(unittest.TestCase):
         _test.add_filter_by_regex(".*\.txt")
         self.__test_iterator(_test, ['test_dir/0_c.txt', 'test_dir/depth1/depth2/bar.txt',
                                      'test_dir/foo/bar.txt'])
+
+    def test_parallel_process_all(self):
+        """
+        Test processing files with a pool of workers.
+        """
+        class TestIterator(fileter.FilesIterator):
+
+            def __init__(self):
+                super(TestIterator, self).__init__()
+                self.events = []
+
+            def process_file(self, path, dryrun):
+                return path.upper()
+
+            def on_start_source(self, source, dryrun):
+                self.events.append("start_source")
+
+            def on_end_source(self, source, dryrun):
+                self.events.append("end_source")
+
+            def on_enter_dir(self, directory, dryrun):
+                self.events.append(directory.replace("\\", "/"))
+
+        files = ["f%d" % i for i in range(100)]
+
+        # ordered threads pool should return results in the same order as files
+        _test = TestIterator()
+        _test.add_file(files)
+        _test.add_folder("test_dir", 0)
+        ret = list(_test.next(workers=4, executor="thread", chunk_size=7))
+        self.assertListEqual(ret[:100], [f.upper() for f in files])
+        self.assertListEqual(sorted(self.__fix_sep(ret[100:])), ['TEST_DIR/0_A', 'TEST_DIR/0_B', 'TEST_DIR/0_C.TXT'])
+        self.assertListEqual(_test.events, ["start_source", "end_source", "start_source", "test_dir", "end_source"])
+
+        # unordered threads pool should return the same results, in any order
+        _test = TestIterator()
+        _test.add_file(files)
+        ret = list(_test.next(workers=4, executor="thread", ordered=False, chunk_size=3))
+        self.assertListEqual(sorted(ret), sorted(f.upper() for f in files))
+
+        # processes pool, with a built-in iterator
+        _test = fileter.FilesIterator()
+        _test.add_folder("test_dir")
+        _test.add_filter_by_extension("txt")
+        ret = list(_test.next(workers=2, executor="process", chunk_size=1))
+        self.assertListEqual(sorted(self.__fix_sep(ret)), ['test_dir/0_c.txt', 'test_dir/depth1/depth2/bar.txt',
+                                                          'test_dir/foo/bar.txt'])
+
+        # unknown executor type, raised before iteration starts
+        with self.assertRaises(ValueError):
+            _test.next(workers=2, executor="bla")
+
+        # iterators that can't process files with workers, or in a processes pool
+        class NoProcessPoolIterator(fileter.FilesIterator):
+            AllowProcessPool = False
+        _test = NoProcessPoolIterator()
+        _test.add_folder("test_dir")
+        with self.assertRaises(ValueError):
+            _test.next(workers=2)
+        self.assertEqual(len(list(_test.next(workers=2, executor="thread"))), 9)
+        self.assertEqual(len(list(_test.next(dryrun=True, workers=2))), 9)
+        _test = fileter.iterators.PrintFiles()
+        with self.assertRaises(ValueError):
+            _test.next(workers=2, executor="thread")
+
+        # start hook failure shuts the pool down and clears the sources prune rule
+        class FailingIterator(fileter.FilesIterator):
+            def on_start(self, dryrun):
+                raise RuntimeError("failed to start")
+        source = fileter.sources.FolderSource("test_dir")
+        _test = FailingIterator()
+        _test.add_source(source)
+        _test.add_filter_by_pattern("*/depth1/*", fileter.FilesIterator.FilterType.Exclude)
+        with self.assertRaises(RuntimeError):
+            _test.process_all(workers=2, executor="thread")
+        self.assertEqual(len(source.get_all()), 9)
+
+    def test_async_iterator(self):
+        """
+        Test the asyncio files iterator, with both blocking and async process_file().
+        """
+        class TestIterator(fileter.AsyncFilesIterator):
+
+            def __init__(self):
+                super(TestIterator, self).__init__()
+                self.events = []
+
+            def process_file(self, path, dryrun):
+                return path.upper()
+
+            def on_start_source(self, source, dryrun):
+                self.events.append("start_source")
+
+            def on_end_source(self, source, dryrun):
+                self.events.append("end_source")
+
+            def on_enter_dir(self, directory, dryrun):
+                self.events.append(directory.replace("\\", "/"))
+
+        class AsyncTestIterator(fileter.AsyncFilesIterator):
+
+            async def process_file(self, path, dryrun):
+                data = await self.run_in_thread(os.path.getsize, path)
+                return path if data else None
+
+        files = ["f%d" % i for i in range(100)]
+
+        async def run():
+
+            # blocking process_file, with hooks
+            _test = TestIterator()
+            _test.add_file(files)
+            _test.add_folder("test_dir", 0)
+            ret = [x async for x in _test]
+            self.assertListEqual(sorted(ret[:100]), sorted(f.upper() for f in files))
+            self.assertListEqual(sorted(self.__fix_sep(ret[100:])),
+                                 ['TEST_DIR/0_A', 'TEST_DIR/0_B', 'TEST_DIR/0_C.TXT'])
+            self.assertListEqual(_test.events,
+                                 ["start_source", "end_source", "start_source", "test_dir", "end_source"])
+
+            # async process_file with filters and limited concurrency
+            _test = AsyncTestIterator()
+            _test.add_folder("test_dir")
+            _test.add_filter_by_extension("txt")
+            ret = [x async for x in _test.anext(concurrency=2)]
+            self.assertListEqual(sorted(self.__fix_sep(ret)), sorted(self.__fix_sep(
+                [path for path in fileter.FilesIterator().add_folder("test_dir").add_filter_by_extension("txt")
+                 if os.path.getsize(path)])))
+
+            # get all as list
+            self.assertListEqual(sorted(await _test.get_all()), sorted(ret))
+
+            # stats are ended when iteration is done
+            _test.enable_stats()
+            await _test.get_all()
+            self.assertTrue(_test.get_stats().ended)
+
+        asyncio.run(run())
+
+    def test_prune_excluded_folders(self):
+        """
+        Test that folders excluded by Exclude filters are not listed at all.
+        """
+        # record listed folders
+        listed = []
+        original_scan = fileter.sources.FolderWalker.scan_folder
+
+        def scan_folder(walker, folder):
+            listed.append(folder.replace("\\", "/"))
+            return original_scan(walker, folder)
+
+        def get_files(*filters):
+            del listed[:]
+            _test = fileter.FilesIterator()
+            _test.add_folder("test_dir")
+            for filt, filter_type in filters:
+                _test.add_filter(filt, filter_type)
+            return sorted(self.__fix_sep(_test.get_all()))
+
+        exclude = fileter.FilesIterator.FilterType.Exclude
+        include = fileter.FilesIterator.FilterType.Include
+        fileter.sources.FolderWalker.scan_folder = scan_folder
+        try:
+            # exclude by pattern
+            self.assertListEqual(get_files((fileter.filters.FilterPattern("*/depth2/*"), exclude)),
+                                 ['test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt', 'test_dir/depth1/1_a',
+                                  'test_dir/depth1/1_b.exe', 'test_dir/foo/bar.txt'])
+            self.assertNotIn("test_dir/depth1/depth2", listed)
+
+            # exclude by regex
+            self.assertListEqual(get_files((fileter.filters.FilterRegex(".*depth1"), exclude)),
+                                 ['test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt', 'test_dir/foo/bar.txt'])
+            self.assertListEqual(sorted(listed), ["test_dir", "test_dir/foo"])
+
+            # regex that look at the end of path can't prune folders
+            self.assertListEqual(get_files((fileter.filters.FilterRegex(".*depth1.*a$"), exclude)),
+                                 ['test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt', 'test_dir/depth1/1_b.exe',
+                                  'test_dir/depth1/depth2/bar.txt', 'test_dir/depth1/depth2/depth3/3',
+                                  'test_dir/foo/bar.txt'])
+            self.assertIn("test_dir/depth1", listed)
+
+            # an Include filter before the Exclude filter might include files, so we can't prune
+            self.assertListEqual(get_files((fileter.filters.FilterExtension("txt"), include),
+                                           (fileter.filters.FilterPattern("*/depth2/*"), exclude)),
+                                 ['test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt', 'test_dir/depth1/1_a',
+                                  'test_dir/depth1/1_b.exe', 'test_dir/depth1/depth2/bar.txt', 'test_dir/foo/bar.txt'])
+            self.assertIn("test_dir/depth1/depth2", listed)
+
+        finally:
+            fileter.sources.FolderWalker.scan_folder = original_scan
+
+    def test_sources_reset_after_iteration(self):
+        """
+        Test that the prune rule and stat cache pushed to sources are cleared when iteration ends.
+        """
+        source = fileter.sources.FolderSource("test_dir")
+        all_files = sorted(self.__fix_sep(source.get_all()))
+
+        # iterate with a filter that prune folders, then use source standalone
+        _test = fileter.FilesIterator()
+        _test.add_source(source)
+        _test.add_filter(fileter.filters.FilterPattern("*/depth1/*"), fileter.FilesIterator.FilterType.Exclude)
+        self.assertListEqual(sorted(self.__fix_sep(_test.get_all())),
+                             ['test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt', 'test_dir/foo/bar.txt'])
+        self.assertListEqual(sorted(self.__fix_sep(source.get_all())), all_files)
+
+        # same, when iteration is stopped before its done
+        files = _test.next()
+        next(files)
+        files.close()
+        self.assertListEqual(sorted(self.__fix_sep(source.get_all())), all_files)
+
+        # same, with a workers pool
+        self.assertEqual(len(list(_test.next(workers=2, executor="thread"))), 4)
+        self.assertListEqual(sorted(self.__fix_sep(source.get_all())), all_files)
+
+    def test_merge_sources(self):
+        """
+        Test iterating overlapping sources, returning every file only once.
+        """
+        # create a folder with a file, a hard link to it, and a symbolic link to a file in test_dir
+        os.makedirs("_temp_merge")
+        try:
+            with open("_temp_merge/a", "w") as outfile:
+                outfile.write("a")
+            os.link("_temp_merge/a", "_temp_merge/b")
+            os.symlink(os.path.abspath("test_dir/0_a"), "_temp_merge/c")
+
+            _test = fileter.FilesIterator()
+            _test.MergeSources = True
+            _test.add_folder("test_dir")
+            _test.add_pattern("*.txt", "test_dir/depth1")
+            _test.add_file("test_dir/0_a")
+
+            # note: "a" and "b" are the same file, so only the first one listed is returned (sort to make it "a")
+            _test.add_folder("_temp_merge", sort=True)
+            for workers in (None, 2):
+                self.assertListEqual(sorted(self.__fix_sep(_test.next(workers=workers, executor="thread"))),
+                                     ['_temp_merge/a', 'test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt',
+                                      'test_dir/depth1/1_a', 'test_dir/depth1/1_b.exe', 'test_dir/depth1/depth2/2_a',
+                                      'test_dir/depth1/depth2/bar.txt', 'test_dir/depth1/depth2/depth3/3',
+                                      'test_dir/foo/bar.txt'])
+
+            # sources that return files again on purpose (like WatchSource when files change) are never skipped
+            class RepeatingSource(fileter.sources.FileSource):
+                RepeatFiles = True
+            _test = fileter.FilesIterator()
+            _test.MergeSources = True
+            _test.add_folder("test_dir", 0)
+            _test.add_source(RepeatingSource(["test_dir/0_a", "test_dir/0_a"]))
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())),
+                                 ['test_dir/0_a', 'test_dir/0_a', 'test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt'])
+
+            # without merging, files are returned by every source
+            _test = fileter.FilesIterator()
+            _test.add_folder("test_dir")
+            _test.add_file("test_dir/0_a")
+            self.assertEqual(len(_test.get_all()), 10)
+        finally:
+            shutil.rmtree("_temp_merge")
+
+        # check the inodes set
+        inodes = fileter.inode_set.InodeSet()
+        self.assertTrue(all(inodes.add(ino % 3, ino) for ino in range(5000)))
+        self.assertFalse(any(inodes.add(ino % 3, ino) for ino in range(5000)))
+        self.assertEqual(len(inodes), 5000)
+        self.assertIn((1, 4999), inodes)
+        self.assertNotIn((0, 4999), inodes)
+
+    def test_iteration_stats(self):
+        """
+        Test collecting profiling stats while iterating.
+        """
+        # stats are disabled by default
+        _test = fileter.FilesIterator()
+        _test.add_folder("test_dir")
+        self.assertEqual(len(_test.get_all()), 9)
+        self.assertIsNone(_test.get_stats())
+
+        # enable stats, with filters
+        reports = []
+        _test.enable_stats(callback=reports.append, interval=0)
+        _test.add_filter_by_extension("txt")
+        _test.add_filter_by_pattern("*/foo/*", fileter.FilesIterator.FilterType.Exclude)
+        self.assertListEqual(sorted(self.__fix_sep(_test.get_all())),
+                             ['test_dir/0_c.txt', 'test_dir/depth1/depth2/bar.txt'])
+        stats = _test.get_stats()
+        self.assertTrue(stats.ended)
+        self.assertIs(reports[-1], stats)
+        self.assertEqual(stats.files, 2)
+        self.assertEqual(stats.process_time.count, 2)
+        self.assertEqual(sum(count for _, count in stats.process_time.buckets()), 2)
+        self.assertLessEqual(stats.process_time.percentile(50), stats.process_time.max)
+        self.assertEqual(len(stats.sources), 1)
+        self.assertEqual(stats.sources[0].paths, 8)
+
+        # check filters stats. excluded folder is still pruned (not listed), and extension filter is evaluated first
+        extension_stats, pattern_stats = stats.filters
+        self.assertEqual((extension_stats.evaluations, extension_stats.hits), (8, 2))
+        self.assertEqual((pattern_stats.evaluations, pattern_stats.hits), (2, 0))
+        self.assertEqual(pattern_stats.hit_rate, 0.0)
+        self.assertEqual(stats.as_dict()["filters"][0]["hits"], 2)
+
+        # parallel processing and bytes read / written
+        _test = fileter.iterators.ConcatFiles("_temp_stats_concat")
+        _test.add_folder("test_dir")
+        _test.add_filter_by_extension("txt")
+        _test.enable_stats()
+        try:
+            _test.process_all(workers=2, executor="thread", chunk_size=1)
+            stats = _test.get_stats()
+            self.assertEqual(stats.files, 3)
+            self.assertEqual(stats.bytes_read, os.path.getsize("_temp_stats_concat"))
+            self.assertEqual(stats.bytes_written, os.path.getsize("_temp_stats_concat"))
+        finally:
+            os.remove("_temp_stats_concat")
+
+        # bytes counted in worker processes
+        os.makedirs("_temp_stats_headers")
+        try:
+            for name in ("a", "b", "c"):
+                with open(os.path.join("_temp_stats_headers", name), "w") as f:
+                    f.write("content")
+            _test = fileter.iterators.AddHeader("header\n")
+            _test.add_folder("_temp_stats_headers")
+            _test.enable_stats()
+            _test.process_all(workers=2, chunk_size=1)
+            stats = _test.get_stats()
+            self.assertEqual(stats.files, 3)
+            self.assertEqual(stats.bytes_read, 3 * len("content"))
+            self.assertEqual(stats.bytes_written, 3 * len("header\ncontent"))
+        finally:
+            shutil.rmtree("_temp_stats_headers")
+
+        # disable stats
+        _test.disable_stats()
+        list(_test.next(dryrun=True))
+        self.assertIsNone(_test.get_stats())
+
+    def test_lazy_imports(self):
+        """
+        Test that classes are imported on first access, and that all names can still be imported.
+        """
+        code = ("import fileter, sys; "
+                "assert 'fileter.files_iterator' not in sys.modules and 're' not in sys.modules; "
+                "from fileter.sources import *; "
+                "assert 'fileter.sources.watch_source' in sys.modules; "
+                "assert 'fileter.filters.regex_filter' not in sys.modules")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(fileter.__file__)))
+        subprocess.check_call([sys.executable, "-c", code], env=dict(os.environ, PYTHONPATH=root))
+
+        # all names are listed, and unknown names raise AttributeError
+        for package in (fileter, fileter.sources, fileter.filters, fileter.iterators):
+            for name in package.__all__:
+                self.assertIn(name, dir(package))
+                self.assertIsNotNone(getattr(package, name))
+        self.assertIs(fileter.sources.FolderSource, fileter.sources.folder_source.FolderSource)
+        with self.assertRaises(AttributeError):
+            fileter.sources.NoSuchSource
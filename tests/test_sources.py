@@ -5,6 +5,10 @@ Tests for the file filters.
 """
 import fileter
 import unittest
+import shutil
+import os
+import threading
+import time
 
 
 class TestSources(unittest.TestCase):
@@ -46,7 +50,6 @@ class TestSources(unittest.TestCase):
             def __next__(self):
                 yield "1"
                 yield "2"
-                raise StopIteration
         _test = TestSource()
 
         # test getting all files in source as list
@@ -146,3 +149,451 @@ class TestSources(unittest.TestCase):
         # filter exe file in 1 level deep
         _test = fileter.sources.PatternSource("*.exe", "test_dir", 1)
         self.__test_source(_test, ['test_dir/depth1/1_b.exe'])
+
+        # empty list of patterns
+        _test = fileter.sources.PatternSource([], "test_dir")
+        self.__test_source(_test, [])
+
+    def test_folder_walker_pruning(self):
+        """
+        Test that the folder walker never list folders that are too deep or rejected by the folder filter.
+        """
+        scanned = []
+
+        class RecordingWalker(fileter.sources.FolderWalker):
+            def scan_folder(self, folder):
+                scanned.append(folder.replace("\\", "/"))
+                return super(RecordingWalker, self).scan_folder(folder)
+
+        # with depth limit 0 only the root folder should be listed
+        walker = RecordingWalker("test_dir", 0)
+        self.assertListEqual(sorted(self.__fix_sep(list(walker))), ['test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt'])
+        self.assertListEqual(scanned, ['test_dir'])
+
+        # rejected folders should not be listed at all
+        del scanned[:]
+        walker = RecordingWalker("test_dir", filter_folder=lambda path: not path.endswith("depth2"))
+        self.assertListEqual(sorted(self.__fix_sep(list(walker))), ['test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt',
+                                                                    'test_dir/depth1/1_a', 'test_dir/depth1/1_b.exe',
+                                                                    'test_dir/foo/bar.txt'])
+        self.assertListEqual(sorted(scanned), ['test_dir', 'test_dir/depth1', 'test_dir/foo'])
+
+    def test_threaded_folder_source(self):
+        """
+        Test folder sources that list folders in parallel.
+        """
+        expected = ['test_dir/0_a', 'test_dir/0_b', 'test_dir/0_c.txt',
+                    'test_dir/depth1/1_a', 'test_dir/depth1/1_b.exe',
+                    'test_dir/depth1/depth2/2_a', 'test_dir/depth1/depth2/bar.txt',
+                    'test_dir/depth1/depth2/depth3/3',
+                    'test_dir/foo/bar.txt']
+
+        # ordered parallel scan should return the same order as a serial scan
+        _test = fileter.sources.FolderSource("test_dir", threads=4)
+        self.assertListEqual(_test.get_all(), fileter.sources.FolderSource("test_dir").get_all())
+        self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), expected)
+
+        # unordered parallel scan should return the same paths, in any order
+        _test = fileter.sources.FolderSource("test_dir", threads=4, ordered=False)
+        self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), expected)
+
+        # pattern source with depth limit
+        _test = fileter.sources.PatternSource("*.txt", "test_dir", 1, threads=4, ordered=False)
+        self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), ['test_dir/0_c.txt', 'test_dir/foo/bar.txt'])
+
+    def test_threaded_list_ahead(self):
+        """
+        Test that folder sources listing folders in parallel only list a few folders ahead.
+        """
+        # create a wide tree
+        if os.path.isdir("_temp_list_ahead"):
+            shutil.rmtree("_temp_list_ahead")
+        for i in range(10):
+            for j in range(3):
+                os.makedirs("_temp_list_ahead/%d/%d" % (i, j))
+                with open("_temp_list_ahead/%d/%d/file" % (i, j), "w") as outf:
+                    outf.write("test")
+        with open("_temp_list_ahead/file", "w") as outf:
+            outf.write("test")
+
+        # record listed folders
+        listed = []
+        original_scan = fileter.sources.FolderWalker.scan_folder
+
+        def scan_folder(walker, folder):
+            listed.append(folder)
+            return original_scan(walker, folder)
+
+        original_list_ahead = fileter.sources.FolderWalker.ListAhead
+        fileter.sources.FolderWalker.scan_folder = scan_folder
+        fileter.sources.FolderWalker.ListAhead = 1
+        try:
+            expected = fileter.sources.FolderSource("_temp_list_ahead").get_all()
+            self.assertEqual(len(expected), 31)
+            for ordered in (True, False):
+
+                # while the first file is not consumed, only root and up to 2 folders are listed
+                del listed[:]
+                paths = iter(fileter.sources.FolderSource("_temp_list_ahead", threads=2, ordered=ordered))
+                self.assertEqual(self.__fix_sep([next(paths)]), ["_temp_list_ahead/file"])
+                time.sleep(0.2)
+                self.assertLessEqual(len(listed), 3)
+
+                # walk the rest
+                ret = ["_temp_list_ahead/file"] + list(paths)
+                self.assertListEqual(ret if ordered else sorted(ret), expected if ordered else sorted(expected))
+                self.assertEqual(len(listed), 41)
+
+        finally:
+            fileter.sources.FolderWalker.scan_folder = original_scan
+            fileter.sources.FolderWalker.ListAhead = original_list_ahead
+            shutil.rmtree("_temp_list_ahead")
+
+    def test_merged_folder_source(self):
+        """
+        Test merging folder sources with nested roots into a single walk.
+        """
+        scanned = []
+        original_scan = fileter.sources.FolderWalker.scan_folder
+
+        def scan_folder(walker, folder):
+            scanned.append(folder.replace("\\", "/"))
+            return original_scan(walker, folder)
+
+        def union(sources):
+            ret = {}
+            for source in sources:
+                for path in source.get_all():
+                    ret.setdefault(os.path.abspath(path), path)
+            return sorted(self.__fix_sep(ret.values()))
+
+        # sources with nested roots, depth limits and patterns
+        sources = [fileter.sources.FolderSource("test_dir/depth1/depth2", ret_folders=True),
+                   fileter.sources.FolderSource("test_dir", depth_limit=1),
+                   fileter.sources.PatternSource("*.txt", "test_dir/depth1"),
+                   fileter.sources.FolderSource(os.path.abspath("test_dir/foo"))]
+        expected = union(sources)
+
+        # all sources should be merged into one, walking every folder once
+        plan = fileter.sources.MergedFolderSource.plan(sources)
+        self.assertEqual(len(plan), 1)
+        self.assertListEqual(plan[0][1], sources)
+        fileter.sources.FolderWalker.scan_folder = scan_folder
+        try:
+            self.assertListEqual(sorted(self.__fix_sep(plan[0][0].get_all())), expected)
+        finally:
+            fileter.sources.FolderWalker.scan_folder = original_scan
+        self.assertListEqual(sorted(scanned), ['test_dir', 'test_dir/depth1', 'test_dir/depth1/depth2',
+                                               'test_dir/depth1/depth2/depth3', 'test_dir/foo'])
+
+        # paths are returned only once, in the form of the first source that return them
+        self.assertIn(os.path.join("test_dir", "foo", "bar.txt"), plan[0][0].get_all())
+        self.assertNotIn(os.path.join(os.path.abspath("test_dir/foo"), "bar.txt"), plan[0][0].get_all())
+
+        # sources with unrelated roots, or that can't be merged, are kept as-is
+        file_source = fileter.sources.FileSource(["test_dir/0_a"])
+        plan = fileter.sources.MergedFolderSource.plan([sources[0], file_source, sources[3]])
+        self.assertListEqual([covered for _, covered in plan], [[sources[0]], [file_source], [sources[3]]])
+        self.assertIs(plan[0][0], sources[0])
+
+    def test_follow_symlinks(self):
+        """
+        Test scanning folders while following links, with loops.
+        """
+        # create a tree with a link back to its root (loop), and a link to a folder outside of it
+        if os.path.isdir("_temp"):
+            shutil.rmtree("_temp")
+        for folder in ("_temp/tree/a", "_temp/other"):
+            os.makedirs(folder)
+        for path in ("_temp/tree/1.txt", "_temp/tree/a/2.txt", "_temp/other/3.txt"):
+            with open(path, "w") as outf:
+                outf.write("test")
+        os.symlink(os.path.abspath("_temp/tree"), "_temp/tree/a/loop")
+        os.symlink(os.path.abspath("_temp/other"), "_temp/tree/other")
+        try:
+            # by default links to folders are not followed
+            self.assertListEqual(sorted(self.__fix_sep(fileter.sources.FolderSource("_temp/tree").get_all())),
+                                 ['_temp/tree/1.txt', '_temp/tree/a/2.txt'])
+
+            # when following links, every folder should be scanned once
+            expected = ['_temp/tree/1.txt', '_temp/tree/a/2.txt', '_temp/tree/other/3.txt']
+            for threads, ordered, bloom_capacity in ((None, True, None), (4, True, None), (4, False, None),
+                                                     (None, True, 1000)):
+                _test = fileter.sources.FolderSource("_temp/tree", threads=threads, ordered=ordered,
+                                                     follow_symlinks=True, bloom_capacity=bloom_capacity)
+                self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), expected)
+
+            # pattern source, and following links can't be merged
+            _test = fileter.sources.PatternSource("*.txt", "_temp/tree", follow_symlinks=True)
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), expected)
+            self.assertIsNone(_test.get_walk_plan())
+
+        finally:
+            shutil.rmtree("_temp")
+
+        # check the bloom filter
+        bloom = fileter.inode_set.InodeBloomFilter(1000)
+        self.assertTrue(bloom.add(1, 1))
+        self.assertFalse(bloom.add(1, 1))
+        self.assertIn((1, 1), bloom)
+        self.assertEqual(sum(bloom.add(2, ino) for ino in range(1000)), len(bloom) - 1)
+        self.assertLess(sum((3, ino) in bloom for ino in range(1000)), 50)
+
+    def test_sorted_folder_source(self):
+        """
+        Test scanning folders in sorted order.
+        """
+        # create files and folders in non-sorted order
+        if os.path.isdir("_temp"):
+            shutil.rmtree("_temp")
+        for folder in ("_temp/tree/c", "_temp/tree/a"):
+            os.makedirs(folder)
+        for path in ("_temp/tree/c/y", "_temp/tree/b.txt", "_temp/tree/a/z", "_temp/tree/a.txt", "_temp/tree/a.b"):
+            with open(path, "w") as outf:
+                outf.write("test")
+        try:
+            # files and folders should be sorted together, with folders sorted as if they end with '/'
+            expected = ['_temp/tree/a.b', '_temp/tree/a.txt', '_temp/tree/a/z', '_temp/tree/b.txt', '_temp/tree/c/y']
+            for threads in (None, 4):
+                _test = fileter.sources.FolderSource("_temp/tree", threads=threads, sort=True)
+                self.assertListEqual(self.__fix_sep(_test.get_all()), expected)
+
+            # with folders and depth limit
+            _test = fileter.sources.FolderSource("_temp/tree", 0, ret_folders=True, sort=True)
+            self.assertListEqual(self.__fix_sep(_test.get_all()),
+                                 ['_temp/tree', '_temp/tree/a.b', '_temp/tree/a.txt', '_temp/tree/b.txt'])
+            _test = fileter.sources.FolderSource("_temp/tree", ret_files=False, ret_folders=True, sort=True)
+            self.assertListEqual(self.__fix_sep(_test.get_all()), ['_temp/tree', '_temp/tree/a', '_temp/tree/c'])
+
+            # pattern source
+            _test = fileter.sources.PatternSource("*/a*", "_temp/tree", sort=True)
+            self.assertListEqual(self.__fix_sep(_test.get_all()), expected[:3])
+
+        finally:
+            shutil.rmtree("_temp")
+
+    def test_indexed_folder_source(self):
+        """
+        Test folder source with an on-disk index of folders listings.
+        """
+        # create a testing tree, with mtimes old enough to be trusted by the index
+        if os.path.isdir("_temp"):
+            shutil.rmtree("_temp")
+        for folder in ("_temp/tree/a", "_temp/tree/b/c"):
+            os.makedirs(folder)
+        for path in ("_temp/tree/1.txt", "_temp/tree/a/2.txt", "_temp/tree/b/c/3.txt"):
+            with open(path, "w") as outf:
+                outf.write("data")
+        for folder in ("_temp/tree", "_temp/tree/a", "_temp/tree/b", "_temp/tree/b/c"):
+            os.utime(folder, (1000000000, 1000000000))
+
+        try:
+            expected = fileter.sources.FolderSource("_temp/tree").get_all()
+
+            # first scan list all folders, and second scan take all of them from index
+            _test = fileter.sources.IndexedFolderSource("_temp/tree", "_temp/index.db")
+            self.assertListEqual(sorted(_test.get_all()), sorted(expected))
+            self.assertEqual((_test.index_hits, _test.index_misses), (0, 4))
+            self.assertListEqual(sorted(_test.get_all()), sorted(expected))
+            self.assertEqual((_test.index_hits, _test.index_misses), (4, 0))
+
+            # remove a sub tree and add a file, only changed folders should be listed again
+            shutil.rmtree("_temp/tree/b")
+            with open("_temp/tree/a/4.txt", "w") as outf:
+                outf.write("data")
+            _test = fileter.sources.IndexedFolderSource("_temp/tree", "_temp/index.db", threads=2)
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())),
+                                 ["_temp/tree/1.txt", "_temp/tree/a/2.txt", "_temp/tree/a/4.txt"])
+            self.assertEqual((_test.index_hits, _test.index_misses), (0, 2))
+
+        finally:
+            shutil.rmtree("_temp")
+
+    def test_delta_source(self):
+        """
+        Test source that return only files that changed since last run.
+        """
+        # create a testing tree
+        if os.path.isdir("_temp"):
+            shutil.rmtree("_temp")
+        os.makedirs("_temp/tree")
+        for name in ("a.txt", "b.txt", "c.txt"):
+            with open("_temp/tree/" + name, "w") as outf:
+                outf.write(name)
+
+        # source that collect deleted files
+        deleted = []
+
+        class TestDeltaSource(fileter.sources.DeltaSource):
+            def on_file_deleted(self, path):
+                deleted.append(path)
+
+        try:
+            # first run return all files, second run return nothing
+            _test = TestDeltaSource(fileter.sources.FolderSource("_temp/tree"), "_temp/checkpoint.db", use_hash=True)
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())),
+                                 ["_temp/tree/a.txt", "_temp/tree/b.txt", "_temp/tree/c.txt"])
+            self.assertListEqual(_test.get_all(), [])
+
+            # modify, touch, add and remove files
+            with open("_temp/tree/a.txt", "w") as outf:
+                outf.write("changed")
+            os.utime("_temp/tree/b.txt", (1000000000, 1000000000))
+            with open("_temp/tree/d.txt", "w") as outf:
+                outf.write("new")
+            os.remove("_temp/tree/c.txt")
+
+            # with hash, only modified and new files are returned (touched file has the same content)
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), ["_temp/tree/a.txt", "_temp/tree/d.txt"])
+            self.assertListEqual(self.__fix_sep(deleted), ["_temp/tree/c.txt"])
+            self.assertListEqual(_test.get_all(), [])
+
+            # without hash, touched files are returned too
+            os.utime("_temp/tree/b.txt", (1000000001, 1000000001))
+            _test = fileter.sources.DeltaSource(fileter.sources.FolderSource("_temp/tree"), "_temp/checkpoint.db")
+            self.assertListEqual(self.__fix_sep(_test.get_all()), ["_temp/tree/b.txt"])
+
+            # files modified while processed in parallel should not count as changed in the next run
+            class AppendIterator(fileter.FilesIterator):
+                def process_file(self, path, dryrun):
+                    with open(path, "a") as outf:
+                        outf.write(" processed")
+                    return path
+
+            os.utime("_temp/tree/b.txt", (1000000002, 1000000002))
+            it = AppendIterator()
+            it.add_source(_test)
+            self.assertListEqual(self.__fix_sep(it.next(workers=2, executor="thread")), ["_temp/tree/b.txt"])
+            self.assertListEqual(_test.get_all(), [])
+
+            # files that failed to be processed are returned again in the next run
+            class FailingIterator(fileter.FilesIterator):
+                def process_file(self, path, dryrun):
+                    if path.endswith("b.txt"):
+                        raise IOError("failed to process")
+                    return path
+
+            os.utime("_temp/tree/a.txt", (1000000003, 1000000003))
+            os.utime("_temp/tree/b.txt", (1000000003, 1000000003))
+            it = FailingIterator()
+            it.add_source(_test)
+            with self.assertRaises(IOError):
+                list(it.next(workers=2, executor="thread", chunk_size=1))
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), ["_temp/tree/a.txt", "_temp/tree/b.txt"])
+
+            # files rejected by the iterator filters are not added to checkpoint
+            os.utime("_temp/tree/a.txt", (1000000004, 1000000004))
+            os.utime("_temp/tree/b.txt", (1000000004, 1000000004))
+            it = fileter.FilesIterator()
+            it.add_source(_test)
+            it.add_filter_by_pattern("*/a.txt")
+            self.assertListEqual(self.__fix_sep(it.get_all()), ["_temp/tree/a.txt"])
+            self.assertListEqual(self.__fix_sep(_test.get_all()), ["_temp/tree/b.txt"])
+
+        finally:
+            shutil.rmtree("_temp")
+
+    def test_watch_source(self):
+        """
+        Test source that watch a folder and return files as they change.
+        """
+        if os.path.isdir("_temp"):
+            shutil.rmtree("_temp")
+        os.makedirs("_temp/tree")
+        with open("_temp/tree/old.txt", "w") as outf:
+            outf.write("old")
+
+        def make_changes():
+            # write the same file several times in a burst, and create a new folder with a file
+            time.sleep(0.2)
+            for i in range(5):
+                with open("_temp/tree/new.txt", "w") as outf:
+                    outf.write("new %d" % i)
+            os.makedirs("_temp/tree/sub")
+            with open("_temp/tree/sub/file.txt", "w") as outf:
+                outf.write("data")
+
+        try:
+            # test with inotify (if available) and with polling
+            for use_inotify in (True, False):
+                with open("_temp/tree/old.txt", "w") as outf:
+                    outf.write("old")
+                for path in ("_temp/tree/new.txt", "_temp/tree/sub/file.txt"):
+                    if os.path.exists(path):
+                        os.remove(path)
+                if os.path.isdir("_temp/tree/sub"):
+                    os.rmdir("_temp/tree/sub")
+                _test = fileter.sources.WatchSource("_temp/tree", debounce=0.2, idle_timeout=1.0,
+                                                    poll_interval=0.1, use_inotify=use_inotify)
+                thread = threading.Thread(target=make_changes)
+                thread.start()
+                ret = self.__fix_sep(_test.get_all())
+                thread.join()
+
+                # initial scan come first, and then every changed file once
+                self.assertEqual(ret[0], "_temp/tree/old.txt")
+                self.assertListEqual(sorted(ret[1:]), ["_temp/tree/new.txt", "_temp/tree/sub/file.txt"])
+
+        finally:
+            shutil.rmtree("_temp")
+
+    def test_gitignore_source(self):
+        """
+        Test source that skip files ignored by .gitignore files.
+        """
+        # create a testing tree with ignore files
+        if os.path.isdir("_temp"):
+            shutil.rmtree("_temp")
+        for folder in ("build", "sub/build", "docs/a/b", "sub/deep", ".git/info"):
+            os.makedirs(os.path.join("_temp", folder))
+        ignore_files = {
+            ".gitignore": "# comment\n*.log\n!keep.log\nbuild/\n/root_only.txt\ndocs/**/*.tmp\n[ab].dat\n!b.dat\n",
+            "sub/.gitignore": "!*.log\nlocal.txt\n",
+            ".git/info/exclude": "secret\n",
+        }
+        for path, content in ignore_files.items():
+            with open(os.path.join("_temp", path), "w") as outf:
+                outf.write(content)
+        for path in ("a.log", "keep.log", "build/x", "sub/build/y", "root_only.txt", "sub/root_only.txt",
+                     "docs/a/b/c.tmp", "docs/c.tmp", "docs/a/keep.txt", "sub/b.log", "sub/local.txt",
+                     "sub/deep/local.txt", "x.txt", "secret", "a.dat", "b.dat", "c.dat"):
+            with open(os.path.join("_temp", path), "w") as outf:
+                outf.write("data")
+
+        try:
+            expected = ["_temp/.gitignore", "_temp/b.dat", "_temp/c.dat", "_temp/docs/a/keep.txt", "_temp/keep.log",
+                        "_temp/sub/.gitignore", "_temp/sub/b.log", "_temp/sub/root_only.txt", "_temp/x.txt"]
+            _test = fileter.sources.GitIgnoreSource("_temp")
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), expected)
+            _test = fileter.sources.GitIgnoreSource("_temp", threads=4, ordered=False)
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())), expected)
+
+            # ignored folders are never listed
+            _test = fileter.sources.GitIgnoreSource("_temp", ret_files=False, ret_folders=True)
+            self.assertListEqual(sorted(self.__fix_sep(_test.get_all())),
+                                 ["_temp", "_temp/docs", "_temp/docs/a", "_temp/docs/a/b", "_temp/sub",
+                                  "_temp/sub/deep"])
+
+            # matchers of folders that are not listed (too deep, filtered or pruned) are not kept
+            walkers = []
+
+            class RecordingSource(fileter.sources.GitIgnoreSource):
+                def create_walker(self, *args):
+                    walker = super(RecordingSource, self).create_walker(*args)
+                    walkers.append(walker)
+                    return walker
+
+                def filter_folder(self, folder):
+                    return os.path.basename(folder) != "docs"
+
+            for threads in (None, 4):
+                _test = RecordingSource("_temp", 1, threads=threads)
+                _test.set_prune_rule(lambda folder: folder.endswith("deep"))
+                self.assertListEqual(sorted(self.__fix_sep(_test.get_all())),
+                                     ["_temp/.gitignore", "_temp/b.dat", "_temp/c.dat", "_temp/keep.log",
+                                      "_temp/sub/.gitignore", "_temp/sub/b.log", "_temp/sub/root_only.txt",
+                                      "_temp/x.txt"])
+                self.assertDictEqual(walkers[-1]._GitIgnoreWalker__matchers, {})
+
+        finally:
+            shutil.rmtree("_temp")